@@ -0,0 +1,110 @@
+"""
+Geração de dados sintéticos para os benchmarks: catálogo, clientes e orçamentos.
+
+Os orçamentos imitam os enviados pelos fornecedores: linhas de metadados antes do
+cabeçalho (proposta, data), mistura de itens com SKU e só com nome, itens fora do
+catálogo, linhas de subtotal/total e linhas em branco.
+"""
+import os
+import random
+from datetime import date
+
+import pandas as pd
+
+CORES = ['PRETO', 'BRANCO', 'AZUL', 'VERMELHO', 'DOURADO', 'ROSA', 'VERDE', 'PRATA']
+QUALIDADES = ['-', 'ORIGINAL', 'PREMIUM', 'INCELL', 'OLED']
+LINHAS_TOTAL = ['Subtotal', 'Total geral', 'Valor total do pedido', 'Soma']
+
+
+def gerar_catalogo(total_skus, semente=1):
+    """
+    Catálogo com as mesmas colunas da planilha de mapeamento (aba CATÁLOGO).
+
+    Returns:
+        DataFrame com SKU, MODELO, MODELO OLIST, ID e demais colunas
+    """
+    aleatorio = random.Random(semente)
+    linhas = []
+    for i in range(total_skus):
+        cor = CORES[i % len(CORES)]
+        modelo = f"MOD-{i // len(CORES):06d}"
+        linhas.append({
+            'Unnamed: 0': 'LINHA' if i % 50 == 0 else None,
+            'SKU': f"{i:07d}-{i % 10}",
+            'MODELO OLIST': f"{modelo} | {cor}",
+            'MODELO': f"{modelo} {cor}",
+            'COR': cor,
+            'QUALIDADE': aleatorio.choice(QUALIDADES),
+            'VALOR': round(aleatorio.uniform(5, 500), 2),
+            'ID': 900000000 + i,
+        })
+    return pd.DataFrame(linhas)
+
+
+def gerar_clientes(total_clientes=500):
+    """Planilha de clientes com os códigos curtos (CL###) no nome, como a original."""
+    return pd.DataFrame({
+        'Código': [f"CL{i:03d}" for i in range(total_clientes)],
+        'ID': [753300000 + i for i in range(total_clientes)],
+        'Nome': [f"CL{i:03d} - Cliente Sintético {i}" for i in range(total_clientes)],
+        'Situação': 'Ativo',
+    })
+
+
+def gerar_orcamento(caminho, catalogo, total_linhas, linhas_antes_cabecalho=3, fracao_sku=0.5,
+                    fracao_nao_mapeados=0.05, fracao_totais=0.01, semente=1):
+    """
+    Grava um orçamento .xlsx sintético.
+
+    Args:
+        caminho: Arquivo de destino
+        catalogo: DataFrame de gerar_catalogo (de onde vêm os produtos)
+        total_linhas: Quantidade de linhas de itens
+        linhas_antes_cabecalho: Linhas de metadados antes do cabeçalho
+        fracao_sku: Fração dos itens com SKU preenchido (os demais só com o nome)
+        fracao_nao_mapeados: Fração dos itens que não existem no catálogo
+        fracao_totais: Fração de linhas de subtotal/total e em branco
+        semente: Semente do gerador aleatório
+
+    Returns:
+        O caminho gravado
+    """
+    from openpyxl import Workbook
+
+    aleatorio = random.Random(semente)
+    skus = catalogo['SKU'].tolist()
+    modelos = catalogo['MODELO'].tolist()
+
+    workbook = Workbook(write_only=True)
+    planilha = workbook.create_sheet('Orçamento')
+    metadados = [
+        ['Proposta nº', 4000 + semente],
+        ['Data', date(2024, 1, 1 + semente % 28).strftime('%d/%m/%Y')],
+        ['Fornecedor', 'Distribuidora Sintética'],
+    ]
+    for i in range(linhas_antes_cabecalho):
+        planilha.append(metadados[i] if i < len(metadados) else [])
+    planilha.append(['SKU', 'Produto', 'Quantidade', 'Valor Unitário', 'Valor Total'])
+
+    for _ in range(total_linhas):
+        sorteio = aleatorio.random()
+        if sorteio < fracao_totais / 2:
+            planilha.append([None, aleatorio.choice(LINHAS_TOTAL), None, None, aleatorio.uniform(100, 10000)])
+            continue
+        if sorteio < fracao_totais:
+            planilha.append([])
+            continue
+        quantidade = aleatorio.randint(1, 20)
+        valor = round(aleatorio.uniform(5, 500), 2)
+        if aleatorio.random() < fracao_nao_mapeados:
+            sku = f"X{aleatorio.randint(0, 10 ** 6)}" if aleatorio.random() < fracao_sku else None
+            nome = f"Produto fora do catálogo {aleatorio.randint(0, 10 ** 6)}"
+        else:
+            posicao = aleatorio.randrange(len(skus))
+            sku = skus[posicao] if aleatorio.random() < fracao_sku else None
+            nome = modelos[posicao].lower() if aleatorio.random() < 0.3 else modelos[posicao]
+        planilha.append([sku, nome, quantidade, valor, round(quantidade * valor, 2)])
+
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    workbook.save(caminho)
+    return caminho
@@ -0,0 +1,250 @@
+"""
+Benchmarks da conversão de orçamentos.
+
+Para cada cenário (linhas do orçamento x SKUs do catálogo) mede:
+- frio: primeira conversão, com download do servidor local, leitura do CSV e montagem do índice;
+- quente: mediana das conversões seguintes, com os dados de referência em cache;
+- etapas: tempo de cada etapa de converter_orcamento_para_olist (ver ResultadoConversao.tempos);
+- gravacao_xlsx: geração do arquivo de saída;
+- rota_processar: requisição completa POST /processar pelo cliente de testes do Flask.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/executar_benchmarks.py                       # cenário rápido
+    python benchmarks/executar_benchmarks.py --completo            # 100 a 100k linhas, 1k a 500k SKUs
+    python benchmarks/executar_benchmarks.py --saida atual.json --comparar anterior.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+DIRETORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_SRC = os.path.join(os.path.dirname(DIRETORIO_BENCHMARKS), 'src')
+sys.path.insert(0, DIRETORIO_SRC)
+sys.path.insert(0, DIRETORIO_BENCHMARKS)
+
+from dados_sinteticos import gerar_catalogo, gerar_clientes, gerar_orcamento  # noqa: E402
+from servidor_planilhas import ServidorPlanilhas  # noqa: E402
+
+GID_CATALOGO = '1351609730'
+GID_CLIENTES = '1582301730'
+
+CENARIOS_RAPIDOS = [(1000, 5000)]
+LINHAS_COMPLETO = [100, 1000, 10000, 100000]
+SKUS_COMPLETO = [1000, 50000, 500000]
+
+# Diferença mínima (em segundos) para uma piora contar como regressão, evitando ruído em medidas muito curtas
+DIFERENCA_MINIMA_SEGUNDOS = 0.005
+
+
+@contextlib.contextmanager
+def _silenciar():
+    """Descarta a saída em stdout/stderr durante as medições."""
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo), contextlib.redirect_stderr(nulo):
+        yield
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=DIRETORIO_BENCHMARKS,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _mediana_por_etapa(medicoes):
+    etapas = sorted({etapa for medicao in medicoes for etapa in medicao})
+    return {etapa: round(statistics.median(m.get(etapa, 0.0) for m in medicoes), 6) for etapa in etapas}
+
+
+def _limpar_caches():
+    """Volta o processo ao estado de uma primeira conversão (sem planilhas, índice nem modelo em cache)."""
+    import indice_catalogo
+    from dados_referencia import invalidar_dados_referencia
+    from modelos_saida import registro_modelos
+
+    invalidar_dados_referencia()
+    with indice_catalogo._trava_indices:
+        indice_catalogo._indices.clear()
+    registro_modelos._esquemas.clear()
+
+
+def executar_cenario(servidor, app, total_linhas, total_skus, repeticoes, motor, diretorio_dados):
+    from conversor_olist import (converter_orcamento_para_olist_detalhado, URL_PLANILHA_CLIENTES,
+                                 URL_PLANILHA_MAPEAMENTO, MODELO_SAIDA_PADRAO)
+    from saida_olist import gerar_xlsx
+
+    catalogo = gerar_catalogo(total_skus)
+    clientes = gerar_clientes()
+    servidor.publicar(GID_CATALOGO, catalogo.to_csv(index=False))
+    servidor.publicar(GID_CLIENTES, clientes.to_csv(index=False))
+    cliente_id = str(clientes['ID'].iloc[1])
+
+    caminho_orcamento = os.path.join(diretorio_dados, f"orcamento_{total_linhas}_{total_skus}.xlsx")
+    if not os.path.exists(caminho_orcamento):
+        gerar_orcamento(caminho_orcamento, catalogo, total_linhas)
+    with open(caminho_orcamento, 'rb') as arquivo:
+        conteudo_orcamento = arquivo.read()
+
+    def converter():
+        with _silenciar():
+            return converter_orcamento_para_olist_detalhado(
+                io.BytesIO(conteudo_orcamento), URL_PLANILHA_MAPEAMENTO, URL_PLANILHA_CLIENTES,
+                cliente_id, MODELO_SAIDA_PADRAO, motor=motor
+            )
+
+    _limpar_caches()
+    resultado = converter()
+    if resultado.erro:
+        raise RuntimeError(f"Conversão falhou no cenário {total_linhas}x{total_skus}: {resultado.erro}")
+    frio = {etapa: round(segundos, 6) for etapa, segundos in resultado.tempos.items()}
+
+    quentes, gravacoes, rotas = [], [], []
+    for _ in range(repeticoes):
+        resultado = converter()
+        quentes.append(resultado.tempos)
+        inicio = time.perf_counter()
+        gerar_xlsx(resultado.df)
+        gravacoes.append(time.perf_counter() - inicio)
+
+        with _silenciar():
+            inicio = time.perf_counter()
+            resposta = app.test_client().post('/processar', data={
+                'arquivo_excel': (io.BytesIO(conteudo_orcamento), 'orcamento.xlsx'),
+                'cliente_id': cliente_id,
+            }, content_type='multipart/form-data')
+            rotas.append(time.perf_counter() - inicio)
+        if resposta.status_code != 200:
+            raise RuntimeError(f"/processar respondeu {resposta.status_code}: {resposta.get_data(as_text=True)[:300]}")
+
+    return {
+        'linhas': total_linhas,
+        'skus': total_skus,
+        'linhas_saida': len(resultado.df),
+        'produtos_nao_mapeados': len(resultado.produtos_nao_mapeados),
+        'frio': frio,
+        'quente': _mediana_por_etapa(quentes),
+        'gravacao_xlsx': round(statistics.median(gravacoes), 6),
+        'rota_processar': round(statistics.median(rotas), 6),
+    }
+
+
+def _metricas_comparaveis(cenario):
+    metricas = {
+        'frio.total': cenario['frio'].get('total', 0.0),
+        'gravacao_xlsx': cenario['gravacao_xlsx'],
+        'rota_processar': cenario['rota_processar'],
+    }
+    for etapa, segundos in cenario['quente'].items():
+        metricas[f'quente.{etapa}'] = segundos
+    return metricas
+
+
+def comparar(anterior, atual, tolerancia):
+    """
+    Compara dois resultados; uma métrica regrediu se ficou mais de `tolerancia` (fração)
+    e mais de DIFERENCA_MINIMA_SEGUNDOS mais lenta.
+
+    Returns:
+        Lista de regressões encontradas (textos)
+    """
+    regressoes = []
+    print(f"\n{'cenário':<24}{'métrica':<32}{'anterior':>12}{'atual':>12}{'variação':>10}")
+    for chave, cenario in atual['cenarios'].items():
+        if chave not in anterior['cenarios']:
+            continue
+        antes = _metricas_comparaveis(anterior['cenarios'][chave])
+        depois = _metricas_comparaveis(cenario)
+        for metrica in sorted(set(antes) & set(depois)):
+            a, d = antes[metrica], depois[metrica]
+            variacao = (d - a) / a if a else 0.0
+            marca = ''
+            if d > a * (1 + tolerancia) and d - a > DIFERENCA_MINIMA_SEGUNDOS:
+                marca = '  <- REGRESSÃO'
+                regressoes.append(f"{chave} {metrica}: {a:.4f}s -> {d:.4f}s ({variacao:+.0%})")
+            print(f"{chave:<24}{metrica:<32}{a:>12.4f}{d:>12.4f}{variacao:>+10.0%}{marca}")
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks da conversão de orçamentos para o formato Olist.')
+    parser.add_argument('--completo', action='store_true', help='Matriz completa: 100 a 100k linhas x 1k a 500k SKUs')
+    parser.add_argument('--linhas', help='Linhas dos orçamentos, separadas por vírgula (ex.: 100,1000)')
+    parser.add_argument('--skus', help='SKUs dos catálogos, separados por vírgula (ex.: 1000,50000)')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Conversões quentes por cenário (padrão: 5)')
+    parser.add_argument('--motor', default='vetorizado', choices=('vetorizado', 'iterativo'))
+    parser.add_argument('--latencia', type=float, default=0.0, help='Latência artificial do servidor local, em segundos')
+    parser.add_argument('--saida', default='benchmark.json', help='Arquivo JSON de resultados (padrão: benchmark.json)')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior para comparação')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='Piora aceita na comparação (padrão: 0.2 = 20%%)')
+    parser.add_argument('--dados', default=os.path.join(tempfile.gettempdir(), 'conversor_olist_benchmarks'),
+                        help='Diretório dos orçamentos gerados (reaproveitados entre execuções)')
+    args = parser.parse_args(argv)
+
+    if args.linhas or args.skus:
+        linhas = [int(x) for x in (args.linhas or '1000').split(',')]
+        skus = [int(x) for x in (args.skus or '5000').split(',')]
+        cenarios = [(l, s) for s in skus for l in linhas]
+    elif args.completo:
+        cenarios = [(l, s) for s in SKUS_COMPLETO for l in LINHAS_COMPLETO]
+    else:
+        cenarios = CENARIOS_RAPIDOS
+
+    with ServidorPlanilhas(latencia_segundos=args.latencia) as servidor:
+        # Configuração lida na importação dos módulos de src
+        os.environ['OLIST_SHEETS_URL_EXPORTACAO'] = servidor.url_exportacao
+        os.environ['OLIST_SNAPSHOT_REFERENCIA'] = '0'
+        os.environ['OLIST_ATUALIZADOR_REFERENCIA'] = '0'
+        # Sem o cache de resultados: o cenário rota_processar reenvia o mesmo orçamento e
+        # mediria só a leitura do arquivo já convertido, não a conversão
+        os.environ['OLIST_CACHE_RESULTADOS'] = '0'
+        os.environ.setdefault('OLIST_LOG_NIVEL', 'WARNING')
+        with _silenciar():
+            from main import app
+
+        resultado = {
+            'gerado_em': datetime.now().isoformat(timespec='seconds'),
+            'commit': _commit_atual(),
+            'python': platform.python_version(),
+            'pandas': __import__('pandas').__version__,
+            'plataforma': platform.platform(),
+            'motor': args.motor,
+            'repeticoes': args.repeticoes,
+            'cenarios': {},
+        }
+        for total_linhas, total_skus in cenarios:
+            chave = f"linhas={total_linhas},skus={total_skus}"
+            print(f"Executando {chave}...", flush=True)
+            cenario = executar_cenario(servidor, app, total_linhas, total_skus, args.repeticoes, args.motor, args.dados)
+            resultado['cenarios'][chave] = cenario
+            print(f"  frio {cenario['frio']['total']:.3f}s | quente {cenario['quente']['total']:.3f}s | "
+                  f"xlsx {cenario['gravacao_xlsx']:.3f}s | /processar {cenario['rota_processar']:.3f}s", flush=True)
+        resultado['requisicoes_servidor'] = servidor.requisicoes
+
+    with open(args.saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            anterior = json.load(arquivo)
+        regressoes = comparar(anterior, resultado, args.tolerancia)
+        if regressoes:
+            print(f"\n{len(regressoes)} regressão(ões) acima de {args.tolerancia:.0%}:")
+            for regressao in regressoes:
+                print(f"  - {regressao}")
+            return 1
+        print("\nSem regressões.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
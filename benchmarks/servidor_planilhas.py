@@ -0,0 +1,89 @@
+"""
+Servidor HTTP local que imita a exportação CSV do Google Sheets, para os benchmarks.
+
+Responde em /spreadsheets/d/<id>/export?format=csv&gid=<gid> com o CSV publicado
+para aquele gid, com ETag e 304 para requisições condicionais, como o Google.
+Para o conversor usar o servidor, defina OLIST_SHEETS_URL_EXPORTACAO com
+ServidorPlanilhas.url_exportacao antes de importar os módulos de src.
+"""
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class ServidorPlanilhas:
+    """
+    Uso:
+        with ServidorPlanilhas() as servidor:
+            servidor.publicar('1351609730', texto_csv)
+            os.environ['OLIST_SHEETS_URL_EXPORTACAO'] = servidor.url_exportacao
+    """
+
+    def __init__(self, latencia_segundos=0.0):
+        """
+        Args:
+            latencia_segundos: Atraso artificial em cada resposta (simula a rede)
+        """
+        self.latencia_segundos = latencia_segundos
+        self._planilhas = {}
+        self.requisicoes = 0
+        self.respostas_304 = 0
+        self._servidor = None
+        self._thread = None
+
+    @property
+    def url_exportacao(self):
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}/spreadsheets/d/{{spreadsheet_id}}/export?format=csv&gid={{gid}}"
+
+    def publicar(self, gid, texto_csv):
+        conteudo = texto_csv.encode('utf-8')
+        self._planilhas[str(gid)] = (conteudo, '"' + hashlib.sha1(conteudo).hexdigest() + '"')
+
+    def iniciar(self):
+        servidor_planilhas = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                import time
+
+                servidor_planilhas.requisicoes += 1
+                if servidor_planilhas.latencia_segundos:
+                    time.sleep(servidor_planilhas.latencia_segundos)
+                gid = parse_qs(urlparse(self.path).query).get('gid', [''])[0]
+                if gid not in servidor_planilhas._planilhas:
+                    self.send_error(404)
+                    return
+                conteudo, etag = servidor_planilhas._planilhas[gid]
+                if self.headers.get('If-None-Match') == etag:
+                    servidor_planilhas.respostas_304 += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/csv; charset=utf-8')
+                self.send_header('Content-Length', str(len(conteudo)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(conteudo)
+
+            def log_message(self, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', 0), Manipulador)
+        self._thread = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
@@ -0,0 +1,164 @@
+"""
+Atualização em segundo plano dos dados de referência (catálogo e clientes).
+
+Uma thread iniciada junto com a aplicação revalida as planilhas do Google Sheets
+periodicamente e troca a versão em uso de uma só vez. As requisições recebem
+sempre a última versão boa, sem esperar download; se o Google falhar, a versão
+anterior continua em uso, as novas tentativas são espaçadas (backoff exponencial)
+e o status informa há quanto tempo os dados não são atualizados.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from dados_referencia import atualizar_dados_referencia, obter_dados_referencia
+from fonte_planilhas import TTL_PADRAO_SEGUNDOS
+from log_conversor import definir_id_requisicao
+from metricas import FALHAS_ATUALIZACAO_REFERENCIA, IDADE_DADOS_REFERENCIA, MEMORIA_DADOS_REFERENCIA
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre as verificações do atualizador. A planilha só é baixada de novo quando
+# o snapshot passa do TTL (OLIST_SHEETS_CACHE_TTL); as demais verificações são só um os.stat.
+INTERVALO_PADRAO_SEGUNDOS = float(os.environ.get('OLIST_REFERENCIA_INTERVALO', '30'))
+
+# Espera máxima entre tentativas após falhas consecutivas
+BACKOFF_MAXIMO_SEGUNDOS = 600
+
+
+def _formatar_horario(instante):
+    return datetime.fromtimestamp(instante).isoformat(timespec='seconds') if instante else None
+
+
+class AtualizadorReferencia:
+    """
+    Mantém em memória a última versão boa dos dados de referência e a renova em segundo plano.
+
+    Uso:
+        atualizador = AtualizadorReferencia(url_catalogo, url_clientes)
+        atualizador.iniciar()
+        dados = atualizador.dados()   # nunca espera o Google depois da primeira carga
+    """
+
+    def __init__(self, url_catalogo, url_clientes, intervalo=INTERVALO_PADRAO_SEGUNDOS,
+                 backoff_maximo=BACKOFF_MAXIMO_SEGUNDOS):
+        self.url_catalogo = url_catalogo
+        self.url_clientes = url_clientes
+        self.intervalo = intervalo
+        self.backoff_maximo = backoff_maximo
+        self._dados = None
+        self._trava = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+        self.ultima_tentativa = None
+        self.ultimo_sucesso = None
+        self.ultimo_erro = None
+        self.falhas_consecutivas = 0
+        self.proxima_tentativa = None
+
+    @property
+    def em_execucao(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def iniciar(self):
+        """Inicia a thread de atualização (uma por processo)."""
+        if self.em_execucao:
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executar, name='atualizador-referencia', daemon=True)
+        self._thread.start()
+
+    def parar(self, timeout=None):
+        self._parar.set()
+        self._acordar.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def atualizar_agora(self):
+        """Pede à thread uma verificação imediata (ex.: após invalidar o cache)."""
+        self._acordar.set()
+
+    def dados(self):
+        """
+        Retorna a versão em uso dos dados de referência.
+
+        Sem a thread em execução (ex.: ambientes serverless) ou antes da primeira
+        carga, os dados são obtidos na hora, como sem o atualizador.
+        """
+        dados = self._dados
+        if dados is not None and self.em_execucao:
+            return dados
+        dados = obter_dados_referencia(self.url_catalogo, self.url_clientes)
+        self._trocar(dados)
+        return dados
+
+    def _trocar(self, dados):
+        # Sem a thread, toda requisição passa por aqui, quase sempre com o mesmo objeto
+        if dados is self._dados:
+            return
+        with self._trava:
+            atual = self._dados
+            if atual is not None and dados.atualizado_em < atual.atualizado_em:
+                return
+            self._dados = dados
+            IDADE_DADOS_REFERENCIA.definir(dados.atualizado_em)
+            # memoria() percorre todos os DataFrames: só é recalculada quando as planilhas mudam
+            if atual is None or dados.versoes != atual.versoes:
+                for parte, tamanho in dados.memoria().items():
+                    MEMORIA_DADOS_REFERENCIA.definir(tamanho, parte=parte)
+
+    def atualizar(self):
+        """Executa uma atualização; retorna True se deu certo."""
+        self.ultima_tentativa = time.time()
+        try:
+            dados = atualizar_dados_referencia(self.url_catalogo, self.url_clientes)
+        except Exception as e:
+            self.falhas_consecutivas += 1
+            self.ultimo_erro = f"{type(e).__name__}: {e}"
+            FALHAS_ATUALIZACAO_REFERENCIA.definir(self.falhas_consecutivas)
+            logger.warning("Falha ao atualizar dados de referência (%dª seguida): %s",
+                           self.falhas_consecutivas, self.ultimo_erro)
+            return False
+        self._trocar(dados)
+        self.falhas_consecutivas = 0
+        FALHAS_ATUALIZACAO_REFERENCIA.definir(0)
+        self.ultimo_erro = None
+        self.ultimo_sucesso = time.time()
+        return True
+
+    def _espera(self):
+        if not self.falhas_consecutivas:
+            return self.intervalo
+        return min(self.intervalo * 2 ** self.falhas_consecutivas, self.backoff_maximo)
+
+    def _executar(self):
+        definir_id_requisicao('atualizador')
+        while not self._parar.is_set():
+            self.atualizar()
+            espera = self._espera()
+            self.proxima_tentativa = time.time() + espera
+            self._acordar.wait(espera)
+            self._acordar.clear()
+
+    def status(self):
+        """Situação da atualização e idade dos dados em uso, para monitoramento."""
+        dados = self._dados
+        idade = time.time() - dados.atualizado_em if dados is not None else None
+        return {
+            'em_execucao': self.em_execucao,
+            'dados_carregados': dados is not None,
+            'atualizado_em': _formatar_horario(dados.atualizado_em) if dados is not None else None,
+            'idade_segundos': round(idade, 1) if idade is not None else None,
+            # Dados mais velhos que dois ciclos de TTL indicam que as atualizações estão falhando
+            'desatualizado': idade is None or idade > 2 * TTL_PADRAO_SEGUNDOS + self.intervalo,
+            'versoes': dict(dados.versoes) if dados is not None else {},
+            'memoria_bytes': dados.memoria() if dados is not None else {},
+            'ultima_tentativa': _formatar_horario(self.ultima_tentativa),
+            'ultimo_sucesso': _formatar_horario(self.ultimo_sucesso),
+            'ultimo_erro': self.ultimo_erro,
+            'falhas_consecutivas': self.falhas_consecutivas,
+            'proxima_tentativa': _formatar_horario(self.proxima_tentativa) if self.em_execucao else None,
+        }
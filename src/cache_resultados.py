@@ -0,0 +1,176 @@
+"""
+Cache em disco dos arquivos convertidos, endereçado pelo conteúdo.
+
+A chave é o sha256 do orçamento enviado + ID do cliente + versões do catálogo, dos
+clientes e do modelo de saída + formato de saída. Reenviar o mesmo orçamento para o
+mesmo cliente devolve o arquivo já gerado, com o mesmo nome de download; qualquer mudança nas planilhas de
+referência ou no modelo muda a chave, e as entradas antigas deixam de ser usadas até
+saírem pelo limite de tamanho (as menos usadas recentemente são removidas primeiro).
+
+O diretório é compartilhado entre os workers do gunicorn; as gravações são atômicas.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+from metricas import CACHE_RESULTADOS
+
+logger = logging.getLogger(__name__)
+
+CACHE_RESULTADOS_HABILITADO = os.environ.get('OLIST_CACHE_RESULTADOS', '1') != '0'
+DIRETORIO_CACHE_RESULTADOS_PADRAO = (os.environ.get('OLIST_CACHE_RESULTADOS_DIR')
+                                     or os.path.join(tempfile.gettempdir(), 'conversor_olist', 'resultados'))
+
+# Espaço máximo ocupado pelos arquivos em cache
+TAMANHO_MAXIMO_CACHE_BYTES = int(float(os.environ.get('OLIST_CACHE_RESULTADOS_MB', '200')) * 1024 * 1024)
+
+# Aumentar quando a conversão passar a gerar uma saída diferente para a mesma entrada
+VERSAO_FORMATO_CACHE = 2
+
+_PADRAO_CHAVE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def chave_resultado(conteudo, cliente_id, versoes_referencia, versao_modelo, formato='xlsx', todas_abas=False):
+    """
+    Chave do resultado de uma conversão.
+
+    Args:
+        conteudo: Bytes do orçamento enviado
+        cliente_id: ID do cliente selecionado
+        versoes_referencia: Versões do catálogo e dos clientes (DadosReferencia.versoes)
+        versao_modelo: Versão do modelo de saída (registro_modelos.versao)
+        formato: Formato do arquivo de saída (xlsx, csv, json, parquet)
+        todas_abas: Se os itens de todas as abas foram convertidos
+
+    Returns:
+        Hash sha256 em hexadecimal, ou None se alguma versão for desconhecida (não cacheável)
+    """
+    if not versoes_referencia or not all(versoes_referencia.values()) or not versao_modelo:
+        return None
+    partes = {
+        'formato_cache': VERSAO_FORMATO_CACHE,
+        'cliente_id': str(cliente_id).strip(),
+        'referencia': dict(sorted(versoes_referencia.items())),
+        'modelo': versao_modelo,
+        'formato': formato,
+        'todas_abas': bool(todas_abas),
+    }
+    hash_chave = hashlib.sha256(conteudo)
+    hash_chave.update(json.dumps(partes, sort_keys=True, default=str).encode('utf-8'))
+    return hash_chave.hexdigest()
+
+
+class CacheResultados:
+    """
+    Uso:
+        cache = CacheResultados()
+        entrada = cache.obter(chave)          # (caminho do arquivo, metadados) ou None
+        cache.gravar(chave, conteudo, {'arquivo_saida': nome})
+    """
+
+    def __init__(self, diretorio=None, tamanho_maximo=TAMANHO_MAXIMO_CACHE_BYTES):
+        self.diretorio = diretorio or DIRETORIO_CACHE_RESULTADOS_PADRAO
+        self.tamanho_maximo = tamanho_maximo
+        self._trava = threading.Lock()
+
+    def _caminhos(self, chave):
+        base = os.path.join(self.diretorio, chave)
+        return base + '.bin', base + '.json'
+
+    def obter(self, chave):
+        """
+        Retorna o arquivo em cache para a chave e marca o uso (para a remoção LRU).
+
+        Returns:
+            Tupla (caminho do arquivo, metadados gravados) ou None
+        """
+        if not chave or not _PADRAO_CHAVE.match(chave):
+            return None
+        caminho, caminho_metadados = self._caminhos(chave)
+        try:
+            with open(caminho_metadados, encoding='utf-8') as arquivo:
+                metadados = json.load(arquivo)
+            os.utime(caminho)
+        except (OSError, ValueError):
+            CACHE_RESULTADOS.inc(resultado='miss')
+            return None
+        CACHE_RESULTADOS.inc(resultado='hit')
+        return caminho, metadados
+
+    def gravar(self, chave, conteudo, metadados):
+        """
+        Grava o arquivo e seus metadados (o arquivo primeiro: os metadados indicam entrada completa).
+
+        Args:
+            chave: Chave do resultado (chave_resultado)
+            conteudo: Bytes do arquivo ou arquivo binário aberto (copiado a partir da posição atual)
+            metadados: Dicionário gravado junto (ex.: nome do arquivo para download)
+        """
+        if not chave or not _PADRAO_CHAVE.match(chave):
+            return
+        caminho, caminho_metadados = self._caminhos(chave)
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            self._gravar_atomico(caminho, conteudo)
+            self._gravar_atomico(caminho_metadados, json.dumps(metadados, ensure_ascii=False, default=str).encode('utf-8'))
+        except OSError as e:
+            logger.warning("Não foi possível gravar o resultado em cache (%s): %s", self.diretorio, e)
+            return
+        self.limitar_tamanho()
+
+    def _gravar_atomico(self, caminho, conteudo):
+        descritor, caminho_temporario = tempfile.mkstemp(dir=self.diretorio, suffix='.tmp')
+        try:
+            with os.fdopen(descritor, 'wb') as arquivo:
+                if isinstance(conteudo, bytes):
+                    arquivo.write(conteudo)
+                else:
+                    shutil.copyfileobj(conteudo, arquivo)
+            os.replace(caminho_temporario, caminho)
+        except BaseException:
+            try:
+                os.remove(caminho_temporario)
+            except OSError:
+                pass
+            raise
+
+    def limitar_tamanho(self):
+        """Remove as entradas usadas há mais tempo até o cache caber em tamanho_maximo."""
+        with self._trava:
+            entradas = []
+            try:
+                nomes = os.listdir(self.diretorio)
+            except OSError:
+                return
+            for nome in nomes:
+                if not nome.endswith('.bin'):
+                    continue
+                try:
+                    info = os.stat(os.path.join(self.diretorio, nome))
+                except OSError:
+                    continue
+                entradas.append((info.st_mtime, info.st_size, nome[:-len('.bin')]))
+            total = sum(tamanho for _, tamanho, _ in entradas)
+            if total <= self.tamanho_maximo:
+                return
+            removidas = 0
+            for _, tamanho, chave in sorted(entradas):
+                if total <= self.tamanho_maximo:
+                    break
+                self.remover(chave)
+                total -= tamanho
+                removidas += 1
+            logger.info("Cache de resultados: %d entrada(s) removida(s) por falta de espaço", removidas)
+
+    def remover(self, chave):
+        # Metadados primeiro: sem eles a entrada já não é encontrada
+        for caminho in reversed(self._caminhos(chave)):
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
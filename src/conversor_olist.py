@@ -1,20 +1,41 @@
 import pandas as pd
 import sys
-import traceback
 import re # Para normalização
 import os
 import io
-from typing import Union, BinaryIO
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Union, BinaryIO, Callable, Optional
 import gspread
-import requests
+import logging
+from fonte_planilhas import cache_planilhas
+from dados_referencia import DadosReferencia, obter_dados_referencia
+from leitor_orcamento import LeitorOrcamento, abas_orcamento
+from log_conversor import configurar_logging, debug_amostrado
+from metricas import registrar_conversao
+from modelos_saida import registro_modelos
+from motor_vetorizado import processar_itens_vetorizado, suporta_motor_vetorizado
+from normalizacao import normalizar_texto
+from perfis_layout import PERFIS_LAYOUT_HABILITADO, PerfilLayout, impressoes_candidatas, repositorio_perfis
 
-def normalizar_texto(texto):
-    if pd.isna(texto):
-        return ""
-    texto_str = str(texto).lower().strip()
-    # Remover múltiplos espaços
-    texto_str = re.sub(r'\s+', ' ', texto_str)
-    return texto_str
+# Planilhas de referência no Google Sheets e modelo de saída padrão
+URL_PLANILHA_CLIENTES = "https://docs.google.com/spreadsheets/d/1qAuw2ebWPJmcy_gl4Qf48GfmnSGLZumDfs62fpG2BGA/edit?pli=1&gid=1582301730#gid=1582301730"
+URL_PLANILHA_MAPEAMENTO = "https://docs.google.com/spreadsheets/d/1qAuw2ebWPJmcy_gl4Qf48GfmnSGLZumDfs62fpG2BGA/edit?pli=1&gid=1351609730#gid=1351609730"
+MODELO_SAIDA_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'formato Olist(SAIDA).xlsx')
+
+# Motor de processamento dos itens: 'vetorizado' (colunar) ou 'iterativo' (linha a linha)
+MOTORES_CONVERSAO = ('vetorizado', 'iterativo')
+MOTOR_CONVERSAO_PADRAO = os.environ.get('OLIST_MOTOR_CONVERSAO', 'vetorizado')
+
+# Abas lidas ao mesmo tempo quando o orçamento é convertido com todas_abas
+MAX_THREADS_ABAS = 4
+
+# Produtos não mapeados citados no resumo da conversão (a lista completa sai em DEBUG e no resultado)
+EXEMPLOS_NAO_MAPEADOS_LOG = 10
+
+logger = logging.getLogger(__name__)
 
 def encontrar_linha_cabecalho(df_preview, palavras_chave_cabecalho):
     # Versão mais flexível que aceita variações como 'valor unitário' para 'valor'
@@ -38,23 +59,20 @@ def encontrar_linha_cabecalho(df_preview, palavras_chave_cabecalho):
             return i
     return None
 
-def mapear_colunas_orcamento(df):
+def mapeamento_colunas_orcamento(colunas):
     """
-    Mapeia as colunas do orçamento para nomes padronizados, independente de variações.
-    
+    Nomes padronizados para as colunas do orçamento, independente de variações.
+
     Args:
-        df: DataFrame do orçamento
-    
+        colunas: Nomes das colunas do orçamento
+
     Returns:
-        DataFrame com colunas mapeadas para nomes padronizados
+        Dicionário {nome original: nome padronizado} das colunas reconhecidas
     """
     mapeamento_colunas = {}
     
-    # Criar cópia do DataFrame para não modificar o original
-    df_mapeado = df.copy()
-    
     # Normalizar nomes de colunas
-    colunas_normalizadas = {col: normalizar_texto(col) for col in df.columns}
+    colunas_normalizadas = {col: normalizar_texto(col) for col in colunas}
     
     # Mapear colunas para nomes padronizados
     for col_original, col_normalizada in colunas_normalizadas.items():
@@ -68,369 +86,761 @@ def mapear_colunas_orcamento(df):
             mapeamento_colunas[col_original] = 'valor'
         elif 'sku' in col_normalizada or 'código' in col_normalizada or 'codigo' in col_normalizada or 'cod' in col_normalizada:
             mapeamento_colunas[col_original] = 'sku'
+    return mapeamento_colunas
+
+def mapear_colunas_orcamento(df, mapeamento_colunas=None):
+    """
+    Mapeia as colunas do orçamento para nomes padronizados, independente de variações.
     
-    # Renomear colunas
-    df_mapeado = df_mapeado.rename(columns=mapeamento_colunas)
+    Args:
+        df: DataFrame do orçamento
+        mapeamento_colunas: Mapeamento já conhecido (ex.: de um perfil de layout); se None, é calculado
+    
+    Returns:
+        DataFrame com colunas mapeadas para nomes padronizados
+    """
+    if mapeamento_colunas is None:
+        mapeamento_colunas = mapeamento_colunas_orcamento(df.columns)
+    
+    # Renomear colunas (rename devolve um novo DataFrame, sem alterar o original)
+    df_mapeado = df.rename(columns=mapeamento_colunas)
     
     # Garantir que temos pelo menos as colunas essenciais
     colunas_essenciais = ['produto', 'quantidade', 'valor']
     colunas_encontradas = [col for col in colunas_essenciais if col in df_mapeado.columns]
     
     if len(colunas_encontradas) < 2:  # Pelo menos produto e quantidade/valor são necessários
-        print(f"[CONVERSOR V6] AVISO: Não foi possível identificar colunas essenciais. Encontradas: {colunas_encontradas}", file=sys.stderr)
+        logger.warning("Não foi possível identificar colunas essenciais. Encontradas: %s", colunas_encontradas)
     
     return df_mapeado
 
-def get_dataframe_from_google_sheet(sheet_url, sheet_name=None, header_row=0):
+def localizar_cabecalho(df_orcamento_preview):
+    """
+    Linha do cabeçalho na prévia do orçamento: a do perfil de layout, se o layout do
+    fornecedor já foi visto, ou a encontrada pelas palavras-chave.
+
+    Returns:
+        Tupla (linha do cabeçalho ou None, PerfilLayout ou None, impressões candidatas do layout)
+    """
+    # Layout de fornecedor já visto: cabeçalho, colunas e metadados vêm do perfil salvo
+    impressoes_layout = []
+    perfil_layout = None
+    if PERFIS_LAYOUT_HABILITADO:
+        impressoes_layout = impressoes_candidatas(df_orcamento_preview.to_numpy())
+        linha_cabecalho, perfil_layout = repositorio_perfis.buscar(impressoes_layout)
+    
+    # Identificar linha de cabeçalho
+    if perfil_layout is None:
+        palavras_chave_cabecalho = ['produto', 'quantidade', 'valor']
+        linha_cabecalho = encontrar_linha_cabecalho(df_orcamento_preview, palavras_chave_cabecalho)
+    else:
+        logger.debug("Layout conhecido: cabeçalho na linha %d", linha_cabecalho)
+    return linha_cabecalho, perfil_layout, impressoes_layout
+
+def mapeamento_colunas_layout(colunas, perfil_layout=None):
+    """Nomes padronizados das colunas do orçamento: pela posição da coluna no perfil de layout, se houver."""
+    if perfil_layout is None:
+        return mapeamento_colunas_orcamento(colunas)
+    return {colunas[posicao]: nome for posicao, nome in perfil_layout.mapeamento_colunas}
+
+def extrair_metadados_orcamento(df_orcamento_preview, linha_cabecalho, posicoes=None):
+    """
+    Número da proposta e data, procurados nas linhas antes do cabeçalho.
+
+    Args:
+        df_orcamento_preview: Prévia do orçamento (sem cabeçalho)
+        linha_cabecalho: Linha do cabeçalho na prévia
+        posicoes: Células [linha, coluna] com rótulos de proposta/data (de um perfil de layout);
+            se None, todas as células antes do cabeçalho são examinadas
+
+    Returns:
+        Tupla (número da proposta, data da proposta, células com rótulos encontradas)
+    """
+    num_proposta_orc = None
+    data_proposta_orc = None
+    posicoes_rotulos = []
+    colunas_por_linha = None
+    if posicoes is not None:
+        colunas_por_linha = {}
+        for i, j in posicoes:
+            colunas_por_linha.setdefault(i, []).append(j)
+
+    # Melhorar a extração de número da proposta e data
+    for i in range(linha_cabecalho):
+        if colunas_por_linha is not None and i not in colunas_por_linha:
+            continue
+        row = df_orcamento_preview.iloc[i]
+        celulas = enumerate(row) if colunas_por_linha is None else ((j, row[j]) for j in colunas_por_linha[i])
+        for j, cell in celulas:
+            if pd.notna(cell):
+                cell_str = str(cell).lower()
+                if ('proposta' in cell_str or 'orçamento' in cell_str or 'orcamento' in cell_str
+                        or 'data' in cell_str):
+                    posicoes_rotulos.append([i, j])
+
+                # Extração de número da proposta
+                if 'proposta' in cell_str or 'orçamento' in cell_str or 'orcamento' in cell_str:
+                    # Tentar extrair número da proposta da mesma célula
+                    match = re.search(r'(?:proposta|orçamento|orcamento)[^\d]*(\d+)', cell_str)
+                    if match:
+                        num_proposta_orc = match.group(1)
+                    # Se não encontrar na mesma célula, verificar a célula à direita
+                    elif j+1 < len(row) and pd.notna(row[j+1]):
+                        next_cell = str(row[j+1])
+                        if re.match(r'^\d+$', next_cell.strip()):
+                            num_proposta_orc = next_cell.strip()
+
+                # Extração de data
+                if 'data' in cell_str:
+                    # Verificar a célula à direita para data
+                    if j+1 < len(row) and pd.notna(row[j+1]):
+                        try:
+                            # Tentar converter para data
+                            data_cell = row[j+1]
+                            if isinstance(data_cell, (pd.Timestamp, pd.DatetimeTZDtype)):
+                                data_proposta_orc = data_cell
+                            else:
+                                # Tentar converter string para data com dayfirst=True para formato brasileiro (dia/mês/ano)
+                                data_proposta_orc = pd.to_datetime(data_cell, dayfirst=True, errors='coerce')
+                                if pd.isna(data_proposta_orc):
+                                    # Tentar formatos comuns de data
+                                    for fmt in ['%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%d.%m.%Y']:
+                                        try:
+                                            data_proposta_orc = pd.to_datetime(data_cell, format=fmt, dayfirst=True)
+                                            break
+                                        except:
+                                            continue
+                        except Exception as e:
+                            logger.warning("Erro ao extrair data: %s", e)
+    return num_proposta_orc, data_proposta_orc, posicoes_rotulos
+
+def buscar_cliente(df_clientes, id_cliente):
+    """
+    Linhas da planilha de clientes com o ID informado.
+
+    A coluna ID é numérica (ver ESQUEMA_CLIENTES); o ID selecionado pode chegar como
+    texto ("753318009", " 753318009 ", "753318009.0") ou número.
+
+    Returns:
+        DataFrame com as linhas encontradas (vazio se o ID não existir ou não for numérico)
+    """
+    if df_clientes.empty or 'ID' not in df_clientes.columns:
+        return df_clientes.iloc[0:0]
+    try:
+        id_numerico = float(str(id_cliente).strip())
+    except ValueError:
+        logger.warning("ID de cliente não numérico: %r", id_cliente)
+        return df_clientes.iloc[0:0]
+    return df_clientes[df_clientes['ID'] == id_numerico]
+
+def get_dataframe_from_google_sheet(sheet_url, sheet_name=None, header_row=0, usar_cache=True):
+    """
+    Lê uma aba do Google Sheets (exportada em CSV) como DataFrame.
+
+    O resultado é mantido no cache de planilhas do processo (ver fonte_planilhas), com
+    TTL e revalidação por ETag/Last-Modified. Use usar_cache=False para forçar o download.
+    """
     try:
-        # Construir a URL de exportação CSV
-        # A URL fornecida pelo usuário já contém o GID da aba, o que é útil.
-        # Exemplo: https://docs.google.com/spreadsheets/d/1qAuw2ebWPJmcy_gl4Qf48GfmnSGLZumDfs62fpG2BGA/edit?pli=1&gid=1582301730#gid=1582301730
-        # Precisamos extrair o spreadsheet ID e o GID.
-        
-        # Extrair spreadsheet ID
-        match_id = re.search(r'/spreadsheets/d/([a-zA-Z0-9-_]+)', sheet_url)
-        if not match_id:
-            raise ValueError(f"Não foi possível extrair o ID da planilha da URL: {sheet_url}")
-        spreadsheet_id = match_id.group(1)
-
-        # Extrair GID
-        match_gid = re.search(r'gid=(\d+)', sheet_url)
-        if not match_gid:
-            raise ValueError(f"Não foi possível extrair o GID da planilha da URL: {sheet_url}")
-        gid = match_gid.group(1)
-
-        export_url = f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/export?format=csv&gid={gid}"
-        
-        print(f"[CONVERSOR V6] Tentando baixar CSV de: {export_url}", file=sys.stderr)
-        response = requests.get(export_url)
-        response.raise_for_status() # Levanta um erro para códigos de status HTTP ruins
-        
-        # Definir a codificação correta para caracteres especiais
-        response.encoding = 'utf-8'
+        return cache_planilhas.obter(sheet_url, header_row=header_row, usar_cache=usar_cache)
+    except Exception as e:
+        logger.error("Erro ao ler Google Sheet %s (aba: %s): %s", sheet_url, sheet_name, e)
+        raise
+
+def _processar_itens_iterativo(df_orcamento_itens, indice_catalogo, colunas_modelo_olist, campos_cabecalho):
+    """
+    Converte os itens do orçamento linha a linha (motor original, mantido para comparação A/B).
+
+    Args:
+        df_orcamento_itens: DataFrame com os itens do orçamento (colunas já padronizadas)
+        indice_catalogo: CatalogIndex do catálogo de produtos
+        colunas_modelo_olist: Colunas do modelo de saída Olist, na ordem do modelo
+        campos_cabecalho: Valores repetidos em todas as linhas (proposta, data, contato)
+
+    Returns:
+        Tupla (DataFrame de saída, lista de produtos não mapeados)
+    """
+    produtos_nao_mapeados_log = []
+    linhas_saida = []
+    linhas_total = linhas_sem_produto = 0
+    for index, linha_item in df_orcamento_itens.iterrows():
+        produto_orcamento_original = linha_item.get('produto', pd.NA)
+        qtde = linha_item.get('quantidade', pd.NA)
+        if 'valor unitário' in linha_item:
+            valor_unit = linha_item.get('valor unitário')
+        elif 'valor' in linha_item:
+            valor_unit = linha_item.get('valor')
+        else:
+            valor_unit = pd.NA
+
+        # FILTRAR LINHAS DE TOTAL/SUBTOTAL
+        produto_str = str(produto_orcamento_original).lower() if pd.notna(produto_orcamento_original) else ""
+        palavras_total = ['total', 'subtotal', 'valor total', 'total geral', 'soma', 'sum']
+        if any(palavra in produto_str for palavra in palavras_total):
+            linhas_total += 1
+            debug_amostrado(logger, "Pulando linha de total: %s", produto_orcamento_original)
+            continue
+
+        # FILTRAR LINHAS SEM PRODUTO REAL
+        if pd.isna(produto_orcamento_original) or str(produto_orcamento_original).strip() == '':
+            linhas_sem_produto += 1
+            debug_amostrado(logger, "Pulando linha sem produto: %s", linha_item)
+            continue
+
+        # Verificar se temos SKU no orçamento
+        sku_orcamento_original = None
+        if 'sku' in linha_item and pd.notna(linha_item.get('sku')):
+            sku_orcamento_original = linha_item.get('sku')
+            sku_orcamento_busca_normalizado = normalizar_texto(sku_orcamento_original)
+        else:
+            sku_orcamento_busca_normalizado = None
+
+        produto_orcamento_busca_normalizado = normalizar_texto(produto_orcamento_original) if pd.notna(produto_orcamento_original) else ""
+
+        id_produto_olist = pd.NA
+        descricao_produto_olist = pd.NA
+        produto_mapeado = None
+
+        # Priorizar busca pelo SKU se disponível
+        if sku_orcamento_original and sku_orcamento_busca_normalizado:
+            produto_mapeado = indice_catalogo.lookup_sku(sku_orcamento_busca_normalizado)
+            if produto_mapeado is None and produto_orcamento_busca_normalizado:
+                produto_mapeado = indice_catalogo.lookup_modelo(produto_orcamento_busca_normalizado)
+                if produto_mapeado is None:
+                    produtos_nao_mapeados_log.append(
+                        f"'{sku_orcamento_busca_normalizado}' (SKU Original: '{sku_orcamento_original}')"
+                    )
+        elif produto_orcamento_busca_normalizado:
+            produto_mapeado = indice_catalogo.lookup_modelo(produto_orcamento_busca_normalizado)
+            if produto_mapeado is None:
+                produtos_nao_mapeados_log.append(
+                    f"'{produto_orcamento_busca_normalizado}' (Original: '{produto_orcamento_original}')"
+                )
+
+        if produto_mapeado is not None:
+            id_produto_olist, descricao_produto_olist = produto_mapeado
+
+        linha_convertida = {
+            **campos_cabecalho,
+            'ID produto': id_produto_olist,
+            'Descrição': descricao_produto_olist,
+            'Quantidade': qtde if pd.notna(qtde) else pd.NA,
+            'Valor unitário': valor_unit if pd.notna(valor_unit) else pd.NA
+        }
+        debug_amostrado(logger, "Adicionando linha convertida: %s", linha_convertida)
+        linhas_saida.append({col: linha_convertida.get(col, pd.NA) for col in colunas_modelo_olist})
+
+    if linhas_total or linhas_sem_produto:
+        logger.info("Linhas ignoradas: %d de total, %d sem produto.", linhas_total, linhas_sem_produto)
+    return pd.DataFrame(linhas_saida), produtos_nao_mapeados_log
+
+@dataclass
+class ResultadoConversao:
+    """Resultado completo de uma conversão, para quem precisa de mais que o DataFrame."""
+    df: pd.DataFrame
+    cliente: dict = field(default_factory=dict)  # registro do cliente na planilha de clientes
+    numero_proposta: Optional[str] = None
+    data_proposta: Optional[pd.Timestamp] = None
+    produtos_nao_mapeados: list = field(default_factory=list)
+    tempos: dict = field(default_factory=dict)  # segundos gastos em cada etapa
+    erro: Optional[str] = None
+
+    @property
+    def nome_cliente(self):
+        return self.cliente.get('Nome')
+
+
+class _Cronometro:
+    """Acumula em `tempos` o tempo decorrido desde a marcação anterior e avisa o acompanhamento, se houver."""
+
+    def __init__(self, tempos, ao_concluir_etapa=None):
+        self.tempos = tempos
+        self.ao_concluir_etapa = ao_concluir_etapa
+        self.inicio = self.ultimo = time.perf_counter()
+
+    def marcar(self, etapa):
+        agora = time.perf_counter()
+        self.tempos[etapa] = self.tempos.get(etapa, 0.0) + (agora - self.ultimo)
+        self.ultimo = agora
+        if self.ao_concluir_etapa is not None:
+            self.ao_concluir_etapa(etapa)
+
+    def acumular(self, tempos):
+        """Soma tempos medidos à parte (ex.: em outras threads) e recomeça a contagem da próxima etapa."""
+        for etapa, segundos in tempos.items():
+            self.tempos[etapa] = self.tempos.get(etapa, 0.0) + segundos
+        self.ultimo = time.perf_counter()
+        if self.ao_concluir_etapa is not None:
+            for etapa in tempos:
+                self.ao_concluir_etapa(etapa)
+
+    def finalizar(self):
+        self.tempos['total'] = time.perf_counter() - self.inicio
+
+def _ler_itens_aba(arquivo_orcamento, aba, cronometro):
+    """
+    Lê uma aba do orçamento: cabeçalho (ou perfil de layout), mapeamento das colunas,
+    metadados da proposta e as linhas com produtos.
+
+    Returns:
+        Tupla (DataFrame dos itens com as colunas padronizadas, número da proposta, data da proposta)
+
+    Raises:
+        ValueError: se o cabeçalho não for encontrado
+    """
+    # Leitura do arquivo de orçamento (uma única passagem pela aba)
+    leitor_orcamento = LeitorOrcamento(arquivo_orcamento, aba=aba)
+    try:
+        df_orcamento_preview = leitor_orcamento.previa()
+        cronometro.marcar('leitura_orcamento')
         
-        df = pd.read_csv(io.StringIO(response.text), encoding='utf-8')
+        linha_cabecalho, perfil_layout, impressoes_layout = localizar_cabecalho(df_orcamento_preview)
+        if linha_cabecalho is None:
+            raise ValueError("Não foi possível identificar o cabeçalho do orçamento. Verifique se o arquivo contém as colunas necessárias.")
+        cronometro.marcar('cabecalho')
         
-        # Se o cabeçalho não for a primeira linha, precisamos ajustar
-        if header_row > 0:
-            # Ler novamente, mas pulando as linhas até o cabeçalho
-            df = pd.read_csv(io.StringIO(response.text), skiprows=header_row, encoding='utf-8')
-
-        # Tenta converter colunas numéricas
-        for col in df.columns:
-            try:
-                df[col] = pd.to_numeric(df[col], errors='ignore')
-            except:
-                pass
+        # Continuar a leitura do mesmo fluxo, agora com o cabeçalho correto
+        df_orcamento = leitor_orcamento.ler_dataframe(linha_cabecalho)
+    finally:
+        leitor_orcamento.fechar()
+    cronometro.marcar('leitura_orcamento')
+    
+    # Mapear colunas para nomes padronizados (no perfil, pela posição da coluna)
+    mapeamento_colunas = mapeamento_colunas_layout(df_orcamento.columns, perfil_layout)
+    df_orcamento_original = df_orcamento
+    df_orcamento = mapear_colunas_orcamento(df_orcamento, mapeamento_colunas)
+    
+    # Extrair informações do orçamento
+    num_proposta_orc, data_proposta_orc, posicoes_metadados = extrair_metadados_orcamento(
+        df_orcamento_preview, linha_cabecalho, perfil_layout.posicoes_metadados if perfil_layout else None
+    )
+    if perfil_layout is None and impressoes_layout:
+        repositorio_perfis.salvar(impressoes_layout[linha_cabecalho], PerfilLayout(
+            linha_cabecalho,
+            [[posicao, mapeamento_colunas[coluna]] for posicao, coluna in enumerate(df_orcamento_original.columns)
+             if coluna in mapeamento_colunas],
+            posicoes_metadados,
+        ))
+    
+    # Filtrar apenas as linhas com produtos (remover linhas vazias ou de cabeçalho)
+    # MODIFICAÇÃO: Considerar tanto produto quanto SKU para manter linhas
+    if 'produto' in df_orcamento.columns and 'sku' in df_orcamento.columns:
+        # Manter linhas que tenham produto OU sku preenchidos
+        df_orcamento_itens = df_orcamento.dropna(subset=['produto', 'sku'], how='all')
+        logger.debug("Filtrando linhas com produto OU sku preenchidos. Linhas restantes: %d", len(df_orcamento_itens))
+    elif 'produto' in df_orcamento.columns:
+        df_orcamento_itens = df_orcamento.dropna(subset=['produto'], how='all')
+        logger.debug("Filtrando linhas com produto preenchido. Linhas restantes: %d", len(df_orcamento_itens))
+    elif 'sku' in df_orcamento.columns:
+        df_orcamento_itens = df_orcamento.dropna(subset=['sku'], how='all')
+        logger.debug("Filtrando linhas com sku preenchido. Linhas restantes: %d", len(df_orcamento_itens))
+    else:
+        # Tentar encontrar uma coluna que possa conter produtos
+        colunas_possiveis = [col for col in df_orcamento.columns if any(
+            termo in normalizar_texto(col) for termo in ['produto', 'item', 'descricao', 'descrição']
+        )]
         
-        return df
-    except Exception as e:
-        print(f"[CONVERSOR V6] Erro ao ler Google Sheet {sheet_url} (aba: {sheet_name}): {str(e)}", file=sys.stderr)
-        raise
+        if colunas_possiveis:
+            df_orcamento_itens = df_orcamento.dropna(subset=[colunas_possiveis[0]], how='all')
+            # Renomear para 'produto' para compatibilidade
+            df_orcamento_itens = df_orcamento_itens.rename(columns={colunas_possiveis[0]: 'produto'})
+        else:
+            # Se não encontrar nenhuma coluna adequada, usar a primeira coluna não numérica
+            colunas_nao_numericas = [col for col in df_orcamento.columns 
+                                    if not pd.api.types.is_numeric_dtype(df_orcamento[col])]
+            
+            if colunas_nao_numericas:
+                df_orcamento_itens = df_orcamento.dropna(subset=[colunas_nao_numericas[0]], how='all')
+                # Renomear para 'produto' para compatibilidade
+                df_orcamento_itens = df_orcamento_itens.rename(columns={colunas_nao_numericas[0]: 'produto'})
+            else:
+                # Último recurso: usar a primeira coluna
+                primeira_coluna = df_orcamento.columns[0]
+                df_orcamento_itens = df_orcamento.dropna(subset=[primeira_coluna], how='all')
+                # Renomear para 'produto' para compatibilidade
+                df_orcamento_itens = df_orcamento_itens.rename(columns={primeira_coluna: 'produto'})
+    
+    cronometro.marcar('preparacao')
+    return df_orcamento_itens, num_proposta_orc, data_proposta_orc
+
+def _ler_itens_todas_abas(arquivo_orcamento, cronometro):
+    """
+    Lê todas as abas do orçamento em paralelo (cada uma com busca do cabeçalho e mapeamento
+    das colunas próprios) e junta os itens, na ordem das abas. Abas sem cabeçalho (capa,
+    condições comerciais) são ignoradas; proposta e data vêm da primeira aba que as tiver.
+
+    Returns:
+        Tupla (DataFrame dos itens, número da proposta, data da proposta), como _ler_itens_aba
+
+    Raises:
+        ValueError: se nenhuma aba tiver cabeçalho
+    """
+    abas = abas_orcamento(arquivo_orcamento)
+    if isinstance(arquivo_orcamento, (str, os.PathLike)):
+        def abrir_fonte():
+            return arquivo_orcamento
+    else:
+        # Cada thread lê de um BytesIO próprio: o arquivo recebido não pode ser percorrido por duas ao mesmo tempo
+        arquivo_orcamento.seek(0)
+        conteudo = arquivo_orcamento.read()
+        def abrir_fonte():
+            return io.BytesIO(conteudo)
+
+    def ler_aba(aba):
+        tempos_aba = {}
+        try:
+            return _ler_itens_aba(abrir_fonte(), aba, _Cronometro(tempos_aba)), tempos_aba, None
+        except ValueError as e:
+            return None, tempos_aba, e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(abas), MAX_THREADS_ABAS)),
+                            thread_name_prefix='abas-orcamento') as executor:
+        # Contexto copiado para o log de cada aba manter o ID de correlação da requisição
+        futuros = [executor.submit(contextvars.copy_context().run, ler_aba, aba) for aba in abas]
+        resultados = [futuro.result() for futuro in futuros]
+
+    tempos = {}
+    partes = []
+    num_proposta_orc = data_proposta_orc = None
+    primeiro_erro = None
+    for aba, (lido, tempos_aba, erro) in zip(abas, resultados):
+        for etapa, segundos in tempos_aba.items():
+            tempos[etapa] = tempos.get(etapa, 0.0) + segundos
+        if lido is None:
+            logger.info("Aba '%s' ignorada: %s", aba, erro)
+            primeiro_erro = primeiro_erro or erro
+            continue
+        df_itens_aba, num_proposta_aba, data_proposta_aba = lido
+        partes.append(df_itens_aba)
+        if num_proposta_orc is None:
+            num_proposta_orc = num_proposta_aba
+        if data_proposta_orc is None:
+            data_proposta_orc = data_proposta_aba
+    cronometro.acumular(tempos)
+
+    if not partes:
+        raise primeiro_erro or ValueError("O orçamento não tem abas.")
+    logger.debug("%d de %d aba(s) com itens", len(partes), len(abas))
+    df_orcamento_itens = partes[0] if len(partes) == 1 else pd.concat(partes, ignore_index=True)
+    return df_orcamento_itens, num_proposta_orc, data_proposta_orc
 
 def converter_orcamento_para_olist(
     arquivo_orcamento: Union[str, BinaryIO],
     url_mapeamento_produtos: str,
     url_clientes: str,
     id_cliente_selecionado: Union[str, int],
-    caminho_modelo_saida_olist_com_dados: str
+    caminho_modelo_saida_olist_com_dados: str,
+    motor: str = None,
+    dados_referencia: Optional[DadosReferencia] = None,
+    todas_abas: bool = False
 ) -> pd.DataFrame:
     """
     Converte um arquivo de orçamento para o formato Olist.
     
     Args:
-        arquivo_orcamento: Caminho do arquivo ou objeto BytesIO contendo o orçamento
+        arquivo_orcamento: Caminho do arquivo ou objeto BytesIO contendo o orçamento (.xlsx ou CSV/TSV)
         url_mapeamento_produtos: URL da planilha de mapeamento de produtos no Google Sheets
         url_clientes: URL da planilha de clientes no Google Sheets
         id_cliente_selecionado: ID do cliente selecionado
-        caminho_modelo_saida_olist_com_dados: Caminho do arquivo modelo de saída (ainda local)
+        caminho_modelo_saida_olist_com_dados: Caminho do arquivo modelo de saída (ainda local) ou nome de um modelo registrado
+        motor: 'vetorizado' ou 'iterativo' (padrão: variável OLIST_MOTOR_CONVERSAO ou 'vetorizado')
+        dados_referencia: Catálogo/clientes já carregados (padrão: obtidos das URLs, pelo snapshot compartilhado)
+        todas_abas: Converte os itens de todas as abas do .xlsx, e não só os da primeira
         
     Returns:
         DataFrame com o orçamento convertido no formato Olist
     """
-    df_modelo_saida_temp = None
+    return converter_orcamento_para_olist_detalhado(
+        arquivo_orcamento,
+        url_mapeamento_produtos,
+        url_clientes,
+        id_cliente_selecionado,
+        caminho_modelo_saida_olist_com_dados,
+        motor=motor,
+        dados_referencia=dados_referencia,
+        todas_abas=todas_abas
+    ).df
+
+def converter_orcamento_para_olist_detalhado(
+    arquivo_orcamento: Union[str, BinaryIO],
+    url_mapeamento_produtos: str,
+    url_clientes: str,
+    id_cliente_selecionado: Union[str, int],
+    caminho_modelo_saida_olist_com_dados: str,
+    motor: str = None,
+    dados_referencia: Optional[DadosReferencia] = None,
+    ao_concluir_etapa: Optional[Callable[[str], None]] = None,
+    todas_abas: bool = False
+) -> ResultadoConversao:
+    """
+    Converte um arquivo de orçamento para o formato Olist, retornando também o cliente,
+    os dados da proposta, os produtos não mapeados e o tempo de cada etapa.
+    
+    Args:
+        arquivo_orcamento: Caminho do arquivo ou objeto BytesIO contendo o orçamento (.xlsx ou CSV/TSV)
+        url_mapeamento_produtos: URL da planilha de mapeamento de produtos no Google Sheets
+        url_clientes: URL da planilha de clientes no Google Sheets
+        id_cliente_selecionado: ID do cliente selecionado
+        caminho_modelo_saida_olist_com_dados: Caminho do arquivo modelo de saída (ainda local) ou nome de um modelo registrado
+        motor: 'vetorizado' ou 'iterativo' (padrão: variável OLIST_MOTOR_CONVERSAO ou 'vetorizado')
+        dados_referencia: Catálogo/clientes já carregados (padrão: obtidos das URLs, pelo snapshot compartilhado)
+        ao_concluir_etapa: Função chamada com o nome de cada etapa concluída (acompanhamento de progresso)
+        todas_abas: Converte os itens de todas as abas do .xlsx, e não só os da primeira
+        
+    Returns:
+        ResultadoConversao (em caso de erro, com df vazio e a mensagem em `erro`)
+    """
     colunas_modelo_olist = []
-    produtos_nao_mapeados_log = [] # Lista para logar produtos não mapeados
+    caminho_modelo_saida_olist_com_dados = registro_modelos.resolver(caminho_modelo_saida_olist_com_dados)
+    resultado = ResultadoConversao(df=pd.DataFrame())
+    cronometro = _Cronometro(resultado.tempos, ao_concluir_etapa)
     
-    # Adicionar diagnóstico para verificar os arquivos
-    print(f"[DIAGNÓSTICO] Verificando existência dos arquivos:")
-    print(f"[DIAGNÓSTICO] Tipo arquivo_orcamento: {type(arquivo_orcamento)}")
-    print(f"[DIAGNÓSTICO] url_mapeamento_produtos: {url_mapeamento_produtos}")
-    print(f"[DIAGNÓSTICO] url_clientes: {url_clientes}")
-    print(f"[DIAGNÓSTICO] caminho_modelo_saida_olist_com_dados: {caminho_modelo_saida_olist_com_dados} (Existe: {os.path.exists(caminho_modelo_saida_olist_com_dados)})")
+    logger.debug("Entradas da conversão: orçamento=%s, mapeamento=%s, clientes=%s, modelo=%s",
+                 type(arquivo_orcamento).__name__, url_mapeamento_produtos, url_clientes,
+                 caminho_modelo_saida_olist_com_dados)
     
     # Verificar se o arquivo modelo de saída local existe
     if not os.path.exists(caminho_modelo_saida_olist_com_dados):
         erro_msg = f"Arquivo de modelo de saída não encontrado: {caminho_modelo_saida_olist_com_dados}"
-        print(f"[CONVERSOR V6] ERRO: {erro_msg}", file=sys.stderr)
+        logger.error(erro_msg)
         raise FileNotFoundError(erro_msg)
     
-    print(f"[CONVERSOR V6] Iniciando conversão. Cliente ID: {id_cliente_selecionado}", file=sys.stderr)
+    logger.debug("Iniciando conversão. Cliente ID: %s", id_cliente_selecionado)
     
     try:
-        print(f"[CONVERSOR V6] Lendo planilha de mapeamento: {url_mapeamento_produtos}", file=sys.stderr)
-        df_mapeamento = get_dataframe_from_google_sheet(url_mapeamento_produtos, sheet_name='CATÁLOGO')
-        
-        # Normalizar a coluna de busca no mapeamento
-        if 'SKU' in df_mapeamento.columns:
-            df_mapeamento['SKU_NORMALIZADO_BUSCA'] = df_mapeamento['SKU'].apply(normalizar_texto)
-            print(f"[CONVERSOR V6] Coluna 'SKU' normalizada para busca em df_mapeamento.", file=sys.stderr)
-        else:
-            print(f"[CONVERSOR V6] ERRO: Coluna 'SKU' não encontrada em {url_mapeamento_produtos}", file=sys.stderr)
-            return pd.DataFrame(columns=colunas_modelo_olist if colunas_modelo_olist else [])
+        # Catálogo, clientes e índice do catálogo (compartilhados entre os processos pelo snapshot)
+        if dados_referencia is None:
+            dados_referencia = obter_dados_referencia(url_mapeamento_produtos, url_clientes)
+        df_clientes = dados_referencia.clientes
+        indice_catalogo = dados_referencia.indice
+        if indice_catalogo is None:
+            logger.error("Coluna 'SKU' não encontrada em %s", url_mapeamento_produtos)
+            resultado.erro = "Coluna 'SKU' não encontrada na planilha de mapeamento"
+            resultado.df = pd.DataFrame(columns=colunas_modelo_olist if colunas_modelo_olist else [])
+            cronometro.finalizar()
+            registrar_conversao(resultado)
+            return resultado
+        cronometro.marcar('referencia')
         
-        print(f"[CONVERSOR V6] Lendo planilha de clientes: {url_clientes}", file=sys.stderr)
-        df_clientes = get_dataframe_from_google_sheet(url_clientes, sheet_name='clientes')
+        # Esquema de colunas do modelo de saída (lido do disco apenas quando o arquivo muda)
+        colunas_modelo_olist = registro_modelos.colunas(caminho_modelo_saida_olist_com_dados)
+        logger.debug("Colunas do modelo de saída: %s", colunas_modelo_olist)
+        cronometro.marcar('modelo')
         
-        print(f"[CONVERSOR V6] Lendo NOVO arquivo modelo de saída com dados: {caminho_modelo_saida_olist_com_dados}", file=sys.stderr)
-        with pd.ExcelFile(caminho_modelo_saida_olist_com_dados) as xls_modelo_novo:
-            if xls_modelo_novo.sheet_names:
-                df_modelo_saida_temp = pd.read_excel(xls_modelo_novo, sheet_name=0)
-                print(f"[CONVERSOR V6] Lida a primeira aba do NOVO modelo de saída: {xls_modelo_novo.sheet_names[0]}", file=sys.stderr)
-            else:
-                raise ValueError("O NOVO arquivo Excel modelo de saída não contém nenhuma aba.")
-            
-            colunas_modelo_olist = df_modelo_saida_temp.columns.tolist()
-            print(f"[CONVERSOR V6] Colunas do NOVO modelo Olist: {colunas_modelo_olist}", file=sys.stderr)
-        
-        # Leitura do arquivo de orçamento
-        print(f"[CONVERSOR V6] Lendo arquivo de orçamento", file=sys.stderr)
-        if isinstance(arquivo_orcamento, str):
-            with pd.ExcelFile(arquivo_orcamento) as xls_orc:
-                df_orcamento_preview = pd.read_excel(xls_orc, sheet_name=0, nrows=20, header=None)
-        else:  # BytesIO
-            df_orcamento_preview = pd.read_excel(arquivo_orcamento, sheet_name=0, nrows=20, header=None)
-            arquivo_orcamento.seek(0)  # Resetar posição para leitura posterior
-        
-        # Identificar linha de cabeçalho
-        palavras_chave_cabecalho = ['produto', 'quantidade', 'valor']
-        linha_cabecalho = encontrar_linha_cabecalho(df_orcamento_preview, palavras_chave_cabecalho)
-        
-        if linha_cabecalho is None:
-            raise ValueError("Não foi possível identificar o cabeçalho do orçamento. Verifique se o arquivo contém as colunas necessárias.")
-        
-        # Ler o arquivo novamente, agora com o cabeçalho correto
-        if isinstance(arquivo_orcamento, str):
-            df_orcamento = pd.read_excel(arquivo_orcamento, sheet_name=0, header=linha_cabecalho)
-        else:  # BytesIO
-            df_orcamento = pd.read_excel(arquivo_orcamento, sheet_name=0, header=linha_cabecalho)
-        
-        # Mapear colunas para nomes padronizados
-        df_orcamento = mapear_colunas_orcamento(df_orcamento)
-        
-        # Extrair informações do orçamento
-        num_proposta_orc = None
-        data_proposta_orc = None
-        
-        # Melhorar a extração de número da proposta e data
-        for i in range(linha_cabecalho):
-            row = df_orcamento_preview.iloc[i]
-            for j, cell in enumerate(row):
-                if pd.notna(cell):
-                    cell_str = str(cell).lower()
-                    
-                    # Extração de número da proposta
-                    if 'proposta' in cell_str or 'orçamento' in cell_str or 'orcamento' in cell_str:
-                        # Tentar extrair número da proposta da mesma célula
-                        match = re.search(r'(?:proposta|orçamento|orcamento)[^\d]*(\d+)', cell_str)
-                        if match:
-                            num_proposta_orc = match.group(1)
-                        # Se não encontrar na mesma célula, verificar a célula à direita
-                        elif j+1 < len(row) and pd.notna(row[j+1]):
-                            next_cell = str(row[j+1])
-                            if re.match(r'^\d+$', next_cell.strip()):
-                                num_proposta_orc = next_cell.strip()
-                    
-                    # Extração de data
-                    if 'data' in cell_str:
-                        # Verificar a célula à direita para data
-                        if j+1 < len(row) and pd.notna(row[j+1]):
-                            try:
-                                # Tentar converter para data
-                                data_cell = row[j+1]
-                                if isinstance(data_cell, (pd.Timestamp, pd.DatetimeTZDtype)):
-                                    data_proposta_orc = data_cell
-                                else:
-                                    # Tentar converter string para data com dayfirst=True para formato brasileiro (dia/mês/ano)
-                                    data_proposta_orc = pd.to_datetime(data_cell, dayfirst=True, errors='coerce')
-                                    if pd.isna(data_proposta_orc):
-                                        # Tentar formatos comuns de data
-                                        for fmt in ['%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%d.%m.%Y']:
-                                            try:
-                                                data_proposta_orc = pd.to_datetime(data_cell, format=fmt, dayfirst=True)
-                                                break
-                                            except:
-                                                continue
-                            except Exception as e:
-                                print(f"[CONVERSOR V6] Erro ao extrair data: {str(e)}", file=sys.stderr)
-        
-        # Filtrar apenas as linhas com produtos (remover linhas vazias ou de cabeçalho)
-        # MODIFICAÇÃO: Considerar tanto produto quanto SKU para manter linhas
-        if 'produto' in df_orcamento.columns and 'sku' in df_orcamento.columns:
-            # Manter linhas que tenham produto OU sku preenchidos
-            df_orcamento_itens = df_orcamento.dropna(subset=['produto', 'sku'], how='all')
-            print(f"[CONVERSOR V6] Filtrando linhas com produto OU sku preenchidos. Linhas restantes: {len(df_orcamento_itens)}", file=sys.stderr)
-        elif 'produto' in df_orcamento.columns:
-            df_orcamento_itens = df_orcamento.dropna(subset=['produto'], how='all')
-            print(f"[CONVERSOR V6] Filtrando linhas com produto preenchido. Linhas restantes: {len(df_orcamento_itens)}", file=sys.stderr)
-        elif 'sku' in df_orcamento.columns:
-            df_orcamento_itens = df_orcamento.dropna(subset=['sku'], how='all')
-            print(f"[CONVERSOR V6] Filtrando linhas com sku preenchido. Linhas restantes: {len(df_orcamento_itens)}", file=sys.stderr)
+        # Leitura do orçamento: a primeira aba ou, com todas_abas, cada aba em paralelo
+        if todas_abas:
+            df_orcamento_itens, num_proposta_orc, data_proposta_orc = _ler_itens_todas_abas(arquivo_orcamento, cronometro)
         else:
-            # Tentar encontrar uma coluna que possa conter produtos
-            colunas_possiveis = [col for col in df_orcamento.columns if any(
-                termo in normalizar_texto(col) for termo in ['produto', 'item', 'descricao', 'descrição']
-            )]
-            
-            if colunas_possiveis:
-                df_orcamento_itens = df_orcamento.dropna(subset=[colunas_possiveis[0]], how='all')
-                # Renomear para 'produto' para compatibilidade
-                df_orcamento_itens = df_orcamento_itens.rename(columns={colunas_possiveis[0]: 'produto'})
-            else:
-                # Se não encontrar nenhuma coluna adequada, usar a primeira coluna não numérica
-                colunas_nao_numericas = [col for col in df_orcamento.columns 
-                                        if not pd.api.types.is_numeric_dtype(df_orcamento[col])]
-                
-                if colunas_nao_numericas:
-                    df_orcamento_itens = df_orcamento.dropna(subset=[colunas_nao_numericas[0]], how='all')
-                    # Renomear para 'produto' para compatibilidade
-                    df_orcamento_itens = df_orcamento_itens.rename(columns={colunas_nao_numericas[0]: 'produto'})
-                else:
-                    # Último recurso: usar a primeira coluna
-                    primeira_coluna = df_orcamento.columns[0]
-                    df_orcamento_itens = df_orcamento.dropna(subset=[primeira_coluna], how='all')
-                    # Renomear para 'produto' para compatibilidade
-                    df_orcamento_itens = df_orcamento_itens.rename(columns={primeira_coluna: 'produto'})
+            df_orcamento_itens, num_proposta_orc, data_proposta_orc = _ler_itens_aba(arquivo_orcamento, 0, cronometro)
         
         # Buscar informações do cliente
-        info_cliente_df = pd.DataFrame()
-        if not df_clientes.empty and 'ID' in df_clientes.columns:
-            try:
-                coluna_id_tipo = df_clientes['ID'].dtype
-                id_cliente_selecionado_str = str(id_cliente_selecionado)
-                
-                if pd.api.types.is_numeric_dtype(coluna_id_tipo):
-                    try:
-                        id_cliente_convertido = int(float(id_cliente_selecionado_str))
-                    except ValueError:
-                        id_cliente_convertido = float(id_cliente_selecionado_str)
-                else:
-                    id_cliente_convertido = id_cliente_selecionado_str
-                    
-                info_cliente_df = df_clientes[df_clientes['ID'] == id_cliente_convertido]
-            except Exception as e:
-                print(f"[CONVERSOR V6] Erro ao buscar cliente: {str(e)}", file=sys.stderr)
-        
+        info_cliente_df = buscar_cliente(df_clientes, id_cliente_selecionado)
         if info_cliente_df.empty:
             raise ValueError(f"Cliente com ID '{id_cliente_selecionado}' não encontrado")
         
         info_cliente = info_cliente_df.iloc[0]
         id_contato_cliente = info_cliente['ID']
         nome_contato_cliente = info_cliente['Nome']
+        resultado.cliente = info_cliente.to_dict()
+        resultado.numero_proposta = num_proposta_orc
+        resultado.data_proposta = data_proposta_orc
+        cronometro.marcar('cliente')
         
         # Processamento dos itens
-        linhas_saida = []
-        for index, linha_item in df_orcamento_itens.iterrows():
-            produto_orcamento_original = linha_item.get('produto', pd.NA)
-            qtde = linha_item.get('quantidade', pd.NA)
-            if 'valor unitário' in linha_item:
-                valor_unit = linha_item.get('valor unitário')
-            elif 'valor' in linha_item:
-                valor_unit = linha_item.get('valor')
-            else:
-                valor_unit = pd.NA
-
-            # FILTRAR LINHAS DE TOTAL/SUBTOTAL
-            produto_str = str(produto_orcamento_original).lower() if pd.notna(produto_orcamento_original) else ""
-            palavras_total = ['total', 'subtotal', 'valor total', 'total geral', 'soma', 'sum']
-            if any(palavra in produto_str for palavra in palavras_total):
-                print(f"[CONVERSOR V6] Pulando linha de total: {produto_orcamento_original}", file=sys.stderr)
-                continue
-
-            # FILTRAR LINHAS SEM PRODUTO REAL
-            if pd.isna(produto_orcamento_original) or str(produto_orcamento_original).strip() == '':
-                print(f"[CONVERSOR V6] Pulando linha sem produto: {linha_item}", file=sys.stderr)
-                continue
-
-            # Verificar se temos SKU no orçamento
-            sku_orcamento_original = None
-            if 'sku' in linha_item and pd.notna(linha_item.get('sku')):
-                sku_orcamento_original = linha_item.get('sku')
-                sku_orcamento_busca_normalizado = normalizar_texto(sku_orcamento_original)
-            else:
-                sku_orcamento_busca_normalizado = None
-
-            produto_orcamento_busca_normalizado = normalizar_texto(produto_orcamento_original) if pd.notna(produto_orcamento_original) else ""
-
-            id_produto_olist = pd.NA
-            descricao_produto_olist = pd.NA
-
-            # Priorizar busca pelo SKU se disponível
-            if sku_orcamento_original and sku_orcamento_busca_normalizado:
-                produto_mapeado_df = df_mapeamento[
-                    df_mapeamento['SKU_NORMALIZADO_BUSCA'] == sku_orcamento_busca_normalizado
-                ]
-                if not produto_mapeado_df.empty:
-                    produto_mapeado = produto_mapeado_df.iloc[0]
-                    id_produto_olist = produto_mapeado.get('ID', pd.NA)
-                    descricao_produto_olist = produto_mapeado.get('MODELO OLIST', pd.NA)
-                elif produto_orcamento_busca_normalizado:
-                    produto_mapeado_df = df_mapeamento[
-                        df_mapeamento['MODELO'].apply(normalizar_texto) == produto_orcamento_busca_normalizado
-                    ]
-                    if not produto_mapeado_df.empty:
-                        produto_mapeado = produto_mapeado_df.iloc[0]
-                        id_produto_olist = produto_mapeado.get('ID', pd.NA)
-                        descricao_produto_olist = produto_mapeado.get('MODELO OLIST', pd.NA)
-                    else:
-                        produtos_nao_mapeados_log.append(
-                            f"'{sku_orcamento_busca_normalizado}' (SKU Original: '{sku_orcamento_original}')"
-                        )
-            elif produto_orcamento_busca_normalizado:
-                produto_mapeado_df = df_mapeamento[
-                    df_mapeamento['MODELO'].apply(normalizar_texto) == produto_orcamento_busca_normalizado
-                ]
-                if not produto_mapeado_df.empty:
-                    produto_mapeado = produto_mapeado_df.iloc[0]
-                    id_produto_olist = produto_mapeado.get('ID', pd.NA)
-                    descricao_produto_olist = produto_mapeado.get('MODELO OLIST', pd.NA)
-                else:
-                    produtos_nao_mapeados_log.append(
-                        f"'{produto_orcamento_busca_normalizado}' (Original: '{produto_orcamento_original}')"
-                    )
-
-            linha_convertida = {
-                'Número da proposta': num_proposta_orc if num_proposta_orc is not None else pd.NA,
-                'Data': data_proposta_orc if data_proposta_orc is not None else pd.NA,
-                'ID contato': id_contato_cliente,
-                'Nome do contato': nome_contato_cliente,
-                'ID produto': id_produto_olist,
-                'Descrição': descricao_produto_olist,
-                'Quantidade': qtde if pd.notna(qtde) else pd.NA,
-                'Valor unitário': valor_unit if pd.notna(valor_unit) else pd.NA
-            }
-            print(f"[CONVERSOR V6] Adicionando linha convertida: {linha_convertida}", file=sys.stderr)
-            linhas_saida.append({col: linha_convertida.get(col, pd.NA) for col in colunas_modelo_olist})
+        campos_cabecalho = {
+            'Número da proposta': num_proposta_orc if num_proposta_orc is not None else pd.NA,
+            'Data': data_proposta_orc if data_proposta_orc is not None else pd.NA,
+            'ID contato': id_contato_cliente,
+            'Nome do contato': nome_contato_cliente,
+        }
+        motor = motor or MOTOR_CONVERSAO_PADRAO
+        if motor not in MOTORES_CONVERSAO:
+            raise ValueError(f"Motor de conversão desconhecido: {motor}")
+        if motor == 'vetorizado' and suporta_motor_vetorizado(df_orcamento_itens):
+            df_saida, produtos_nao_mapeados_log = processar_itens_vetorizado(
+                df_orcamento_itens, indice_catalogo, colunas_modelo_olist, campos_cabecalho
+            )
+        else:
+            df_saida, produtos_nao_mapeados_log = _processar_itens_iterativo(
+                df_orcamento_itens, indice_catalogo, colunas_modelo_olist, campos_cabecalho
+            )
         
-        if produtos_nao_mapeados_log:
-            print("[CONVERSOR V6] Produtos não mapeados:", file=sys.stderr)
-            for produto in produtos_nao_mapeados_log:
-                print(f"  - {produto}", file=sys.stderr)
+        cronometro.marcar('itens')
+        resultado.produtos_nao_mapeados = produtos_nao_mapeados_log
         
-        # Criar DataFrame de saída
-        df_saida = pd.DataFrame(linhas_saida)
+        if produtos_nao_mapeados_log:
+            logger.info("%d produto(s) não mapeado(s), ex.: %s", len(produtos_nao_mapeados_log),
+                        '; '.join(produtos_nao_mapeados_log[:EXEMPLOS_NAO_MAPEADOS_LOG]))
+            logger.debug("Produtos não mapeados: %s", produtos_nao_mapeados_log)
         
         # Preencher a coluna 'Situação' com 'Aguardando' para todas as linhas válidas
         if not df_saida.empty:
             df_saida['Situação'] = 'Aguardando'
 
-        return df_saida
+        resultado.df = df_saida
+        cronometro.finalizar()
+        registrar_conversao(resultado)
+        logger.info("Conversão concluída: cliente %s, %d linha(s), %d não mapeado(s), %.3fs",
+                    id_cliente_selecionado, len(df_saida), len(produtos_nao_mapeados_log), resultado.tempos['total'],
+                    extra={'dados': {'cliente_id': str(id_cliente_selecionado), 'linhas': len(df_saida),
+                                     'nao_mapeados': len(produtos_nao_mapeados_log), 'tempos': resultado.tempos}})
+        return resultado
         
     except Exception as e:
-        print(f"[CONVERSOR V6] Erro: {str(e)}\n{traceback.format_exc()}", file=sys.stderr)
-        return pd.DataFrame(columns=colunas_modelo_olist if colunas_modelo_olist else [])
+        logger.error("Erro na conversão (cliente %s): %s", id_cliente_selecionado, e, exc_info=True)
+        resultado.erro = str(e)
+        resultado.df = pd.DataFrame(columns=colunas_modelo_olist if colunas_modelo_olist else [])
+        cronometro.finalizar()
+        registrar_conversao(resultado)
+        return resultado
+
+def _expandir_entradas(entradas):
+    """Orçamentos (.xlsx, .csv, .tsv) indicados por diretórios (recursivo), padrões glob ou caminhos."""
+    import glob
+
+    from lote import EXTENSOES_ORCAMENTO
+
+    caminhos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            encontrados = [caminho for caminho in glob.glob(os.path.join(entrada, '**', '*'), recursive=True)
+                           if caminho.lower().endswith(EXTENSOES_ORCAMENTO)]
+        elif glob.has_magic(entrada):
+            encontrados = glob.glob(entrada, recursive=True)
+        else:
+            encontrados = [entrada]
+        caminhos.extend(
+            caminho for caminho in sorted(encontrados)
+            if os.path.isfile(caminho) and not os.path.basename(caminho).startswith(('~$', '.'))
+        )
+    # Sem repetições, mantendo a ordem
+    return list(dict.fromkeys(caminhos))
+
+
+def _ler_mapa_clientes(caminho_csv):
+    """CSV arquivo → cliente: colunas 'arquivo' e 'cliente_id' ou, sem esse cabeçalho, as duas primeiras."""
+    import csv
+
+    with open(caminho_csv, newline='', encoding='utf-8-sig') as arquivo:
+        amostra = arquivo.read(4096)
+        arquivo.seek(0)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=',;\t')
+        except csv.Error:
+            dialeto = csv.excel
+        linhas = [linha for linha in csv.reader(arquivo, dialeto) if linha and any(c.strip() for c in linha)]
+    if not linhas:
+        return {}
+    cabecalho = [normalizar_texto(c).replace(' ', '_') for c in linhas[0]]
+    if 'arquivo' in cabecalho and 'cliente_id' in cabecalho:
+        i_arquivo, i_cliente = cabecalho.index('arquivo'), cabecalho.index('cliente_id')
+        linhas = linhas[1:]
+    else:
+        i_arquivo, i_cliente = 0, 1
+    return {linha[i_arquivo].strip(): linha[i_cliente].strip() for linha in linhas if len(linha) > max(i_arquivo, i_cliente)}
+
+
+def main(argv=None):
+    """
+    Conversão em massa pela linha de comando.
+
+    Exemplos (a partir da pasta src):
+        python -m conversor_olist orcamentos/ --cliente 753318009 --saida convertidos/
+        python -m conversor_olist "historico/**/*.xlsx" --mapa-clientes clientes.csv --workers 8 --fonte local
+        python -m conversor_olist orcamentos/ --cliente 753318009 --formato csv
+        python -m conversor_olist cotacao_por_abas.xlsx --cliente 753318009 --todas-abas
+    """
+    import argparse
+    import csv
+    import json
+
+    from dados_referencia import CATALOGO_LOCAL_PADRAO, CLIENTES_LOCAL_PADRAO, carregar_dados_referencia_locais
+    from lote import itens_de_caminhos, iterar_lote, nome_unico, resumo_lote
+    from saida_olist import FORMATO_SAIDA_PADRAO, MIMETYPES_SAIDA, validar_formato_saida
+
+    parser = argparse.ArgumentParser(prog='python -m conversor_olist', description='Converte orçamentos (.xlsx, .csv, .tsv) para o formato Olist em lote.')
+    parser.add_argument('entradas', nargs='+', help='Diretórios, padrões glob ou arquivos de orçamento (.xlsx, .csv, .tsv)')
+    parser.add_argument('--cliente', help='ID do cliente dos orçamentos que não estão no mapa de clientes')
+    parser.add_argument('--mapa-clientes', help="CSV com as colunas 'arquivo' e 'cliente_id'")
+    parser.add_argument('--saida', default='convertidos', help='Diretório dos arquivos convertidos (padrão: convertidos)')
+    parser.add_argument('--workers', type=int, default=None, help='Processos de conversão (padrão: um por núcleo)')
+    parser.add_argument('--fonte', choices=('google', 'local'), default='google',
+                        help='Catálogo e clientes do Google Sheets ou das cópias locais em src/data (padrão: google)')
+    parser.add_argument('--url-catalogo', default=URL_PLANILHA_MAPEAMENTO, help='URL da planilha de mapeamento de produtos')
+    parser.add_argument('--url-clientes', default=URL_PLANILHA_CLIENTES, help='URL da planilha de clientes')
+    parser.add_argument('--catalogo-local', default=CATALOGO_LOCAL_PADRAO, help='Cópia .xlsx do catálogo (com --fonte local)')
+    parser.add_argument('--clientes-local', default=CLIENTES_LOCAL_PADRAO, help='Cópia .xlsx dos clientes (com --fonte local)')
+    parser.add_argument('--modelo', default=MODELO_SAIDA_PADRAO, help='Arquivo modelo de saída Olist')
+    parser.add_argument('--formato', default=FORMATO_SAIDA_PADRAO, choices=tuple(MIMETYPES_SAIDA), type=str.lower,
+                        help='Formato dos arquivos convertidos: xlsx (padrão), csv, json ou parquet')
+    parser.add_argument('--todas-abas', action='store_true',
+                        help='Converte os itens de todas as abas de cada .xlsx (padrão: só a primeira)')
+    parser.add_argument('--nivel-log', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'), type=str.upper,
+                        help='Nível das mensagens de log em stderr (padrão: OLIST_LOG_NIVEL ou WARNING)')
+    args = parser.parse_args(argv)
+    # O andamento do lote já é impresso em stdout; o log por conversão só aparece se pedido
+    configurar_logging(args.nivel_log or os.environ.get('OLIST_LOG_NIVEL', 'WARNING'))
+
+    if not args.cliente and not args.mapa_clientes:
+        parser.error('informe --cliente e/ou --mapa-clientes')
+    try:
+        validar_formato_saida(args.formato)
+    except ValueError as e:
+        parser.error(str(e))
+
+    caminhos = _expandir_entradas(args.entradas)
+    if not caminhos:
+        parser.error('nenhum orçamento (.xlsx, .csv, .tsv) encontrado nas entradas informadas')
+
+    clientes_por_arquivo = _ler_mapa_clientes(args.mapa_clientes) if args.mapa_clientes else {}
+    base = args.entradas[0] if len(args.entradas) == 1 and os.path.isdir(args.entradas[0]) else None
+    itens = itens_de_caminhos(caminhos, clientes_por_arquivo, args.cliente, base=base)
+
+    inicio = time.perf_counter()
+    # Catálogo, clientes e modelo carregados uma única vez para o lote inteiro
+    if args.fonte == 'local':
+        dados_referencia = carregar_dados_referencia_locais(args.catalogo_local, args.clientes_local)
+    else:
+        dados_referencia = obter_dados_referencia(args.url_catalogo, args.url_clientes)
+    registro_modelos.colunas(args.modelo)
+
+    os.makedirs(args.saida, exist_ok=True)
+    nomes_usados = set()
+    resultados = []
+    for resultado in iterar_lote(itens, args.url_catalogo, args.url_clientes, args.modelo, dados_referencia, args.workers,
+                                 args.formato, args.todas_abas):
+        if resultado.status == 'ok':
+            resultado.arquivo_saida = nome_unico(resultado.arquivo_saida, nomes_usados)
+            with open(os.path.join(args.saida, resultado.arquivo_saida), 'wb') as arquivo:
+                arquivo.write(resultado.conteudo_saida)
+            resultado.conteudo_saida = None
+        resultados.append(resultado)
+        print(f"[{len(resultados)}/{len(itens)}] {resultado.status.upper():4} {resultado.arquivo}"
+              + (f" -> {resultado.arquivo_saida}" if resultado.status == 'ok' else f": {resultado.erro}"))
+    duracao = time.perf_counter() - inicio
+
+    # Relatório: JSON completo e CSV resumido (uma linha por orçamento)
+    resumo = resumo_lote(resultados)
+    resumo['duracao_segundos'] = round(duracao, 2)
+    resumo['fonte'] = args.fonte
+    resumo['versoes_referencia'] = dados_referencia.versoes
+    with open(os.path.join(args.saida, 'relatorio_conversao.json'), 'w', encoding='utf-8') as arquivo:
+        json.dump(resumo, arquivo, ensure_ascii=False, indent=2, default=str)
+    with open(os.path.join(args.saida, 'relatorio_conversao.csv'), 'w', newline='', encoding='utf-8-sig') as arquivo:
+        escritor = csv.writer(arquivo, delimiter=';')
+        escritor.writerow(['arquivo', 'cliente_id', 'status', 'arquivo_saida', 'linhas', 'produtos_nao_mapeados', 'erro', 'segundos'])
+        for resultado in resultados:
+            escritor.writerow([
+                resultado.arquivo, resultado.cliente_id, resultado.status, resultado.arquivo_saida or '',
+                resultado.linhas, len(resultado.produtos_nao_mapeados), resultado.erro or '',
+                round(resultado.tempos.get('total', 0.0), 3),
+            ])
+
+    print(f"\n{resumo['convertidos']} de {resumo['total']} orçamento(s) convertido(s), {resumo['com_erro']} com erro, "
+          f"em {duracao:.1f}s ({len(resultados) / duracao if duracao else 0:.1f} arquivos/s). Relatório em {args.saida}")
+    return 0 if resumo['com_erro'] == 0 else 1
+
 
-if __name__ == '__main__': 
-    pass
+if __name__ == '__main__':
+    sys.exit(main())
 
 
@@ -0,0 +1,186 @@
+"""
+Dados de referência da conversão: catálogo de produtos, clientes e índice do catálogo.
+
+Os três são montados juntos a partir das planilhas do Google Sheets e, por padrão,
+compartilhados entre os processos da aplicação pelo snapshot em disco
+(ver snapshot_referencia). Com OLIST_SNAPSHOT_REFERENCIA=0 cada processo usa
+apenas o cache em memória das planilhas.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import pandas as pd
+
+from fonte_planilhas import EsquemaPlanilha, aplicar_esquema, cache_planilhas, TTL_PADRAO_SEGUNDOS
+from indice_catalogo import CatalogIndex, compactar_catalogo, memoria_dataframe, obter_indice_catalogo
+from leitores_xlsx import ler_excel
+from snapshot_referencia import SnapshotReferencia
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_HABILITADO = os.environ.get('OLIST_SNAPSHOT_REFERENCIA', '1') != '0'
+
+# Cópias locais das planilhas (uso offline, ex.: linha de comando com --fonte local)
+DIRETORIO_DADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+CATALOGO_LOCAL_PADRAO = os.path.join(DIRETORIO_DADOS, 'PLanilha mapeamento Orçamento Olist.xlsx')
+CLIENTES_LOCAL_PADRAO = os.path.join(DIRETORIO_DADOS, 'clientes.xlsx')
+
+# Colunas lidas pelo conversor; as demais colunas das planilhas não são carregadas
+ESQUEMA_CATALOGO = EsquemaPlanilha('catalogo', (
+    ('SKU', 'texto'),
+    ('MODELO', 'texto'),
+    ('ID', 'numero'),
+    ('MODELO OLIST', 'texto'),
+))
+ESQUEMA_CLIENTES = EsquemaPlanilha('clientes', (
+    ('ID', 'numero'),
+    ('Nome', 'texto'),
+))
+
+
+@dataclass
+class DadosReferencia:
+    """Catálogo, clientes e índice do catálogo de uma mesma atualização."""
+    catalogo: pd.DataFrame  # produtos compactos: ID e MODELO OLIST (ver indice_catalogo.compactar_catalogo)
+    clientes: pd.DataFrame
+    indice: Optional[CatalogIndex]  # None quando o catálogo não tem a coluna SKU
+    versoes: dict = field(default_factory=dict)  # hash do CSV de cada planilha
+    atualizado_em: float = field(default_factory=time.time)
+
+    def memoria(self):
+        """Bytes ocupados em memória por parte (catálogo, índices do catálogo e clientes)."""
+        partes = {'catalogo': memoria_dataframe(self.catalogo), 'clientes': memoria_dataframe(self.clientes)}
+        if self.indice is not None:
+            partes.update({f'indice_{chave}': tamanho for chave, tamanho in self.indice.memoria().items()})
+        return partes
+
+
+def carregar_dados_referencia(url_catalogo, url_clientes, usar_cache=True):
+    """
+    Baixa em paralelo (ou reaproveita do cache em memória) as planilhas e monta o índice do catálogo.
+
+    Args:
+        url_catalogo: URL da planilha de mapeamento de produtos no Google Sheets
+        url_clientes: URL da planilha de clientes no Google Sheets
+        usar_cache: Se False, ignora o cache em memória e baixa as planilhas novamente
+
+    Returns:
+        DadosReferencia
+    """
+    logger.info("Lendo planilhas de mapeamento e de clientes: %s | %s", url_catalogo, url_clientes)
+    df_catalogo, df_clientes = cache_planilhas.obter_varias(
+        [url_catalogo, url_clientes], usar_cache=usar_cache, esquemas=[ESQUEMA_CATALOGO, ESQUEMA_CLIENTES]
+    )
+    versao_catalogo = cache_planilhas.versao(url_catalogo, esquema=ESQUEMA_CATALOGO)
+
+    indice = _montar_indice(df_catalogo, versao_catalogo)
+    return DadosReferencia(
+        catalogo=indice.catalogo if indice is not None else compactar_catalogo(df_catalogo),
+        clientes=df_clientes,
+        indice=indice,
+        versoes={'catalogo': versao_catalogo, 'clientes': cache_planilhas.versao(url_clientes, esquema=ESQUEMA_CLIENTES)},
+    )
+
+
+def _montar_indice(df_catalogo, versao_catalogo):
+    if 'SKU' not in df_catalogo.columns:
+        return None
+    indice = obter_indice_catalogo(df_catalogo, versao_catalogo)
+    logger.info("Índice do catálogo pronto (%d produtos, produtos %.1f KiB, chaves %.1f KiB).",
+                indice.total_produtos, memoria_dataframe(indice.catalogo) / 1024, sum(indice.memoria().values()) / 1024)
+    return indice
+
+
+def carregar_dados_referencia_locais(caminho_catalogo=CATALOGO_LOCAL_PADRAO, caminho_clientes=CLIENTES_LOCAL_PADRAO,
+                                     aba_catalogo='CATÁLOGO', aba_clientes='CLIENTES'):
+    """
+    Monta os dados de referência a partir das cópias .xlsx das planilhas, sem acessar o Google Sheets.
+
+    Args:
+        caminho_catalogo: Arquivo .xlsx do catálogo (mapeamento de produtos)
+        caminho_clientes: Arquivo .xlsx dos clientes
+        aba_catalogo: Aba do catálogo
+        aba_clientes: Aba dos clientes
+
+    Returns:
+        DadosReferencia
+    """
+    versoes = {}
+    for chave, caminho in (('catalogo', caminho_catalogo), ('clientes', caminho_clientes)):
+        with open(caminho, 'rb') as arquivo:
+            versoes[chave] = hashlib.sha1(arquivo.read()).hexdigest()
+
+    logger.info("Lendo planilhas locais: %s | %s", caminho_catalogo, caminho_clientes)
+    df_catalogo = aplicar_esquema(ler_excel(caminho_catalogo, sheet_name=aba_catalogo), ESQUEMA_CATALOGO)
+    df_clientes = aplicar_esquema(ler_excel(caminho_clientes, sheet_name=aba_clientes), ESQUEMA_CLIENTES)
+    indice = _montar_indice(df_catalogo, versoes['catalogo'])
+    return DadosReferencia(
+        catalogo=indice.catalogo if indice is not None else compactar_catalogo(df_catalogo),
+        clientes=df_clientes,
+        indice=indice,
+        versoes=versoes,
+    )
+
+
+_snapshots = {}
+_trava_snapshots = threading.Lock()
+
+
+def _snapshot_das_urls(url_catalogo, url_clientes):
+    chave = hashlib.sha1(f"{url_catalogo}\n{url_clientes}".encode('utf-8')).hexdigest()[:16]
+    with _trava_snapshots:
+        if chave not in _snapshots:
+            _snapshots[chave] = SnapshotReferencia(f"referencia-{chave}", idade_maxima=TTL_PADRAO_SEGUNDOS)
+        return _snapshots[chave]
+
+
+def obter_dados_referencia(url_catalogo, url_clientes):
+    """
+    Retorna os dados de referência, pelo snapshot compartilhado quando habilitado.
+
+    Os DataFrames retornados são compartilhados e não devem ser alterados.
+    """
+    return _obter(url_catalogo, url_clientes, propagar_erros=False)
+
+
+def atualizar_dados_referencia(url_catalogo, url_clientes):
+    """
+    Como obter_dados_referencia, mas propaga a falha quando a atualização não for possível,
+    em vez de devolver silenciosamente a versão anterior (ver atualizador_referencia).
+    """
+    return _obter(url_catalogo, url_clientes, propagar_erros=True)
+
+
+def _obter(url_catalogo, url_clientes, propagar_erros):
+    if not SNAPSHOT_HABILITADO:
+        return carregar_dados_referencia(url_catalogo, url_clientes)
+    snapshot = _snapshot_das_urls(url_catalogo, url_clientes)
+
+    def carregar():
+        # Logo após uma invalidação (neste ou em outro processo) o cache em memória pode guardar
+        # as planilhas descartadas; nos demais casos ele já é revalidado pelo TTL/ETag de fonte_planilhas
+        return carregar_dados_referencia(url_catalogo, url_clientes, usar_cache=not snapshot.invalidado())
+
+    return snapshot.obter(carregar, propagar_erros=propagar_erros)
+
+
+def invalidar_dados_referencia(url_catalogo=None, url_clientes=None):
+    """
+    Descarta o cache das planilhas deste processo e o snapshot compartilhado.
+
+    Com as duas URLs é removido o snapshot desse par de planilhas (vale para todos os
+    processos); sem elas, apenas os snapshots já usados por este processo.
+    """
+    cache_planilhas.invalidar()
+    if url_catalogo and url_clientes:
+        _snapshot_das_urls(url_catalogo, url_clientes).invalidar()
+        return
+    with _trava_snapshots:
+        snapshots = list(_snapshots.values())
+    for snapshot in snapshots:
+        snapshot.invalidar()
@@ -0,0 +1,344 @@
+"""
+Fonte das planilhas de referência (catálogo de produtos e clientes) no Google Sheets.
+
+As planilhas são baixadas pela URL de exportação CSV e mantidas em um cache
+por processo, com TTL configurável e revalidação condicional (ETag/Last-Modified):
+quando o Google responde 304 o CSV não é baixado nem interpretado novamente.
+
+Os downloads usam uma sessão HTTP por processo (conexões reaproveitadas), com
+timeouts de conexão/leitura e novas tentativas limitadas, e várias planilhas
+podem ser baixadas ao mesmo tempo (CachePlanilhas.obter_varias).
+
+Planilhas com esquema declarado (EsquemaPlanilha: colunas usadas, tipos e linha do
+cabeçalho) são interpretadas numa única passagem, carregando apenas essas colunas.
+"""
+import contextvars
+import csv
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metricas import CACHE_PLANILHAS, DURACAO_DOWNLOAD, ERROS_UPSTREAM
+
+logger = logging.getLogger(__name__)
+
+# Endereço de exportação CSV; OLIST_SHEETS_URL_EXPORTACAO permite apontar para um servidor
+# local que imita o Google Sheets (ver benchmarks/servidor_planilhas.py)
+URL_EXPORTACAO_CSV = (os.environ.get('OLIST_SHEETS_URL_EXPORTACAO')
+                      or "https://docs.google.com/spreadsheets/d/{spreadsheet_id}/export?format=csv&gid={gid}")
+
+# Tempo (em segundos) durante o qual uma planilha em cache é usada sem consultar o Google.
+# Pode ser ajustado pela variável de ambiente OLIST_SHEETS_CACHE_TTL.
+TTL_PADRAO_SEGUNDOS = float(os.environ.get('OLIST_SHEETS_CACHE_TTL', '300'))
+
+# Timeouts (conexão, leitura) dos downloads, para que uma resposta travada do Google
+# não prenda o worker até o timeout do gunicorn
+TIMEOUT_CONEXAO_SEGUNDOS = float(os.environ.get('OLIST_SHEETS_TIMEOUT_CONEXAO', '5'))
+TIMEOUT_LEITURA_SEGUNDOS = float(os.environ.get('OLIST_SHEETS_TIMEOUT_LEITURA', '20'))
+
+# Novas tentativas em falhas de conexão e respostas 429/5xx, com espera crescente entre elas
+TENTATIVAS_DOWNLOAD = int(os.environ.get('OLIST_SHEETS_TENTATIVAS', '2'))
+STATUS_PARA_NOVA_TENTATIVA = (429, 500, 502, 503, 504)
+
+_sessao = None
+_pid_sessao = None
+_trava_sessao = threading.Lock()
+
+
+def obter_sessao_http():
+    """
+    Sessão HTTP do processo, com pool de conexões e novas tentativas.
+
+    A sessão é recriada em processos filhos (fork dos workers), que não devem
+    compartilhar as conexões abertas pelo processo pai.
+    """
+    global _sessao, _pid_sessao
+    with _trava_sessao:
+        if _sessao is None or _pid_sessao != os.getpid():
+            tentativas = Retry(
+                total=TENTATIVAS_DOWNLOAD,
+                backoff_factor=0.5,
+                status_forcelist=STATUS_PARA_NOVA_TENTATIVA,
+                allowed_methods=frozenset(['GET']),
+                raise_on_status=False,
+            )
+            adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=tentativas)
+            sessao = requests.Session()
+            sessao.mount('https://', adaptador)
+            sessao.mount('http://', adaptador)
+            _sessao = sessao
+            _pid_sessao = os.getpid()
+        return _sessao
+
+
+def extrair_ids_planilha(sheet_url):
+    """
+    Extrai o ID da planilha e o GID da aba a partir da URL do Google Sheets.
+
+    Exemplo: https://docs.google.com/spreadsheets/d/<ID>/edit?pli=1&gid=<GID>#gid=<GID>
+
+    Returns:
+        Tupla (spreadsheet_id, gid)
+    """
+    match_id = re.search(r'/spreadsheets/d/([a-zA-Z0-9-_]+)', sheet_url)
+    if not match_id:
+        raise ValueError(f"Não foi possível extrair o ID da planilha da URL: {sheet_url}")
+
+    match_gid = re.search(r'gid=(\d+)', sheet_url)
+    if not match_gid:
+        raise ValueError(f"Não foi possível extrair o GID da planilha da URL: {sheet_url}")
+
+    return match_id.group(1), match_gid.group(1)
+
+
+def _motor_csv():
+    """Parser de CSV mais rápido instalado: o do pyarrow (multithread) ou o parser em C do pandas."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return 'c'
+    return 'pyarrow'
+
+
+MOTOR_CSV = _motor_csv()
+
+TIPOS_COLUNA = ('texto', 'numero')
+
+
+@dataclass(frozen=True)
+class EsquemaPlanilha:
+    """
+    Colunas usadas de uma planilha de referência e seus tipos.
+
+    As demais colunas não são carregadas. 'texto' mantém o conteúdo como string (sem
+    adivinhar números em SKUs e nomes); 'numero' vira float/int, e valores que não são
+    números ficam vazios (com aviso no log).
+    """
+    nome: str
+    colunas: tuple  # ((nome da coluna, 'texto' | 'numero'), ...)
+    linha_cabecalho: int = 0
+
+    def __post_init__(self):
+        for coluna, tipo in self.colunas:
+            if tipo not in TIPOS_COLUNA:
+                raise ValueError(f"Tipo desconhecido para a coluna {coluna!r}: {tipo!r}")
+
+    @property
+    def nomes_colunas(self):
+        return [coluna for coluna, _ in self.colunas]
+
+
+def _cabecalho_csv(texto_csv, linhas_antes):
+    """Nomes das colunas na linha do cabeçalho, sem interpretar o resto do CSV."""
+    leitor = csv.reader(io.StringIO(texto_csv))
+    for _ in range(linhas_antes):
+        next(leitor, None)
+    return next(leitor, [])
+
+
+def aplicar_esquema(df, esquema):
+    """
+    Mantém apenas as colunas do esquema (as ausentes na planilha são ignoradas) e ajusta os tipos.
+
+    Usado após o read_csv (onde as colunas de texto já chegam como string) e para planilhas
+    lidas de outras fontes, como as cópias locais em .xlsx.
+    """
+    df = df[[coluna for coluna in esquema.nomes_colunas if coluna in df.columns]]
+    for coluna, tipo in esquema.colunas:
+        if coluna not in df.columns:
+            continue
+        serie = df[coluna]
+        if tipo == 'numero' and not pd.api.types.is_numeric_dtype(serie):
+            convertida = pd.to_numeric(serie, errors='coerce')
+            invalidos = int((convertida.isna() & serie.notna()).sum())
+            if invalidos:
+                logger.warning("Planilha %s: %d valor(es) não numérico(s) na coluna %s ignorado(s)",
+                               esquema.nome, invalidos, coluna)
+            df = df.assign(**{coluna: convertida})
+        elif tipo == 'texto' and serie.dtype != object:
+            df = df.assign(**{coluna: serie.astype(object).where(serie.isna(), serie.astype(str))})
+    return df
+
+
+def csv_para_dataframe(texto_csv, header_row=0, esquema=None):
+    """
+    Interpreta o CSV exportado pelo Google Sheets numa única passagem.
+
+    Args:
+        texto_csv: Conteúdo do CSV
+        header_row: Linha do cabeçalho (linhas anteriores são descartadas); ignorado com esquema
+        esquema: EsquemaPlanilha com as colunas a carregar e seus tipos (padrão: todas, tipos inferidos)
+
+    Returns:
+        DataFrame
+    """
+    if esquema is None:
+        return pd.read_csv(io.StringIO(texto_csv), skiprows=header_row, engine=MOTOR_CSV)
+
+    header_row = esquema.linha_cabecalho
+    presentes = set(_cabecalho_csv(texto_csv, header_row))
+    colunas = [coluna for coluna in esquema.nomes_colunas if coluna in presentes]
+    tipos = {coluna: str for coluna, tipo in esquema.colunas if tipo == 'texto' and coluna in presentes}
+    df = pd.read_csv(io.StringIO(texto_csv), skiprows=header_row, usecols=colunas, dtype=tipos, engine=MOTOR_CSV)
+    return aplicar_esquema(df, esquema)
+
+
+class EntradaCache:
+    """Planilha já interpretada, com os validadores HTTP necessários para revalidação."""
+
+    __slots__ = ('df', 'etag', 'last_modified', 'versao', 'validado_em')
+
+    def __init__(self, df, etag, last_modified, versao, validado_em):
+        self.df = df
+        self.etag = etag
+        self.last_modified = last_modified
+        self.versao = versao
+        self.validado_em = validado_em
+
+
+class CachePlanilhas:
+    """
+    Cache por processo das planilhas de referência, indexado por (spreadsheet_id, gid, header_row, esquema).
+
+    Dentro do TTL a planilha é servida da memória. Após o TTL é feita uma requisição
+    condicional; se o Google responder 304, apenas o prazo de validade é renovado.
+    """
+
+    def __init__(self, ttl=TTL_PADRAO_SEGUNDOS):
+        self.ttl = ttl
+        self._entradas = {}
+        self._travas = {}
+        self._trava_global = threading.Lock()
+
+    def _trava_da_chave(self, chave):
+        with self._trava_global:
+            if chave not in self._travas:
+                self._travas[chave] = threading.Lock()
+            return self._travas[chave]
+
+    @staticmethod
+    def _chave(sheet_url, header_row, esquema):
+        spreadsheet_id, gid = extrair_ids_planilha(sheet_url)
+        if esquema is not None:
+            return spreadsheet_id, gid, esquema.linha_cabecalho, esquema.nome
+        return spreadsheet_id, gid, header_row, None
+
+    def obter(self, sheet_url, header_row=0, usar_cache=True, esquema=None):
+        """
+        Retorna uma cópia do DataFrame da planilha, baixando-a apenas quando necessário.
+
+        Args:
+            sheet_url: URL da planilha no Google Sheets (com o GID da aba)
+            header_row: Linha do cabeçalho no CSV exportado (com esquema, vale a do esquema)
+            usar_cache: Se False, ignora o cache e força um novo download
+            esquema: EsquemaPlanilha com as colunas a carregar e seus tipos
+
+        Returns:
+            DataFrame com o conteúdo da aba
+        """
+        chave = self._chave(sheet_url, header_row, esquema)
+        spreadsheet_id, gid = chave[:2]
+
+        with self._trava_da_chave(chave):
+            entrada = self._entradas.get(chave) if usar_cache else None
+            if entrada is not None and time.monotonic() - entrada.validado_em < self.ttl:
+                CACHE_PLANILHAS.inc(resultado='hit')
+                return entrada.df.copy()
+
+            export_url = URL_EXPORTACAO_CSV.format(spreadsheet_id=spreadsheet_id, gid=gid)
+            cabecalhos = {}
+            if entrada is not None:
+                if entrada.etag:
+                    cabecalhos['If-None-Match'] = entrada.etag
+                if entrada.last_modified:
+                    cabecalhos['If-Modified-Since'] = entrada.last_modified
+
+            logger.info("Baixando CSV de: %s", export_url)
+            inicio = time.perf_counter()
+            try:
+                response = obter_sessao_http().get(
+                    export_url, headers=cabecalhos,
+                    timeout=(TIMEOUT_CONEXAO_SEGUNDOS, TIMEOUT_LEITURA_SEGUNDOS)
+                )
+            except requests.RequestException as e:
+                ERROS_UPSTREAM.inc(tipo=type(e).__name__)
+                raise
+            finally:
+                DURACAO_DOWNLOAD.observar(time.perf_counter() - inicio)
+
+            if response.status_code == 304 and entrada is not None:
+                logger.debug("Planilha não modificada (304), reutilizando cache: %s", export_url)
+                CACHE_PLANILHAS.inc(resultado='revalidada')
+                entrada.validado_em = time.monotonic()
+                return entrada.df.copy()
+
+            if response.status_code >= 400:
+                ERROS_UPSTREAM.inc(tipo=f'http_{response.status_code}')
+            response.raise_for_status() # Levanta um erro para códigos de status HTTP ruins
+            CACHE_PLANILHAS.inc(resultado='download')
+
+            # Definir a codificação correta para caracteres especiais
+            response.encoding = 'utf-8'
+
+            df = csv_para_dataframe(response.text, header_row, esquema)
+            self._entradas[chave] = EntradaCache(
+                df=df,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+                versao=hashlib.sha1(response.content).hexdigest(),
+                validado_em=time.monotonic(),
+            )
+            return df.copy()
+
+    def obter_varias(self, sheet_urls, header_row=0, usar_cache=True, esquemas=None):
+        """
+        Como obter, para várias planilhas: as que precisarem de download são baixadas em paralelo.
+
+        Args:
+            esquemas: EsquemaPlanilha de cada URL, na mesma ordem (padrão: nenhum)
+
+        Returns:
+            Lista de DataFrames, na ordem das URLs
+        """
+        esquemas = list(esquemas) if esquemas is not None else [None] * len(sheet_urls)
+        if len(sheet_urls) < 2:
+            return [self.obter(url, header_row, usar_cache, esquema) for url, esquema in zip(sheet_urls, esquemas)]
+        with ThreadPoolExecutor(max_workers=len(sheet_urls), thread_name_prefix='planilhas') as executor:
+            futuros = [executor.submit(contextvars.copy_context().run, self.obter, url, header_row, usar_cache, esquema)
+                       for url, esquema in zip(sheet_urls, esquemas)]
+            return [futuro.result() for futuro in futuros]
+
+    def versao(self, sheet_url, header_row=0, esquema=None):
+        """Retorna o hash do conteúdo em cache da planilha, ou None se ela não estiver em cache."""
+        entrada = self._entradas.get(self._chave(sheet_url, header_row, esquema))
+        return entrada.versao if entrada is not None else None
+
+    def invalidar(self, sheet_url=None):
+        """Descarta do cache a planilha informada (todas as abas de cabeçalho) ou, sem URL, todas as planilhas."""
+        with self._trava_global:
+            if sheet_url is None:
+                self._entradas.clear()
+                return
+            spreadsheet_id, gid = extrair_ids_planilha(sheet_url)
+            for chave in [c for c in self._entradas if c[:2] == (spreadsheet_id, gid)]:
+                del self._entradas[chave]
+
+
+# Cache compartilhado por todo o processo
+cache_planilhas = CachePlanilhas()
+
+
+def invalidar_cache_planilhas(sheet_url=None):
+    """Força o próximo acesso à planilha (ou a todas, sem URL) a baixá-la novamente."""
+    cache_planilhas.invalidar(sheet_url)
@@ -0,0 +1,242 @@
+"""
+Índice de busca do catálogo de produtos (planilha de mapeamento).
+
+Substitui as varreduras do DataFrame do catálogo a cada item do orçamento por
+índices montados uma única vez por versão do catálogo.
+
+Cada worker do gunicorn mantém o seu catálogo em memória, então a representação é
+compacta: dos produtos ficam só o ID, como inteiro, e o MODELO OLIST, como strings do
+Arrow ou categorias (compactar_catalogo); SKU e MODELO ficam só normalizados, nas chaves
+do índice, com a posição do produto no catálogo. CatalogIndex.memoria e
+DadosReferencia.memoria informam o espaço ocupado.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from normalizacao import normalizar_texto
+
+# Quantidade de versões do catálogo mantidas indexadas ao mesmo tempo
+MAX_INDICES_EM_CACHE = 4
+
+
+def _tipo_texto_compacto():
+    """Strings do Arrow (buffer único, sem um objeto Python por valor) se o pyarrow estiver instalado; senão categorias."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return 'category'
+    return 'string[pyarrow]'
+
+
+TIPO_TEXTO_COMPACTO = _tipo_texto_compacto()
+
+
+def _coluna_id_compacta(serie):
+    numeros = pd.to_numeric(serie, errors='coerce')
+    inteiros = numeros.dropna()
+    if (inteiros == np.floor(inteiros)).all() and (inteiros.abs() < 2 ** 63).all():
+        return numeros.astype('Int64')
+    return numeros  # IDs não inteiros ficam como float
+
+
+def compactar_catalogo(df_mapeamento):
+    """
+    Produtos do catálogo como o conversor os devolve: ID como inteiro anulável (Int64) e
+    MODELO OLIST como texto compacto (ver TIPO_TEXTO_COMPACTO). SKU e MODELO só são usados
+    normalizados, nas chaves do CatalogIndex, e não são mantidos.
+
+    Args:
+        df_mapeamento: DataFrame da planilha de mapeamento de produtos
+
+    Returns:
+        Novo DataFrame com as colunas ID e MODELO OLIST, na ordem do catálogo
+    """
+    total = len(df_mapeamento)
+    if 'ID' in df_mapeamento.columns:
+        ids = _coluna_id_compacta(df_mapeamento['ID'].reset_index(drop=True))
+    else:
+        ids = pd.Series(pd.NA, index=pd.RangeIndex(total), dtype='Int64')
+    if 'MODELO OLIST' in df_mapeamento.columns:
+        descricoes = df_mapeamento['MODELO OLIST'].reset_index(drop=True).astype(TIPO_TEXTO_COMPACTO)
+    else:
+        descricoes = pd.Series(pd.NA, index=pd.RangeIndex(total), dtype=object).astype(TIPO_TEXTO_COMPACTO)
+    return pd.DataFrame({'ID': ids, 'MODELO OLIST': descricoes})
+
+
+def memoria_dataframe(df):
+    """Bytes ocupados pelo DataFrame, incluindo as strings."""
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+class CatalogIndex:
+    """
+    Índices de SKU normalizado e de MODELO normalizado para (ID, MODELO OLIST).
+
+    Quando o catálogo tem linhas repetidas para a mesma chave, vale a primeira,
+    como na busca original por máscara seguida de iloc[0].
+    """
+
+    def __init__(self, df_mapeamento, versao=None):
+        self.versao = versao
+        self.total_produtos = len(df_mapeamento)
+
+        # Produtos (ID, MODELO OLIST) na ordem do catálogo
+        self.catalogo = compactar_catalogo(df_mapeamento)
+        self._ids = self.catalogo['ID'].array
+        self._descricoes = self.catalogo['MODELO OLIST'].array
+
+        # Chave normalizada -> posição do produto no catálogo
+        self._chaves = {}
+        self._posicoes = {}
+        for chave, coluna in (('sku', 'SKU'), ('modelo', 'MODELO')):
+            self._chaves[chave], self._posicoes[chave] = self._montar_indice(df_mapeamento, coluna)
+
+    @staticmethod
+    def _montar_indice(df_mapeamento, coluna):
+        if coluna not in df_mapeamento.columns:
+            return pd.Index([], dtype=object), np.empty(0, dtype=np.int32)
+        # Normaliza cada texto distinto uma única vez
+        codigos, unicos = pd.factorize(df_mapeamento[coluna], use_na_sentinel=True)
+        unicos_normalizados = [normalizar_texto(valor) for valor in unicos]
+        chaves = {}
+        for posicao, codigo in enumerate(codigos.tolist()):
+            if codigo < 0:
+                continue  # vazio: normalizado é "", nunca buscado
+            chave_normalizada = unicos_normalizados[codigo]
+            # Chaves vazias nunca são buscadas; manter apenas a primeira ocorrência de cada chave
+            if chave_normalizada and chave_normalizada not in chaves:
+                chaves[chave_normalizada] = posicao
+        return (pd.Index(list(chaves.keys()), dtype=object),
+                np.fromiter(chaves.values(), dtype=np.int32, count=len(chaves)))
+
+    def _produto(self, posicao):
+        id_produto = self._ids[posicao]
+        if isinstance(id_produto, np.generic):
+            id_produto = id_produto.item()  # mesmo tipo Python que o motor vetorizado devolve
+        descricao = self._descricoes[posicao]
+        return id_produto, np.nan if descricao is pd.NA else descricao
+
+    def _buscar(self, chave, valor_normalizado):
+        try:
+            i = self._chaves[chave].get_loc(valor_normalizado)
+        except (KeyError, TypeError):
+            return None
+        return self._produto(self._posicoes[chave][i])
+
+    def lookup_sku(self, sku_normalizado):
+        """Retorna (ID, MODELO OLIST) para um SKU já normalizado, ou None."""
+        return self._buscar('sku', sku_normalizado)
+
+    def lookup_modelo(self, modelo_normalizado):
+        """Retorna (ID, MODELO OLIST) para um MODELO já normalizado, ou None."""
+        return self._buscar('modelo', modelo_normalizado)
+
+    def posicoes(self, chave, valores_normalizados):
+        """
+        Posição no catálogo do produto de cada chave 'sku' ou 'modelo' normalizada (-1 se não existir),
+        para junções vetorizadas com os itens do orçamento.
+        """
+        i = self._chaves[chave].get_indexer(valores_normalizados)
+        return np.where(i >= 0, self._posicoes[chave][np.maximum(i, 0)], -1)
+
+    def produtos(self, posicoes):
+        """
+        ID e MODELO OLIST dos produtos nas posições informadas (todas válidas).
+
+        Returns:
+            Tupla (array de IDs, array de descrições), ambos com dtype object
+        """
+        # Descrição ausente como NaN, igual ao catálogo original (objetos) e a lookup_sku/lookup_modelo
+        return (self._ids.take(posicoes).to_numpy(dtype=object),
+                pd.Series(self._descricoes.take(posicoes)).to_numpy(dtype=object, na_value=np.nan))
+
+    def tabela(self, chave):
+        """
+        Retorna o índice 'sku' ou 'modelo' como DataFrame (índice = chave normalizada,
+        colunas ID e MODELO OLIST). Montado a cada chamada; as junções usam posicoes/produtos.
+        """
+        ids, descricoes = self.produtos(self._posicoes[chave])
+        return pd.DataFrame({'ID': ids, 'MODELO OLIST': descricoes}, index=self._chaves[chave], dtype=object)
+
+    def memoria(self):
+        """
+        Bytes ocupados pelo índice: chaves normalizadas (com as strings) e posições.
+        ID e descrições ficam no catálogo compacto (CatalogIndex.catalogo) e são contados nele.
+        """
+        return {
+            chave: int(self._chaves[chave].memory_usage(deep=True) + self._posicoes[chave].nbytes)
+            for chave in self._chaves
+        }
+
+    def lookup(self, sku, nome):
+        """
+        Busca um produto do orçamento: primeiro pelo SKU e, se não encontrar, pelo nome (MODELO).
+
+        Args:
+            sku: SKU do orçamento (valor original, pode ser vazio/NaN)
+            nome: Nome do produto no orçamento (valor original)
+
+        Returns:
+            Tupla (ID, MODELO OLIST) ou None se o produto não estiver no catálogo
+        """
+        nome_normalizado = normalizar_texto(nome)
+        if sku is not None and pd.notna(sku) and sku:
+            sku_normalizado = normalizar_texto(sku)
+            if sku_normalizado:
+                produto = self.lookup_sku(sku_normalizado)
+                if produto is None and nome_normalizado:
+                    produto = self.lookup_modelo(nome_normalizado)
+                return produto
+        if nome_normalizado:
+            return self.lookup_modelo(nome_normalizado)
+        return None
+
+    def lookup_many(self, skus, names):
+        """
+        Busca vários produtos de uma vez (mesma regra de lookup).
+
+        Args:
+            skus: Sequência de SKUs do orçamento (ou None para buscar apenas pelos nomes)
+            names: Sequência de nomes de produto, alinhada com skus
+
+        Returns:
+            Lista com (ID, MODELO OLIST) ou None para cada item
+        """
+        names = list(names)
+        skus = [None] * len(names) if skus is None else list(skus)
+        return [self.lookup(sku, nome) for sku, nome in zip(skus, names)]
+
+
+_indices = OrderedDict()
+_trava_indices = threading.Lock()
+
+
+def obter_indice_catalogo(df_mapeamento, versao=None):
+    """
+    Retorna o índice do catálogo, reaproveitando o já montado para a mesma versão.
+
+    Args:
+        df_mapeamento: DataFrame da planilha de mapeamento de produtos
+        versao: Identificador da versão do catálogo (ex.: hash do CSV); sem versão o índice não é reaproveitado
+
+    Returns:
+        CatalogIndex
+    """
+    if versao is None:
+        return CatalogIndex(df_mapeamento)
+
+    with _trava_indices:
+        indice = _indices.get(versao)
+        if indice is not None:
+            _indices.move_to_end(versao)
+            return indice
+
+    indice = CatalogIndex(df_mapeamento, versao=versao)
+    with _trava_indices:
+        _indices[versao] = indice
+        while len(_indices) > MAX_INDICES_EM_CACHE:
+            _indices.popitem(last=False)
+    return indice
@@ -0,0 +1,163 @@
+"""
+Índice de busca da lista de clientes.
+
+A página carregava a lista inteira de clientes e a filtrava no navegador a cada tecla.
+O índice é montado uma única vez por versão da planilha de clientes e responde às
+buscas de /clientes/busca: cada palavra digitada precisa ser o início de uma palavra do
+nome ('bri cel' encontra 'CL108 - Brito Cell'), sem diferenciar maiúsculas e acentos.
+Letras e números juntos também contam como palavras separadas ('108' encontra 'CL108').
+
+A lista completa de /clientes também sai daqui, já serializada e comprimida, com a
+versão da planilha como ETag.
+"""
+import bisect
+import gzip
+import json
+import re
+import threading
+from collections import OrderedDict
+
+from normalizacao import normalizar_busca
+
+# Quantidade de versões da lista de clientes mantidas indexadas ao mesmo tempo
+MAX_INDICES_EM_CACHE = 4
+
+# Resultados devolvidos por busca (padrão e máximo)
+LIMITE_BUSCA_PADRAO = 20
+LIMITE_BUSCA_MAXIMO = 200
+
+_PALAVRAS = re.compile(r'\w+')
+_LETRAS_OU_DIGITOS = re.compile(r'[^\W\d_]+|\d+')
+_CODIGO_CLIENTE = re.compile(r'^CL(\d+)')
+
+
+def _palavras(texto_normalizado):
+    """Palavras do texto e, nas que misturam letras e números, cada parte ('cl108' -> cl108, cl, 108)."""
+    palavras = set()
+    for palavra in _PALAVRAS.findall(texto_normalizado):
+        palavras.add(palavra)
+        palavras.update(_LETRAS_OU_DIGITOS.findall(palavra))
+    return palavras
+
+
+def _ordem_cliente(nome):
+    """Mesma ordem que a página usava: primeiro os nomes 'CL<número>', pelo número; depois os demais pelo nome."""
+    codigo = _CODIGO_CLIENTE.match(nome)
+    if codigo:
+        return 0, int(codigo.group(1)), ''
+    return 1, 0, normalizar_busca(nome)
+
+
+class ClientIndex:
+    """
+    Clientes (ID e Nome) na ordem de exibição e índice de prefixos das palavras dos nomes.
+
+    Uso:
+        indice = ClientIndex(df_clientes, versao)
+        clientes, total = indice.buscar('brito', limite=20)
+    """
+
+    def __init__(self, df_clientes, versao=None):
+        self.versao = versao
+        self.clientes = []
+        if 'ID' in df_clientes.columns and 'Nome' in df_clientes.columns:
+            df_validos = df_clientes.dropna(subset=['Nome'])
+            registros = zip(df_validos['ID'].astype(str), df_validos['Nome'].map(str))
+            self.clientes = sorted(({'ID': id_cliente, 'Nome': nome} for id_cliente, nome in registros),
+                                   key=lambda cliente: _ordem_cliente(cliente['Nome']))
+
+        # Palavra normalizada -> posições dos clientes (em ordem de exibição); palavras em ordem alfabética
+        posicoes_por_palavra = {}
+        for posicao, cliente in enumerate(self.clientes):
+            for palavra in _palavras(normalizar_busca(cliente['Nome'])):
+                posicoes_por_palavra.setdefault(palavra, []).append(posicao)
+        self._palavras = sorted(posicoes_por_palavra)
+        self._posicoes = [posicoes_por_palavra[palavra] for palavra in self._palavras]
+
+        self._lista_json = None
+        self._lista_gzip = None
+        self._trava = threading.Lock()
+
+    def _posicoes_prefixo(self, prefixo):
+        """Posições dos clientes com alguma palavra começando por `prefixo`."""
+        inicio = bisect.bisect_left(self._palavras, prefixo)
+        fim = bisect.bisect_left(self._palavras, prefixo + '\U0010ffff', lo=inicio)
+        if fim - inicio == 1:
+            return set(self._posicoes[inicio])
+        posicoes = set()
+        for lista in self._posicoes[inicio:fim]:
+            posicoes.update(lista)
+        return posicoes
+
+    def buscar(self, consulta, limite=LIMITE_BUSCA_PADRAO):
+        """
+        Clientes cujo nome tem, para cada palavra da consulta, uma palavra que começa com ela.
+
+        Args:
+            consulta: Texto digitado (vazio devolve os primeiros clientes)
+            limite: Quantidade máxima de clientes devolvidos
+
+        Returns:
+            Tupla (lista de {'ID', 'Nome'} na ordem de exibição, total de clientes encontrados)
+        """
+        termos = sorted(_PALAVRAS.findall(normalizar_busca(consulta)), key=len, reverse=True)
+        if not termos:
+            return self.clientes[:limite], len(self.clientes)
+
+        # Termos mais longos primeiro: conjuntos menores, interseção mais barata
+        encontrados = None
+        for termo in termos:
+            posicoes = self._posicoes_prefixo(termo)
+            encontrados = posicoes if encontrados is None else encontrados & posicoes
+            if not encontrados:
+                return [], 0
+        return [self.clientes[posicao] for posicao in sorted(encontrados)[:limite]], len(encontrados)
+
+    def etag(self):
+        """ETag da lista completa: muda quando a planilha de clientes muda."""
+        return f"clientes-{self.versao}" if self.versao else None
+
+    def lista_json(self, comprimida=False):
+        """Corpo de /clientes ({'clientes': [...]}) serializado uma única vez, e em gzip se pedido."""
+        with self._trava:
+            if self._lista_json is None:
+                self._lista_json = json.dumps({'clientes': self.clientes}, ensure_ascii=False,
+                                              separators=(',', ':')).encode('utf-8')
+            if not comprimida:
+                return self._lista_json
+            if self._lista_gzip is None:
+                # mtime fixo: o mesmo conteúdo gera sempre os mesmos bytes (e o mesmo ETag)
+                self._lista_gzip = gzip.compress(self._lista_json, compresslevel=6, mtime=0)
+            return self._lista_gzip
+
+
+_indices = OrderedDict()
+_trava_indices = threading.Lock()
+
+
+def obter_indice_clientes(df_clientes, versao=None):
+    """
+    Retorna o índice dos clientes, reaproveitando o já montado para a mesma versão.
+
+    Args:
+        df_clientes: DataFrame da planilha de clientes (colunas ID e Nome)
+        versao: Identificador da versão da planilha (ex.: hash do CSV); sem versão o índice não é reaproveitado
+
+    Returns:
+        ClientIndex
+    """
+    if versao is None:
+        return ClientIndex(df_clientes)
+
+    with _trava_indices:
+        indice = _indices.get(versao)
+        if indice is not None:
+            _indices.move_to_end(versao)
+            return indice
+
+    indice = ClientIndex(df_clientes, versao=versao)
+    with _trava_indices:
+        _indices[versao] = indice
+        while len(_indices) > MAX_INDICES_EM_CACHE:
+            _indices.popitem(last=False)
+    return indice
@@ -0,0 +1,296 @@
+"""
+Conversões assíncronas (jobs) para orçamentos grandes.
+
+POST /jobs grava o orçamento enviado em disco e devolve o ID do job na hora; um
+pool limitado de threads faz a conversão fora da requisição HTTP, e GET /jobs/<id>
+informa o andamento e, ao final, entrega o arquivo convertido (.xlsx ou outro formato pedido).
+
+Cada job é um diretório no armazenamento local (OLIST_JOBS_DIR) com o orçamento,
+o status.json (gravado de forma atômica) e o resultado. Como o estado fica em disco,
+qualquer worker do gunicorn consegue responder a consulta de um job. Jobs mais
+antigos que o TTL são removidos automaticamente.
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from conversor_olist import converter_orcamento_para_olist_detalhado
+from saida_olist import FORMATO_SAIDA_PADRAO, gravar_saida, nome_arquivo_saida
+
+logger = logging.getLogger(__name__)
+
+DIRETORIO_JOBS_PADRAO = os.environ.get('OLIST_JOBS_DIR') or os.path.join(tempfile.gettempdir(), 'conversor_olist', 'jobs')
+
+# Tempo (em segundos) que um job e seu resultado ficam disponíveis
+TTL_JOBS_SEGUNDOS = float(os.environ.get('OLIST_JOBS_TTL', '3600'))
+
+# Conversões simultâneas por processo e limite de jobs aguardando na fila
+THREADS_JOBS_PADRAO = int(os.environ.get('OLIST_JOBS_THREADS', '2'))
+MAX_JOBS_PENDENTES = int(os.environ.get('OLIST_JOBS_MAX_PENDENTES', '50'))
+
+# Intervalo mínimo entre duas limpezas de jobs expirados
+INTERVALO_LIMPEZA_SEGUNDOS = 60
+
+PENDENTE = 'pendente'
+PROCESSANDO = 'processando'
+CONCLUIDO = 'concluido'
+ERRO = 'erro'
+
+# Etapas da conversão (ver conversor_olist) na ordem em que são concluídas, para o cálculo do progresso
+ETAPAS_CONVERSAO = ('referencia', 'modelo', 'leitura_orcamento', 'cabecalho', 'preparacao', 'cliente', 'itens', 'gravacao')
+
+_PADRAO_ID_JOB = re.compile(r'^[0-9a-f]{32}$')
+
+
+class FilaJobsCheia(Exception):
+    """Há jobs demais aguardando processamento neste processo."""
+
+
+def _processo_ativo(pid):
+    """Indica se o processo existe (em sistemas sem os.kill(pid, 0), considera que sim)."""
+    if os.name != 'posix':
+        return True  # no Windows os.kill encerraria o processo
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # existe, mas é de outro usuário
+    return True
+
+
+class ArmazemJobs:
+    """Jobs em disco: um diretório por job com entrada, status.json e resultado."""
+
+    def __init__(self, diretorio=None, ttl=TTL_JOBS_SEGUNDOS):
+        self.diretorio = diretorio or DIRETORIO_JOBS_PADRAO
+        self.ttl = ttl
+        self._ultima_limpeza = 0.0
+
+    def _caminho(self, job_id, nome=''):
+        if not _PADRAO_ID_JOB.match(job_id or ''):
+            raise KeyError(job_id)
+        return os.path.join(self.diretorio, job_id, nome)
+
+    def criar(self, conteudo, **dados):
+        """Grava o arquivo de entrada de um novo job e retorna seu status inicial."""
+        job_id = uuid.uuid4().hex
+        os.makedirs(self._caminho(job_id), exist_ok=True)
+        with open(self._caminho(job_id, 'entrada'), 'wb') as arquivo:
+            arquivo.write(conteudo)
+        agora = time.time()
+        status = {
+            'id': job_id,
+            'status': PENDENTE,
+            'etapa': None,
+            'progresso': 0.0,
+            'criado_em': agora,
+            'atualizado_em': agora,
+            **dados,
+        }
+        self.gravar_status(job_id, status)
+        return status
+
+    def gravar_status(self, job_id, status):
+        """Grava o status.json de forma atômica (arquivo temporário + os.replace)."""
+        status['atualizado_em'] = time.time()
+        descritor, caminho_temporario = tempfile.mkstemp(dir=self._caminho(job_id), suffix='.tmp')
+        with os.fdopen(descritor, 'w', encoding='utf-8') as arquivo:
+            json.dump(status, arquivo, ensure_ascii=False, default=str)
+        os.replace(caminho_temporario, self._caminho(job_id, 'status.json'))
+
+    def ler_status(self, job_id):
+        """Status do job, ou None se ele não existir (ou já tiver expirado)."""
+        try:
+            with open(self._caminho(job_id, 'status.json'), encoding='utf-8') as arquivo:
+                return json.load(arquivo)
+        except (KeyError, FileNotFoundError):
+            return None
+
+    def caminho_entrada(self, job_id):
+        return self._caminho(job_id, 'entrada')
+
+    def caminho_resultado(self, job_id, formato=FORMATO_SAIDA_PADRAO):
+        return self._caminho(job_id, f'resultado.{formato}')
+
+    def limpar_expirados(self, forcar=False):
+        """Remove os jobs cujo status não muda há mais que o TTL."""
+        agora = time.time()
+        if not forcar and agora - self._ultima_limpeza < INTERVALO_LIMPEZA_SEGUNDOS:
+            return 0
+        self._ultima_limpeza = agora
+        removidos = 0
+        try:
+            nomes = os.listdir(self.diretorio)
+        except FileNotFoundError:
+            return 0
+        for job_id in nomes:
+            if not _PADRAO_ID_JOB.match(job_id):
+                continue
+            try:
+                status = self.ler_status(job_id)
+                atualizado_em = status['atualizado_em'] if status else os.path.getmtime(self._caminho(job_id))
+            except OSError:
+                continue  # removido por outro worker entre o listdir e a leitura
+            if agora - atualizado_em > self.ttl:
+                shutil.rmtree(self._caminho(job_id), ignore_errors=True)
+                removidos += 1
+        return removidos
+
+
+class GerenciadorJobs:
+    """Fila de conversões assíncronas executadas por um pool limitado de threads."""
+
+    def __init__(self, armazem, url_catalogo, url_clientes, caminho_modelo, obter_dados_referencia,
+                 threads=THREADS_JOBS_PADRAO, max_pendentes=MAX_JOBS_PENDENTES):
+        """
+        Args:
+            armazem: ArmazemJobs onde os jobs são gravados
+            url_catalogo: URL da planilha de mapeamento de produtos
+            url_clientes: URL da planilha de clientes
+            caminho_modelo: Caminho (ou nome registrado) do modelo de saída
+            obter_dados_referencia: Função sem argumentos que retorna os DadosReferencia em uso
+            threads: Conversões simultâneas
+            max_pendentes: Jobs aceitos ainda não concluídos, acima disso submeter() recusa
+        """
+        self.armazem = armazem
+        self.url_catalogo = url_catalogo
+        self.url_clientes = url_clientes
+        self.caminho_modelo = caminho_modelo
+        self.obter_dados_referencia = obter_dados_referencia
+        self.max_pendentes = max_pendentes
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='jobs-conversao')
+        self._pendentes = 0
+        self._jobs_deste_processo = set()
+        self._trava = threading.Lock()
+
+    def submeter(self, nome_arquivo, conteudo, cliente_id, formato=FORMATO_SAIDA_PADRAO, todas_abas=False):
+        """
+        Registra o job e o coloca na fila de conversão.
+
+        Args:
+            nome_arquivo: Nome do orçamento enviado
+            conteudo: Bytes do orçamento
+            cliente_id: ID do cliente selecionado
+            formato: Formato do arquivo de saída (ver saida_olist.validar_formato_saida)
+            todas_abas: Converte os itens de todas as abas do .xlsx, e não só os da primeira
+
+        Returns:
+            Status inicial do job (com o 'id')
+
+        Raises:
+            FilaJobsCheia: quando já há max_pendentes jobs aguardando neste processo
+        """
+        self.armazem.limpar_expirados()
+        with self._trava:
+            if self._pendentes >= self.max_pendentes:
+                raise FilaJobsCheia(f"{self._pendentes} jobs aguardando processamento")
+            self._pendentes += 1
+        try:
+            status = self.armazem.criar(conteudo, arquivo=nome_arquivo, cliente_id=str(cliente_id), formato=formato,
+                                        todas_abas=todas_abas, pid=os.getpid())
+            # A thread de conversão passa a alterar o próprio dicionário de status
+            status_inicial = dict(status)
+            with self._trava:
+                self._jobs_deste_processo.add(status['id'])
+            # Contexto copiado para o log do job manter o ID de correlação da requisição que o criou
+            self._executor.submit(contextvars.copy_context().run, self._executar, status)
+        except Exception:
+            with self._trava:
+                self._pendentes -= 1
+            raise
+        return status_inicial
+
+    def consultar(self, job_id):
+        self.armazem.limpar_expirados()
+        status = self.armazem.ler_status(job_id)
+        if (status and status['status'] in (PENDENTE, PROCESSANDO) and self._processo_encerrado(status)
+                and (self.armazem.ler_status(job_id) or {}).get('status') in (PENDENTE, PROCESSANDO)):
+            # O worker que convertia o job morreu (timeout, falta de memória, deploy): o job não termina mais
+            logger.warning("Job %s abandonado pelo processo %s; marcado como erro", job_id, status.get('pid'))
+            status.update(status=ERRO, erro='A conversão foi interrompida (o processo que a executava foi encerrado). '
+                                            'Envie o orçamento novamente.')
+            try:
+                self.armazem.gravar_status(job_id, status)
+            except OSError as e:
+                logger.warning("Não foi possível gravar o status do job %s: %s", job_id, e)
+        return status
+
+    def _processo_encerrado(self, status):
+        pid = status.get('pid')
+        if pid is None:
+            return False
+        if pid == os.getpid():
+            # Mesmo PID de um processo anterior (reiniciado) que não é o dono do job; consultar()
+            # relê o status antes de marcar o erro, porque o job sai do conjunto ao terminar
+            with self._trava:
+                return status['id'] not in self._jobs_deste_processo
+        return not _processo_ativo(pid)
+
+    def _executar(self, status):
+        job_id = status['id']
+        try:
+            status.update(status=PROCESSANDO, etapa=None, progresso=0.0)
+            self.armazem.gravar_status(job_id, status)
+
+            def ao_concluir_etapa(etapa):
+                if etapa in ETAPAS_CONVERSAO:
+                    status.update(etapa=etapa, progresso=round((ETAPAS_CONVERSAO.index(etapa) + 1) / len(ETAPAS_CONVERSAO), 2))
+                    self.armazem.gravar_status(job_id, status)
+
+            with open(self.armazem.caminho_entrada(job_id), 'rb') as arquivo:
+                resultado = converter_orcamento_para_olist_detalhado(
+                    arquivo,
+                    self.url_catalogo,
+                    self.url_clientes,
+                    status['cliente_id'],
+                    self.caminho_modelo,
+                    dados_referencia=self.obter_dados_referencia(),
+                    ao_concluir_etapa=ao_concluir_etapa,
+                    todas_abas=status.get('todas_abas', False)
+                )
+
+            status['produtos_nao_mapeados'] = resultado.produtos_nao_mapeados
+            status['tempos'] = {etapa: round(segundos, 4) for etapa, segundos in resultado.tempos.items()}
+            if resultado.df.empty:
+                status.update(status=ERRO, erro=resultado.erro or 'Nenhum dado processado')
+                return
+
+            formato = status.get('formato', FORMATO_SAIDA_PADRAO)
+            caminho_resultado = self.armazem.caminho_resultado(job_id, formato)
+            with open(caminho_resultado + '.tmp', 'wb') as arquivo:
+                gravar_saida(resultado.df, arquivo, formato)
+            os.replace(caminho_resultado + '.tmp', caminho_resultado)
+            status.update(
+                status=CONCLUIDO,
+                etapa='gravacao',
+                progresso=1.0,
+                linhas=len(resultado.df),
+                arquivo_saida=nome_arquivo_saida(resultado.nome_cliente, status['cliente_id'], formato),
+            )
+        except Exception as e:
+            logger.error("Erro no job %s: %s", job_id, e, exc_info=True)
+            status.update(status=ERRO, erro=str(e))
+        finally:
+            with self._trava:
+                self._pendentes -= 1
+            # O orçamento enviado não é mais necessário; fica apenas o resultado até o TTL
+            try:
+                os.remove(self.armazem.caminho_entrada(job_id))
+            except OSError:
+                pass
+            try:
+                self.armazem.gravar_status(job_id, status)
+            except Exception as e:
+                logger.error("Não foi possível gravar o status do job %s: %s", job_id, e)
+            # Só depois do status final em disco (ver _processo_encerrado)
+            with self._trava:
+                self._jobs_deste_processo.discard(job_id)
@@ -0,0 +1,142 @@
+"""
+Leitura de orçamentos exportados em CSV/TSV.
+
+Alguns fornecedores exportam o orçamento em texto separado por ';', ',', tabulação ou '|',
+em UTF-8 ou no cp1252 do Excel em português. O LeitorCsv tem a mesma interface dos
+backends de leitores_xlsx e entrega as linhas no mesmo formato (células vazias como "",
+números como int/float, sem células vazias no fim da linha), então a prévia, a busca do
+cabeçalho, os perfis de layout e o mapeamento das colunas funcionam sem mudanças.
+
+Codificação e separador são detectados em uma amostra do início do arquivo; o restante
+é lido em streaming, sem decodificar o arquivo inteiro de uma vez.
+"""
+import codecs
+import csv
+import io
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Bytes do início do arquivo usados na detecção da codificação e do separador
+TAMANHO_AMOSTRA_BYTES = 64 * 1024
+
+SEPARADORES_CANDIDATOS = ';,\t|'
+
+# Codificações tentadas, em ordem, quando o arquivo não tem BOM
+CODIFICACOES_CANDIDATAS = ('utf-8', 'cp1252')
+
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+_INTEIRO = re.compile(r'^-?(0|[1-9]\d*)$')
+_DECIMAL_PONTO = re.compile(r'^-?\d+\.\d+$')
+_DECIMAL_VIRGULA = re.compile(r'^-?\d+,\d+$')
+_MILHAR_PONTO = re.compile(r'^-?\d{1,3}(\.\d{3})+(,\d+)?$')
+
+
+def detectar_codificacao(amostra):
+    """
+    Codificação do arquivo a partir dos primeiros bytes: BOM, senão a primeira candidata
+    que decodifica a amostra (o cp1252 cobre as exportações do Excel em português).
+    """
+    for bom, codificacao in _BOMS:
+        if amostra.startswith(bom):
+            return codificacao
+    for codificacao in CODIFICACOES_CANDIDATAS:
+        try:
+            # final=False: a amostra pode terminar no meio de um caractere multibyte
+            codecs.getincrementaldecoder(codificacao)().decode(amostra, final=False)
+            return codificacao
+        except UnicodeDecodeError:
+            continue
+    return 'latin-1'
+
+
+def detectar_separador(texto):
+    """Separador das colunas na amostra decodificada (padrão ';', o das exportações em português)."""
+    linhas = [linha for linha in texto.splitlines()[:50] if linha.strip()]
+    if not linhas:
+        return ';'
+    try:
+        return csv.Sniffer().sniff('\n'.join(linhas), delimiters=SEPARADORES_CANDIDATOS).delimiter
+    except csv.Error:
+        # Sem padrão consistente (ex.: linhas de título antes do cabeçalho): o mais frequente
+        contagens = {separador: sum(linha.count(separador) for linha in linhas) for separador in SEPARADORES_CANDIDATOS}
+        separador, contagem = max(contagens.items(), key=lambda item: item[1])
+        return separador if contagem else ';'
+
+
+def converter_celula_csv(texto, separador_decimal):
+    """
+    Célula do CSV no tipo que a mesma célula teria no .xlsx: vazia como "", números como
+    int/float (com vírgula decimal e ponto de milhar quando separador_decimal é ',').
+    Números com zeros à esquerda (códigos, SKUs) continuam texto.
+    """
+    valor = texto.strip()
+    if not valor:
+        return ""
+    if _INTEIRO.match(valor):
+        return int(valor)
+    if separador_decimal == ',':
+        if _DECIMAL_VIRGULA.match(valor):
+            return float(valor.replace(',', '.'))
+        if _MILHAR_PONTO.match(valor):
+            numero = valor.replace('.', '').replace(',', '.')
+            return float(numero) if '.' in numero else int(numero)
+    elif _DECIMAL_PONTO.match(valor):
+        return float(valor)
+    return texto
+
+
+class LeitorCsv:
+    """Leitura em streaming de orçamentos CSV/TSV, com a interface dos backends de leitores_xlsx."""
+
+    nome = 'csv'
+
+    @staticmethod
+    def disponivel():
+        return True
+
+    @staticmethod
+    def _abrir_binario(arquivo):
+        if isinstance(arquivo, (str, os.PathLike)):
+            return open(arquivo, 'rb'), True
+        return arquivo, False
+
+    def iterar_linhas(self, arquivo, aba=0, nrows=None):
+        """Gera as linhas do arquivo (um CSV tem uma única aba; `aba` é ignorado)."""
+        binario, fechar = self._abrir_binario(arquivo)
+        try:
+            inicio = binario.tell()
+            amostra = binario.read(TAMANHO_AMOSTRA_BYTES)
+            binario.seek(inicio)
+            codificacao = detectar_codificacao(amostra)
+            separador = detectar_separador(amostra.decode(codificacao, errors='ignore'))
+            separador_decimal = '.' if separador == ',' else ','
+            logger.debug("Orçamento CSV: codificação %s, separador %r", codificacao, separador)
+
+            texto = io.TextIOWrapper(binario, encoding=codificacao, errors='replace', newline='')
+            try:
+                for numero, linha in enumerate(csv.reader(texto, delimiter=separador)):
+                    if nrows is not None and numero >= nrows:
+                        break
+                    celulas = [converter_celula_csv(celula, separador_decimal) for celula in linha]
+                    while celulas and celulas[-1] == "":
+                        celulas.pop()
+                    yield celulas
+            finally:
+                texto.detach()  # o arquivo recebido continua aberto para quem o passou
+        finally:
+            if fechar:
+                binario.close()
+
+    def nomes_abas(self, arquivo):
+        return [0]
+
+
+leitor_csv = LeitorCsv()
@@ -0,0 +1,165 @@
+"""
+Leitura do arquivo de orçamento (.xlsx ou CSV/TSV) em uma única passagem.
+
+Antes o orçamento era interpretado duas vezes: uma leitura das primeiras linhas
+(header=None) para achar o cabeçalho e os metadados, e outra da aba inteira com
+header=linha_cabecalho. O LeitorOrcamento percorre a aba uma só vez (ver os
+backends em leitores_xlsx), guarda as primeiras linhas para a detecção do cabeçalho e
+continua consumindo o mesmo fluxo para as linhas de dados, produzindo os mesmos
+DataFrames que o pd.read_excel (engine openpyxl) produziria.
+
+O tipo do arquivo é reconhecido pelo conteúdo, não pela extensão: .xlsx é um zip;
+o resto é lido como CSV/TSV (ver leitor_csv).
+"""
+import itertools
+import logging
+import os
+
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+from leitor_csv import leitor_csv
+from leitores_xlsx import escolher_backend
+
+logger = logging.getLogger(__name__)
+
+# Linhas lidas para procurar o cabeçalho e os metadados (número da proposta, data)
+LINHAS_PREVIA = 20
+
+_ASSINATURA_ZIP = b'PK\x03\x04'
+_ASSINATURA_XLS = b'\xd0\xcf\x11\xe0'
+
+
+def tipo_arquivo_orcamento(arquivo):
+    """
+    'xlsx' ou 'csv', pelos primeiros bytes do arquivo (caminho ou objeto binário).
+
+    Raises:
+        ValueError: para planilhas .xls (formato binário antigo do Excel), que não são suportadas
+    """
+    if isinstance(arquivo, (str, os.PathLike)):
+        with open(arquivo, 'rb') as binario:
+            inicio = binario.read(4)
+    else:
+        posicao = arquivo.tell()
+        inicio = arquivo.read(4)
+        arquivo.seek(posicao)
+    if inicio == _ASSINATURA_ZIP:
+        return 'xlsx'
+    if inicio == _ASSINATURA_XLS:
+        raise ValueError("Planilhas .xls não são suportadas. Salve o orçamento como .xlsx ou .csv.")
+    return 'csv'
+
+
+def leitor_do_arquivo(arquivo, backend=None):
+    """Backend de leitura para o arquivo: o CSV para texto, senão o backend xlsx escolhido."""
+    if tipo_arquivo_orcamento(arquivo) == 'csv':
+        return leitor_csv
+    return escolher_backend(backend)
+
+
+def abas_orcamento(arquivo, backend=None):
+    """Abas do orçamento, na ordem da planilha (um CSV tem uma única aba)."""
+    leitor = leitor_do_arquivo(arquivo, backend)
+    try:
+        return leitor.nomes_abas(arquivo)
+    except Exception as e:
+        if leitor.nome in ('openpyxl', 'csv'):
+            raise
+        logger.warning("Falha ao listar as abas com %s (%s); tentando com openpyxl", leitor.nome, e)
+        if hasattr(arquivo, 'seek'):
+            arquivo.seek(0)
+        return escolher_backend('openpyxl').nomes_abas(arquivo)
+
+
+def _completar_linhas(linhas):
+    """Remove as linhas vazias do final e iguala a largura das linhas (como o pandas)."""
+    ultima_com_dados = -1
+    for i, linha in enumerate(linhas):
+        if linha:
+            ultima_com_dados = i
+    linhas = linhas[:ultima_com_dados + 1]
+    if linhas:
+        largura = max(len(linha) for linha in linhas)
+        if min(len(linha) for linha in linhas) < largura:
+            linhas = [linha + [""] * (largura - len(linha)) for linha in linhas]
+    return linhas
+
+
+def _linhas_para_dataframe(linhas, header, nrows=None):
+    linhas = _completar_linhas(linhas)
+    if not linhas:
+        return pd.DataFrame()
+    parser = TextParser(linhas, header=header, nrows=nrows, skip_blank_lines=False)
+    return parser.read(nrows=nrows)
+
+
+class LeitorOrcamento:
+    """
+    Leitor de passagem única de uma aba (por padrão a primeira) de um orçamento .xlsx, ou de um CSV.
+
+    Uso:
+        leitor = LeitorOrcamento(arquivo)
+        df_previa = leitor.previa()                   # primeiras linhas, sem cabeçalho
+        df_orcamento = leitor.ler_dataframe(linha)    # aba inteira a partir do cabeçalho
+    """
+
+    def __init__(self, arquivo_orcamento, linhas_previa=LINHAS_PREVIA, aba=0, backend=None, max_linhas=None):
+        """
+        Args:
+            arquivo_orcamento: Caminho do arquivo ou objeto BytesIO contendo o orçamento
+            linhas_previa: Quantidade de linhas usadas na busca do cabeçalho
+            aba: Índice ou nome da aba a ler (ignorado em CSV)
+            backend: Backend de leitura xlsx (ver leitores_xlsx.escolher_backend)
+            max_linhas: Linhas lidas da aba, contando as anteriores ao cabeçalho (padrão: todas)
+        """
+        self.linhas_previa = linhas_previa
+        self.max_linhas = max_linhas
+        self.backend = leitor_do_arquivo(arquivo_orcamento, backend)
+        try:
+            self._abrir(arquivo_orcamento, aba)
+        except Exception as e:
+            if self.backend.nome in ('openpyxl', 'csv'):
+                raise
+            logger.warning("Falha ao ler orçamento com %s (%s); tentando com openpyxl", self.backend.nome, e)
+            self.backend = escolher_backend('openpyxl')
+            self._abrir(arquivo_orcamento, aba)
+        self._consumido = False
+        self.linhas_metadados = []
+
+    def _abrir(self, arquivo_orcamento, aba):
+        if hasattr(arquivo_orcamento, 'seek'):
+            arquivo_orcamento.seek(0)
+        self._fluxo = self.backend.iterar_linhas(arquivo_orcamento, aba, self.max_linhas)
+        # O pandas lê uma linha a mais que o nrows pedido quando header=None
+        self._buffer = list(itertools.islice(self._fluxo, self.linhas_previa + 1))
+
+    def previa(self):
+        """DataFrame (header=None) com as primeiras linhas, equivalente a read_excel(nrows=linhas_previa, header=None)."""
+        return _linhas_para_dataframe([list(linha) for linha in self._buffer], header=None, nrows=self.linhas_previa)
+
+    def iter_linhas_dados(self, linha_cabecalho):
+        """
+        Gera as linhas após o cabeçalho, continuando o mesmo fluxo da prévia.
+
+        As linhas anteriores ao cabeçalho ficam disponíveis em linhas_metadados.
+        """
+        if self._consumido:
+            raise RuntimeError("As linhas do orçamento já foram consumidas")
+        self._consumido = True
+        self.linhas_metadados = self._buffer[:linha_cabecalho]
+        yield from self._buffer[linha_cabecalho + 1:]
+        yield from self._fluxo
+
+    def ler_dataframe(self, linha_cabecalho):
+        """
+        DataFrame da aba inteira com o cabeçalho na linha indicada,
+        equivalente a read_excel(sheet_name=0, header=linha_cabecalho).
+        """
+        linhas_ate_cabecalho = self._buffer[:linha_cabecalho + 1]
+        linhas = linhas_ate_cabecalho + list(self.iter_linhas_dados(linha_cabecalho))
+        return _linhas_para_dataframe(linhas, header=linha_cabecalho)
+
+    def fechar(self):
+        """Libera o arquivo caso o fluxo não tenha sido consumido até o fim."""
+        self._fluxo.close()
@@ -0,0 +1,343 @@
+"""
+Backends de leitura de arquivos .xlsx.
+
+Por padrão é usado o leitor mais rápido instalado: o python-calamine (parser nativo
+em Rust, suportado pelo pandas como engine='calamine') e, na falta dele, o openpyxl.
+Se o backend escolhido falhar ao abrir um arquivo, a leitura é refeita com o openpyxl.
+O backend 'sob_demanda' (prévia do orçamento) lê só as linhas pedidas da aba.
+
+Todos os backends entregam as linhas já convertidas como o leitor openpyxl do pandas
+(células vazias como "", números inteiros como int, sem células vazias no fim da linha),
+de modo que os DataFrames montados a partir delas são idênticos entre backends.
+Única diferença conhecida: células só com espaços gravadas sem xml:space="preserve"
+(como o openpyxl grava) chegam vazias pelo calamine; o conversor já trata as duas
+formas como célula em branco.
+
+A equivalência com as planilhas de exemplo é verificada em tests/test_leitores_xlsx.py
+(ver comparar_backends).
+"""
+import logging
+import os
+from datetime import date, time, timedelta
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Força um backend específico ('calamine' ou 'openpyxl'); vazio = automático
+BACKEND_XLSX_PADRAO = os.environ.get('OLIST_LEITOR_XLSX') or None
+
+
+def _remover_vazias_do_fim(linha):
+    while linha and linha[-1] == "":
+        linha.pop()
+    return linha
+
+
+class LeitorXlsxOpenpyxl:
+    """Leitura em streaming com o openpyxl em modo read-only (mesmo leitor padrão do pandas)."""
+
+    nome = 'openpyxl'
+    engine_pandas = 'openpyxl'
+
+    @staticmethod
+    def disponivel():
+        return True
+
+    @staticmethod
+    def _converter_celula(cell):
+        from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+        if cell.value is None:
+            return ""
+        elif cell.data_type == TYPE_ERROR:
+            return np.nan
+        elif cell.data_type == TYPE_NUMERIC:
+            val = int(cell.value)
+            if val == cell.value:
+                return val
+            return float(cell.value)
+        return cell.value
+
+    def iterar_linhas(self, arquivo, aba=0, nrows=None):
+        """Gera as linhas da aba (índice ou nome) sem carregar a planilha inteira."""
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(arquivo, read_only=True, data_only=True, keep_links=False)
+        try:
+            sheet = workbook[aba] if isinstance(aba, str) else workbook.worksheets[aba]
+            sheet.reset_dimensions()
+            for numero, row in enumerate(sheet.rows):
+                if nrows is not None and numero >= nrows:
+                    break
+                yield _remover_vazias_do_fim([self._converter_celula(cell) for cell in row])
+        finally:
+            workbook.close()
+
+    def nomes_abas(self, arquivo):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(arquivo, read_only=True, data_only=True, keep_links=False)
+        try:
+            return list(workbook.sheetnames)
+        finally:
+            workbook.close()
+
+
+# Erros de uma versão do openpyxl cujas partes internas (ExcelReader, WorkSheetParser,
+# wb._date_formats) não são mais as usadas pelo LeitorXlsxSobDemanda
+_ERROS_INTERNOS_OPENPYXL = (ImportError, AttributeError, TypeError)
+
+
+class LeitorXlsxSobDemanda:
+    """
+    Leitura das primeiras linhas de uma aba, sem percorrer o resto da planilha.
+
+    O load_workbook(read_only=True) percorre o XML de todas as abas para calcular as
+    dimensões quando a planilha não as declara (o que vários geradores fazem), e o
+    calamine decodifica a aba inteira de uma vez: segundos para um orçamento grande,
+    mesmo quando só as primeiras linhas interessam. Aqui são lidos apenas os textos
+    compartilhados e os estilos (para reconhecer as datas); a aba é interpretada pelo
+    mesmo parser do openpyxl, linha a linha, até a última pedida.
+
+    Essas partes do openpyxl não são públicas: se mudarem, a leitura é feita pelo
+    LeitorXlsxOpenpyxl (mais lento, mesmas linhas).
+    """
+
+    nome = 'sob_demanda'
+    engine_pandas = None  # não é um engine do pd.read_excel
+
+    @staticmethod
+    def disponivel():
+        return True
+
+    @staticmethod
+    def _abrir(arquivo):
+        from openpyxl.reader.excel import ExcelReader
+        from openpyxl.styles.stylesheet import apply_stylesheet
+
+        leitor = ExcelReader(arquivo, read_only=True, keep_links=False, data_only=True)
+        try:
+            leitor.read_manifest()
+            leitor.read_strings()
+            leitor.read_workbook()
+            apply_stylesheet(leitor.archive, leitor.wb)
+        except Exception:
+            leitor.archive.close()
+            raise
+        return leitor
+
+    @staticmethod
+    def _abas(leitor):
+        """(nome, caminho do XML) das abas de dados, na ordem da planilha (como workbook.worksheets)."""
+        return [
+            (aba.name, rel.target) for aba, rel in leitor.parser.find_sheets()
+            if rel.target in leitor.valid_files and 'chartsheet' not in rel.Type
+        ]
+
+    @staticmethod
+    def _converter_celula(celula):
+        from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+        valor = celula['value']
+        if valor is None:
+            return ""
+        elif celula['data_type'] == TYPE_ERROR:
+            return np.nan
+        elif celula['data_type'] == TYPE_NUMERIC:
+            val = int(valor)
+            if val == valor:
+                return val
+            return float(valor)
+        return valor
+
+    def iterar_linhas(self, arquivo, aba=0, nrows=None):
+        """Gera as linhas da aba (índice ou nome), lendo o XML só até a última linha pedida."""
+        lidas = 0
+        try:
+            for linha in self._iterar_linhas_xml(arquivo, aba, nrows):
+                lidas += 1
+                yield linha
+        except _ERROS_INTERNOS_OPENPYXL as e:
+            if lidas:
+                raise
+            logger.warning("Leitura sob demanda incompatível com esta versão do openpyxl (%s); usando load_workbook", e)
+            yield from LeitorXlsxOpenpyxl().iterar_linhas(arquivo, aba, nrows)
+
+    def _iterar_linhas_xml(self, arquivo, aba, nrows):
+        from openpyxl.worksheet._reader import WorkSheetParser
+
+        leitor = self._abrir(arquivo)
+        try:
+            abas = self._abas(leitor)
+            caminho = dict(abas)[aba] if isinstance(aba, str) else abas[aba][1]
+            with leitor.archive.open(caminho) as fonte:
+                parser = WorkSheetParser(fonte, leitor.shared_strings, data_only=True, epoch=leitor.wb.epoch,
+                                         date_formats=leitor.wb._date_formats,
+                                         timedelta_formats=leitor.wb._timedelta_formats)
+                lidas = 0
+                for numero_linha, celulas in parser.parse():
+                    # Linhas vazias não aparecem no XML
+                    while lidas < numero_linha - 1:
+                        if nrows is not None and lidas >= nrows:
+                            return
+                        lidas += 1
+                        yield []
+                    if nrows is not None and lidas >= nrows:
+                        return
+                    linha = [""] * (celulas[-1]['column'] if celulas else 0)
+                    for celula in celulas:
+                        linha[celula['column'] - 1] = self._converter_celula(celula)
+                    lidas += 1
+                    yield _remover_vazias_do_fim(linha)
+        finally:
+            leitor.archive.close()
+
+    def nomes_abas(self, arquivo):
+        try:
+            leitor = self._abrir(arquivo)
+        except _ERROS_INTERNOS_OPENPYXL as e:
+            logger.warning("Leitura sob demanda incompatível com esta versão do openpyxl (%s); usando load_workbook", e)
+            return LeitorXlsxOpenpyxl().nomes_abas(arquivo)
+        try:
+            return [nome for nome, _ in self._abas(leitor)]
+        finally:
+            leitor.archive.close()
+
+
+class LeitorXlsxCalamine:
+    """Leitura com o python-calamine, bem mais rápido que o openpyxl para planilhas grandes."""
+
+    nome = 'calamine'
+    engine_pandas = 'calamine'
+
+    @staticmethod
+    def disponivel():
+        try:
+            import python_calamine  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    @staticmethod
+    def _converter_celula(valor):
+        if isinstance(valor, float):
+            val = int(valor)
+            if val == valor:
+                return val
+            return valor
+        elif isinstance(valor, date):
+            return pd.Timestamp(valor)
+        elif isinstance(valor, timedelta):
+            return pd.Timedelta(valor)
+        elif isinstance(valor, time):
+            return valor
+        return valor
+
+    @staticmethod
+    def _abrir(arquivo):
+        from python_calamine import CalamineWorkbook
+
+        if isinstance(arquivo, (str, os.PathLike)):
+            return CalamineWorkbook.from_path(os.fspath(arquivo))
+        return CalamineWorkbook.from_filelike(arquivo)
+
+    def iterar_linhas(self, arquivo, aba=0, nrows=None):
+        """Gera as linhas da aba (índice ou nome); o calamine decodifica a aba de uma vez, em código nativo."""
+        workbook = self._abrir(arquivo)
+        sheet = workbook.get_sheet_by_name(aba) if isinstance(aba, str) else workbook.get_sheet_by_index(aba)
+        for row in sheet.to_python(skip_empty_area=False, nrows=nrows):
+            yield _remover_vazias_do_fim([self._converter_celula(valor) for valor in row])
+
+    def nomes_abas(self, arquivo):
+        return list(self._abrir(arquivo).sheet_names)
+
+
+BACKENDS_XLSX = {
+    'calamine': LeitorXlsxCalamine(),
+    'openpyxl': LeitorXlsxOpenpyxl(),
+    'sob_demanda': LeitorXlsxSobDemanda(),
+}
+# Ordem de preferência na escolha automática
+ORDEM_BACKENDS = ('calamine', 'openpyxl')
+
+
+def escolher_backend(nome=None):
+    """
+    Retorna o backend de leitura pedido ou, sem nome, o mais rápido disponível.
+
+    Args:
+        nome: 'calamine', 'openpyxl' ou None (usa OLIST_LEITOR_XLSX ou a ordem de preferência)
+    """
+    nome = nome or BACKEND_XLSX_PADRAO
+    if nome:
+        if nome not in BACKENDS_XLSX:
+            raise ValueError(f"Backend de leitura xlsx desconhecido: {nome}")
+        if BACKENDS_XLSX[nome].disponivel():
+            return BACKENDS_XLSX[nome]
+        logger.warning("Backend xlsx '%s' não instalado, usando openpyxl", nome)
+        return BACKENDS_XLSX['openpyxl']
+    for candidato in ORDEM_BACKENDS:
+        if BACKENDS_XLSX[candidato].disponivel():
+            return BACKENDS_XLSX[candidato]
+    return BACKENDS_XLSX['openpyxl']
+
+
+def ler_excel(arquivo, backend=None, **kwargs):
+    """
+    pd.read_excel com o backend escolhido, refazendo a leitura com o openpyxl em caso de falha.
+
+    Args:
+        arquivo: Caminho do arquivo ou objeto BytesIO
+        backend: Nome do backend (ver escolher_backend)
+        **kwargs: Demais argumentos do pd.read_excel
+
+    Returns:
+        DataFrame (ou dicionário de DataFrames, conforme sheet_name)
+    """
+    leitor = escolher_backend(backend)
+    if leitor.engine_pandas is None:
+        leitor = BACKENDS_XLSX['openpyxl']
+    try:
+        return pd.read_excel(arquivo, engine=leitor.engine_pandas, **kwargs)
+    except Exception as e:
+        if leitor.nome == 'openpyxl':
+            raise
+        logger.warning("Falha ao ler xlsx com %s (%s); tentando com openpyxl", leitor.nome, e)
+        if hasattr(arquivo, 'seek'):
+            arquivo.seek(0)
+        return pd.read_excel(arquivo, engine='openpyxl', **kwargs)
+
+
+def comparar_backends(arquivo, backends=None):
+    """
+    Lê todas as abas do arquivo com cada backend disponível e compara com o openpyxl.
+
+    Args:
+        arquivo: Caminho do .xlsx
+        backends: Nomes dos backends comparados (padrão: todos os disponíveis)
+
+    Returns:
+        Lista de divergências encontradas (vazia quando todos os backends concordam)
+    """
+    from leitor_orcamento import LeitorOrcamento
+
+    divergencias = []
+    referencia = LeitorXlsxOpenpyxl()
+    for nome, leitor in BACKENDS_XLSX.items():
+        if nome == referencia.nome or not leitor.disponivel() or (backends is not None and nome not in backends):
+            continue
+        for aba in referencia.nomes_abas(arquivo):
+            comparacoes = [('LeitorOrcamento', LeitorOrcamento(arquivo, aba=aba, backend='openpyxl').ler_dataframe(0),
+                            LeitorOrcamento(arquivo, aba=aba, backend=nome).ler_dataframe(0))]
+            if leitor.engine_pandas is not None:
+                comparacoes.insert(0, ('read_excel', pd.read_excel(arquivo, sheet_name=aba, engine='openpyxl'),
+                                       pd.read_excel(arquivo, sheet_name=aba, engine=leitor.engine_pandas)))
+            for rotulo, df_esperado, df_obtido in comparacoes:
+                try:
+                    pd.testing.assert_frame_equal(df_esperado, df_obtido)
+                except AssertionError as e:
+                    divergencias.append(f"{arquivo} [{aba}] {rotulo} openpyxl x {nome}: {e}")
+    return divergencias
+
@@ -0,0 +1,125 @@
+"""
+Logging do conversor: níveis, ID de correlação por requisição, formato texto ou JSON e
+amostragem das mensagens de debug de alto volume (por linha do orçamento).
+
+Os módulos usam loggers comuns (logging.getLogger(__name__)) com argumentos no estilo %,
+de modo que nada é formatado quando o nível está desligado. A aplicação (main.py) e a
+linha de comando chamam configurar_logging uma vez; usado como biblioteca, o conversor
+não instala handlers.
+
+Variáveis de ambiente:
+    OLIST_LOG_NIVEL: DEBUG, INFO (padrão), WARNING ou ERROR
+    OLIST_LOG_FORMATO: 'texto' (padrão) ou 'json' (um objeto por linha)
+    OLIST_LOG_AMOSTRA_DEBUG: fração das mensagens de debug por linha que é registrada (padrão: 0.01)
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+NIVEL_LOG_PADRAO = os.environ.get('OLIST_LOG_NIVEL', 'INFO').upper()
+FORMATO_LOG_PADRAO = os.environ.get('OLIST_LOG_FORMATO', 'texto').lower()
+TAXA_AMOSTRAGEM_DEBUG = float(os.environ.get('OLIST_LOG_AMOSTRA_DEBUG', '0.01'))
+
+FORMATO_TEXTO = '%(asctime)s %(levelname)s [%(id_requisicao)s] %(name)s: %(message)s'
+
+# Cabeçalho HTTP com o ID de correlação (recebido do proxy/cliente ou gerado aqui)
+CABECALHO_ID_REQUISICAO = 'X-Request-ID'
+
+_id_requisicao = contextvars.ContextVar('id_requisicao', default='-')
+_handlers_instalados = []
+
+
+def novo_id_requisicao():
+    return uuid.uuid4().hex[:16]
+
+
+def id_requisicao_atual():
+    return _id_requisicao.get()
+
+
+def definir_id_requisicao(valor=None):
+    """Define o ID de correlação do contexto atual (gerando um novo se não for informado) e o retorna."""
+    valor = (valor or '').strip()[:64] or novo_id_requisicao()
+    _id_requisicao.set(valor)
+    return valor
+
+
+@contextmanager
+def contexto_requisicao(valor):
+    """Usa o ID de correlação informado dentro do bloco (threads de jobs, processos do lote)."""
+    token = _id_requisicao.set(valor or '-')
+    try:
+        yield
+    finally:
+        _id_requisicao.reset(token)
+
+
+class _FiltroContexto(logging.Filter):
+    """Acrescenta o ID de correlação do contexto atual a cada registro."""
+
+    def filter(self, record):
+        if not hasattr(record, 'id_requisicao'):
+            record.id_requisicao = _id_requisicao.get()
+        return True
+
+
+class FormatadorJson(logging.Formatter):
+    """Um objeto JSON por linha; campos passados em extra={'dados': {...}} são incluídos."""
+
+    def format(self, record):
+        evento = {
+            'horario': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'id_requisicao': getattr(record, 'id_requisicao', '-'),
+            'mensagem': record.getMessage(),
+        }
+        dados = getattr(record, 'dados', None)
+        if dados:
+            evento.update(dados)
+        if record.exc_info:
+            evento['excecao'] = self.formatException(record.exc_info)
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+
+def _novo_formatador(formato):
+    return FormatadorJson() if formato == 'json' else logging.Formatter(FORMATO_TEXTO)
+
+
+def configurar_logging(nivel=None, formato=None, arquivo=None):
+    """
+    Instala o handler do conversor no logger raiz (uma única vez por processo).
+
+    Args:
+        nivel: Nível mínimo (padrão: OLIST_LOG_NIVEL)
+        formato: 'texto' ou 'json' (padrão: OLIST_LOG_FORMATO)
+        arquivo: Se informado, grava também neste arquivo
+    """
+    formato = (formato or FORMATO_LOG_PADRAO).lower()
+    raiz = logging.getLogger()
+    destinos = []
+    if not _handlers_instalados:
+        destinos.append(logging.StreamHandler(sys.stderr))
+    if arquivo:
+        destinos.append(logging.FileHandler(arquivo, encoding='utf-8'))
+    for handler in destinos:
+        handler.addFilter(_FiltroContexto())
+        handler.setFormatter(_novo_formatador(formato))
+        raiz.addHandler(handler)
+        _handlers_instalados.append(handler)
+    raiz.setLevel((nivel or NIVEL_LOG_PADRAO).upper())
+
+
+def debug_amostrado(logger, mensagem, *args, taxa=None):
+    """
+    Debug de alto volume (ex.: uma mensagem por linha do orçamento): só uma fração das
+    chamadas é registrada. Com o nível DEBUG desligado nada é sorteado nem formatado.
+    """
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < (TAXA_AMOSTRAGEM_DEBUG if taxa is None else taxa):
+        logger.debug(mensagem, *args, stacklevel=2)
@@ -0,0 +1,381 @@
+"""
+Conversão em lote de vários orçamentos.
+
+Os dados de referência (catálogo, clientes e índice) são carregados uma única vez e
+entregues a cada processo do pool na inicialização; os orçamentos são convertidos em
+paralelo com a mesma função da conversão individual. O resultado é um ZIP com os
+arquivos no formato Olist e um manifest.json com a situação de cada orçamento.
+
+O pool de processos é um só por processo da aplicação, reaproveitado entre os lotes e
+recriado apenas quando os dados de referência mudam. Os processos do pool são iniciados
+por 'forkserver' (ou 'spawn', onde não houver), nunca por fork direto: o worker do
+gunicorn já tem threads (atualizador da referência, jobs, leitura das abas) e um fork
+feito enquanto uma delas segura uma trava (logging, sqlite, sessão HTTP) pode travar o
+processo filho.
+"""
+import functools
+import io
+import json
+import logging
+import multiprocessing
+import os
+import posixpath
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Optional
+
+from conversor_olist import converter_orcamento_para_olist_detalhado
+from log_conversor import configurar_logging, definir_id_requisicao, id_requisicao_atual
+from metricas import registrar_tempos_conversao, registro_metricas
+from saida_olist import FORMATO_SAIDA_PADRAO, gerar_saida, nome_arquivo_saida
+
+logger = logging.getLogger(__name__)
+
+# Processos do pool da conversão em lote, somados todos os lotes em andamento neste
+# processo (padrão: um por núcleo; com vários workers do gunicorn, divida os núcleos entre eles)
+PROCESSOS_LOTE_PADRAO = int(os.environ.get('OLIST_LOTE_PROCESSOS', '0')) or (os.cpu_count() or 1)
+
+EXTENSOES_ORCAMENTO = ('.xlsx', '.csv', '.tsv')
+
+# Limites do lote, conferidos antes de descompactar os .zip (um .zip pequeno pode se expandir em gigabytes)
+MAX_ARQUIVOS_LOTE = int(os.environ.get('OLIST_LOTE_MAX_ARQUIVOS', '200'))
+MAX_BYTES_ARQUIVO_LOTE = int(float(os.environ.get('OLIST_LOTE_MAX_MB_ARQUIVO', '50')) * 1024 * 1024)
+MAX_BYTES_LOTE = int(float(os.environ.get('OLIST_LOTE_MAX_MB_TOTAL', '300')) * 1024 * 1024)
+
+
+class LoteMuitoGrande(ValueError):
+    """O lote passa do limite de arquivos ou de tamanho (já descompactado)."""
+
+
+@dataclass
+class ItemLote:
+    """Um orçamento do lote: nome do arquivo, conteúdo (ou caminho em disco) e cliente."""
+    nome_arquivo: str
+    conteudo: Optional[bytes]
+    cliente_id: Optional[str]
+    caminho: Optional[str] = None  # lido pelo processo que converter o item, sem passar o conteúdo entre processos
+
+
+@dataclass
+class ResultadoItemLote:
+    """Situação da conversão de um orçamento do lote (uma entrada do manifest.json)."""
+    arquivo: str
+    cliente_id: Optional[str]
+    status: str  # 'ok' ou 'erro'
+    arquivo_saida: Optional[str] = None
+    linhas: int = 0
+    produtos_nao_mapeados: list = field(default_factory=list)
+    erro: Optional[str] = None
+    tempos: dict = field(default_factory=dict)
+    conteudo_saida: Optional[bytes] = field(default=None, repr=False)
+
+    def para_manifesto(self):
+        return {
+            'arquivo': self.arquivo,
+            'cliente_id': self.cliente_id,
+            'status': self.status,
+            'arquivo_saida': self.arquivo_saida,
+            'linhas': self.linhas,
+            'produtos_nao_mapeados': self.produtos_nao_mapeados,
+            'erro': self.erro,
+            'tempos': {etapa: round(segundos, 4) for etapa, segundos in self.tempos.items()},
+        }
+
+
+def extrair_itens_lote(arquivos, clientes_por_arquivo=None, cliente_padrao=None):
+    """
+    Monta os itens do lote a partir dos arquivos enviados; arquivos .zip são expandidos.
+
+    Args:
+        arquivos: Lista de tuplas (nome do arquivo, conteúdo em bytes)
+        clientes_por_arquivo: Dicionário {nome do arquivo: ID do cliente}
+        cliente_padrao: ID do cliente para os arquivos que não estão no dicionário
+
+    Returns:
+        Lista de ItemLote, na ordem dos arquivos
+
+    Raises:
+        LoteMuitoGrande: Mais de MAX_ARQUIVOS_LOTE orçamentos, um orçamento com mais de
+            MAX_BYTES_ARQUIVO_LOTE ou mais de MAX_BYTES_LOTE no total (tamanhos descompactados)
+        zipfile.BadZipFile: Um dos .zip está corrompido
+    """
+    clientes_por_arquivo = {str(nome): str(cliente) for nome, cliente in (clientes_por_arquivo or {}).items()}
+
+    def cliente_do_arquivo(nome):
+        return _cliente_do_arquivo(nome, clientes_por_arquivo, cliente_padrao)
+
+    itens = []
+    total_bytes = 0
+
+    def conferir_limites(nome, tamanho):
+        nonlocal total_bytes
+        total_bytes += tamanho
+        if len(itens) >= MAX_ARQUIVOS_LOTE:
+            raise LoteMuitoGrande(f"O lote tem mais de {MAX_ARQUIVOS_LOTE} orçamentos")
+        if tamanho > MAX_BYTES_ARQUIVO_LOTE:
+            raise LoteMuitoGrande(f"'{nome}' tem mais de {MAX_BYTES_ARQUIVO_LOTE // (1024 * 1024)} MB")
+        if total_bytes > MAX_BYTES_LOTE:
+            raise LoteMuitoGrande(f"O lote tem mais de {MAX_BYTES_LOTE // (1024 * 1024)} MB descompactados")
+
+    for nome, conteudo in arquivos:
+        if nome.lower().endswith('.zip'):
+            with zipfile.ZipFile(io.BytesIO(conteudo)) as zip_entrada:
+                for info in zip_entrada.infolist():
+                    nome_interno = info.filename
+                    base = posixpath.basename(nome_interno)
+                    if (info.is_dir() or nome_interno.startswith('__MACOSX/') or base.startswith(('.', '~$'))
+                            or not base.lower().endswith(EXTENSOES_ORCAMENTO)):
+                        continue
+                    # file_size vem do cabeçalho do .zip e a leitura nunca devolve mais que isso
+                    conferir_limites(nome_interno, info.file_size)
+                    itens.append(ItemLote(nome_interno, zip_entrada.read(info), cliente_do_arquivo(nome_interno)))
+        else:
+            conferir_limites(nome, len(conteudo))
+            itens.append(ItemLote(nome, conteudo, cliente_do_arquivo(nome)))
+    return itens
+
+
+def itens_de_caminhos(caminhos, clientes_por_arquivo=None, cliente_padrao=None, base=None):
+    """
+    Monta os itens do lote a partir de arquivos em disco (lidos só na conversão).
+
+    Args:
+        caminhos: Caminhos dos orçamentos (.xlsx, .csv ou .tsv)
+        clientes_por_arquivo: Dicionário {nome do arquivo ou caminho relativo a base: ID do cliente}
+        cliente_padrao: ID do cliente para os arquivos que não estão no dicionário
+        base: Diretório usado para o nome relativo dos arquivos
+
+    Returns:
+        Lista de ItemLote
+    """
+    clientes_por_arquivo = {str(nome).replace(os.sep, '/'): str(cliente) for nome, cliente in (clientes_por_arquivo or {}).items()}
+    itens = []
+    for caminho in caminhos:
+        nome = os.path.relpath(caminho, base) if base else caminho
+        nome = nome.replace(os.sep, '/')
+        itens.append(ItemLote(nome, None, _cliente_do_arquivo(nome, clientes_por_arquivo, cliente_padrao), caminho=caminho))
+    return itens
+
+
+def _cliente_do_arquivo(nome, clientes_por_arquivo, cliente_padrao):
+    for chave in (nome, posixpath.basename(nome)):
+        if chave in clientes_por_arquivo:
+            return clientes_por_arquivo[chave]
+    return str(cliente_padrao) if cliente_padrao else None
+
+
+def nome_unico(nome, nomes_usados):
+    """Numera nomes de arquivo repetidos (dois orçamentos do mesmo cliente geram o mesmo nome)."""
+    raiz, extensao = os.path.splitext(nome)
+    candidato = nome
+    contador = 2
+    while candidato in nomes_usados:
+        candidato = f"{raiz}_{contador}{extensao}"
+        contador += 1
+    nomes_usados.add(candidato)
+    return candidato
+
+
+# Estado de cada processo do pool, preenchido por _inicializar_processo
+_contexto_processo = {}
+
+
+def _inicializar_processo(url_catalogo, url_clientes, caminho_modelo, dados_referencia, processo_auxiliar=False,
+                          nivel_log=None):
+    if processo_auxiliar:
+        # Os processos do pool terminam sem aviso; as métricas dos itens são registradas pelo processo principal
+        registro_metricas.gravacao_habilitada = False
+        if nivel_log is not None:
+            configurar_logging(nivel=nivel_log)
+    _contexto_processo.update(
+        url_catalogo=url_catalogo,
+        url_clientes=url_clientes,
+        caminho_modelo=caminho_modelo,
+        dados_referencia=dados_referencia,
+    )
+
+
+def _converter_item(item, formato=FORMATO_SAIDA_PADRAO, todas_abas=False, id_requisicao=None, contexto=None):
+    contexto = contexto or _contexto_processo
+    if id_requisicao is not None:
+        definir_id_requisicao(id_requisicao)
+    if not item.cliente_id:
+        return ResultadoItemLote(item.nome_arquivo, None, 'erro', erro='Nenhum cliente informado para o arquivo')
+    if not item.nome_arquivo.lower().endswith(EXTENSOES_ORCAMENTO):
+        return ResultadoItemLote(item.nome_arquivo, item.cliente_id, 'erro', erro='Tipo de arquivo inválido. Use .xlsx, .csv ou .tsv')
+    try:
+        resultado = converter_orcamento_para_olist_detalhado(
+            item.caminho if item.caminho else io.BytesIO(item.conteudo),
+            contexto['url_catalogo'],
+            contexto['url_clientes'],
+            item.cliente_id,
+            contexto['caminho_modelo'],
+            dados_referencia=contexto['dados_referencia'],
+            todas_abas=todas_abas
+        )
+        if resultado.df.empty:
+            return ResultadoItemLote(
+                item.nome_arquivo, item.cliente_id, 'erro',
+                produtos_nao_mapeados=resultado.produtos_nao_mapeados,
+                erro=resultado.erro or 'Nenhum dado processado',
+                tempos=resultado.tempos,
+            )
+        with gerar_saida(resultado.df, formato) as arquivo_saida:
+            conteudo_saida = arquivo_saida.read()
+        return ResultadoItemLote(
+            item.nome_arquivo, item.cliente_id, 'ok',
+            arquivo_saida=nome_arquivo_saida(resultado.nome_cliente, item.cliente_id, formato),
+            linhas=len(resultado.df),
+            produtos_nao_mapeados=resultado.produtos_nao_mapeados,
+            tempos=resultado.tempos,
+            conteudo_saida=conteudo_saida,
+        )
+    except Exception as e:
+        logger.error("Erro no lote (%s): %s", item.nome_arquivo, e, exc_info=True)
+        return ResultadoItemLote(item.nome_arquivo, item.cliente_id, 'erro', erro=str(e))
+
+
+def _contexto_multiprocessing():
+    """'forkserver' onde houver (Linux, macOS); 'spawn' nos demais (Windows)."""
+    metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(metodo)
+
+
+# Pool compartilhado pelos lotes deste processo e a configuração com que foi criado
+_pool = None
+_configuracao_pool = None
+_trava_pool = threading.Lock()
+
+
+def _versao_dados(dados_referencia):
+    versoes = getattr(dados_referencia, 'versoes', None)
+    return tuple(sorted(versoes.items())) if versoes else id(dados_referencia)
+
+
+def _obter_pool(processos, url_catalogo, url_clientes, caminho_modelo, dados_referencia):
+    """Pool com os dados de referência informados; recriado só quando a configuração muda."""
+    global _pool, _configuracao_pool
+    configuracao = (processos, url_catalogo, url_clientes, caminho_modelo, _versao_dados(dados_referencia))
+    with _trava_pool:
+        if _pool is not None and _configuracao_pool == configuracao:
+            return _pool
+        if _pool is not None:
+            # Lotes em andamento no pool antigo terminam normalmente; os processos saem depois
+            _pool.shutdown(wait=False)
+        logger.info("Iniciando pool do lote com %d processo(s)", processos)
+        nivel_log = logging.getLevelName(logging.getLogger().getEffectiveLevel())
+        _pool = ProcessPoolExecutor(
+            max_workers=processos, mp_context=_contexto_multiprocessing(), initializer=_inicializar_processo,
+            initargs=(url_catalogo, url_clientes, caminho_modelo, dados_referencia, True, nivel_log),
+        )
+        _configuracao_pool = configuracao
+        return _pool
+
+
+def _descartar_pool(pool):
+    """Descarta o pool quebrado (processo do pool encerrado à força); o próximo lote cria outro."""
+    global _pool, _configuracao_pool
+    with _trava_pool:
+        if _pool is pool:
+            _pool = None
+            _configuracao_pool = None
+    pool.shutdown(wait=False)
+
+
+def processar_lote(itens, url_catalogo, url_clientes, caminho_modelo, dados_referencia, processos=None,
+                   formato=FORMATO_SAIDA_PADRAO, todas_abas=False):
+    """
+    Converte os orçamentos do lote em paralelo (ver iterar_lote).
+
+    Returns:
+        Lista de ResultadoItemLote, na ordem dos itens
+    """
+    return list(iterar_lote(itens, url_catalogo, url_clientes, caminho_modelo, dados_referencia, processos, formato,
+                            todas_abas))
+
+
+def iterar_lote(itens, url_catalogo, url_clientes, caminho_modelo, dados_referencia, processos=None,
+                formato=FORMATO_SAIDA_PADRAO, todas_abas=False):
+    """
+    Converte os orçamentos do lote em paralelo, entregando cada resultado assim que fica pronto
+    na ordem dos itens (para lotes grandes, em que não convém manter todos em memória).
+
+    Args:
+        itens: Lista de ItemLote
+        url_catalogo: URL da planilha de mapeamento de produtos
+        url_clientes: URL da planilha de clientes
+        caminho_modelo: Caminho (ou nome registrado) do modelo de saída
+        dados_referencia: DadosReferencia já carregados, compartilhados por todos os itens
+        processos: Tamanho do pool compartilhado (padrão: OLIST_LOTE_PROCESSOS ou um por núcleo)
+        formato: Formato dos arquivos convertidos (ver saida_olist.validar_formato_saida)
+        todas_abas: Converte os itens de todas as abas de cada .xlsx, e não só os da primeira
+
+    Returns:
+        Gerador de ResultadoItemLote, na ordem dos itens
+    """
+    processos = processos or PROCESSOS_LOTE_PADRAO
+    logger.info("Convertendo lote de %d orçamento(s) com até %d processo(s)", len(itens),
+                max(min(processos, len(itens)), 1))
+    converter = functools.partial(_converter_item, formato=formato, todas_abas=todas_abas)
+
+    if processos <= 1 or len(itens) <= 1:
+        contexto = dict(url_catalogo=url_catalogo, url_clientes=url_clientes, caminho_modelo=caminho_modelo,
+                        dados_referencia=dados_referencia)
+        for item in itens:
+            yield converter(item, contexto=contexto)
+        return
+
+    # Itens agrupados para diminuir a troca de mensagens entre processos em lotes grandes
+    tamanho_grupo = max(1, min(16, len(itens) // (processos * 4)))
+    converter = functools.partial(converter, id_requisicao=id_requisicao_atual())
+    for tentativa in range(2):
+        pool = _obter_pool(processos, url_catalogo, url_clientes, caminho_modelo, dados_referencia)
+        try:
+            resultados = pool.map(converter, itens, chunksize=tamanho_grupo)
+            break
+        except BrokenProcessPool:
+            # Pool quebrado por um lote anterior: tenta uma vez com um pool novo
+            _descartar_pool(pool)
+            if tentativa:
+                raise
+    try:
+        for resultado in resultados:
+            if resultado.tempos:
+                registrar_tempos_conversao(resultado.tempos, resultado.status == 'ok', resultado.linhas,
+                                           len(resultado.produtos_nao_mapeados))
+            yield resultado
+    except BrokenProcessPool:
+        _descartar_pool(pool)
+        raise
+
+
+def resumo_lote(resultados):
+    """Totais do lote e a situação de cada orçamento (conteúdo do manifest.json)."""
+    return {
+        'total': len(resultados),
+        'convertidos': sum(1 for r in resultados if r.status == 'ok'),
+        'com_erro': sum(1 for r in resultados if r.status != 'ok'),
+        'arquivos': [r.para_manifesto() for r in resultados],
+    }
+
+
+def montar_zip_lote(resultados):
+    """
+    Monta o ZIP de resposta do lote: os arquivos convertidos e o manifest.json.
+
+    Returns:
+        BytesIO com o ZIP, posicionado no início
+    """
+    saida = io.BytesIO()
+    nomes_usados = set()
+    with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_DEFLATED) as zip_saida:
+        for resultado in resultados:
+            if resultado.status == 'ok':
+                resultado.arquivo_saida = nome_unico(resultado.arquivo_saida, nomes_usados)
+                zip_saida.writestr(resultado.arquivo_saida, resultado.conteudo_saida)
+        zip_saida.writestr('manifest.json', json.dumps(resumo_lote(resultados), ensure_ascii=False, indent=2, default=str))
+    saida.seek(0)
+    return saida
@@ -5,20 +5,34 @@ import time
 import contextlib
 from pathlib import Path
 import tempfile
+import logging
 # Adiciona o diretório pai de 'src' ao sys.path para permitir importações como 'from src.conversor_olist import ...'
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-# ===== INÍCIO DIAGNÓSTICO =====
-print("Diretório atual:", os.getcwd())
-# ===== FIM DIAGNÓSTICO =====
-
-from flask import Flask, request, jsonify, send_file, render_template
+from flask import Flask, Response, g, request, jsonify, send_file, render_template, abort
 import pandas as pd
 import io # Para enviar o arquivo em memória
+import json
+import zipfile
 from werkzeug.utils import secure_filename # Para nomes de arquivo seguros
 
 # Importa a função de conversão do outro arquivo .py
-from conversor_olist import converter_orcamento_para_olist
+from conversor_olist import converter_orcamento_para_olist_detalhado, URL_PLANILHA_CLIENTES, URL_PLANILHA_MAPEAMENTO
+from atualizador_referencia import AtualizadorReferencia
+from cache_resultados import CACHE_RESULTADOS_HABILITADO, CacheResultados, chave_resultado
+from dados_referencia import invalidar_dados_referencia
+from indice_clientes import LIMITE_BUSCA_MAXIMO, LIMITE_BUSCA_PADRAO, obter_indice_clientes
+from modelos_saida import registro_modelos
+from saida_olist import FORMATO_SAIDA_PADRAO, MIMETYPES_SAIDA, gerar_saida, nome_arquivo_saida, validar_formato_saida
+from lote import EXTENSOES_ORCAMENTO, LoteMuitoGrande, extrair_itens_lote, processar_lote, montar_zip_lote
+from jobs import ArmazemJobs, GerenciadorJobs, FilaJobsCheia
+from previa_orcamento import LINHAS_DADOS_PREVIA, previsualizar_orcamento
+from log_conversor import CABECALHO_ID_REQUISICAO, configurar_logging, definir_id_requisicao
+from metricas import DURACAO_REQUISICOES, registro_metricas
+
+# Níveis e formato do log: OLIST_LOG_NIVEL e OLIST_LOG_FORMATO (ver log_conversor)
+configurar_logging()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__, static_folder='static', template_folder='static')
 
@@ -28,51 +42,93 @@ DATA_DIR = os.path.join(BASE_DIR, 'data')
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads') # Para uploads temporários de orçamentos
 
 # URLs das planilhas do Google Sheets
-CLIENTES_SHEET_URL = "https://docs.google.com/spreadsheets/d/1qAuw2ebWPJmcy_gl4Qf48GfmnSGLZumDfs62fpG2BGA/edit?pli=1&gid=1582301730#gid=1582301730"
-MAPEAMENTO_PRODUTOS_SHEET_URL = "https://docs.google.com/spreadsheets/d/1qAuw2ebWPJmcy_gl4Qf48GfmnSGLZumDfs62fpG2BGA/edit?pli=1&gid=1351609730#gid=1351609730"
+CLIENTES_SHEET_URL = URL_PLANILHA_CLIENTES
+MAPEAMENTO_PRODUTOS_SHEET_URL = URL_PLANILHA_MAPEAMENTO
 MODELO_SAIDA_OLIST_FILENAME = "formato Olist(SAIDA).xlsx"
 MODELO_SAIDA_OLIST_PATH = os.path.join(DATA_DIR, MODELO_SAIDA_OLIST_FILENAME)
 
-# ===== INÍCIO DIAGNÓSTICO =====
-print("Caminhos dos arquivos:")
-print(f"MODELO_SAIDA_OLIST_PATH: {MODELO_SAIDA_OLIST_PATH} (Existe: {os.path.exists(MODELO_SAIDA_OLIST_PATH)})")
-print(f"Arquivos em {DATA_DIR} (Existe: {os.path.exists(DATA_DIR)}):", os.listdir(DATA_DIR) if os.path.exists(DATA_DIR) else "Pasta não existe")
-# ===== FIM DIAGNÓSTICO =====
+if logger.isEnabledFor(logging.DEBUG):
+    logger.debug("Diretório atual: %s", os.getcwd())
+    logger.debug("MODELO_SAIDA_OLIST_PATH: %s (Existe: %s)", MODELO_SAIDA_OLIST_PATH, os.path.exists(MODELO_SAIDA_OLIST_PATH))
+    logger.debug("Arquivos em %s: %s", DATA_DIR, os.listdir(DATA_DIR) if os.path.exists(DATA_DIR) else "Pasta não existe")
 
-# Criar diretório de uploads se não existir
+# Criar diretórios de dados e de uploads se não existirem
+os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Modelos de saída disponíveis (outros marketplaces podem ser registrados com outros nomes)
+registro_modelos.registrar('olist', MODELO_SAIDA_OLIST_PATH)
+
+# Catálogo e clientes atualizados em segundo plano: as requisições usam sempre a última versão boa.
+# OLIST_ATUALIZADOR_REFERENCIA=0 desliga a thread (os dados passam a ser obtidos em cada requisição).
+atualizador_referencia = AtualizadorReferencia(MAPEAMENTO_PRODUTOS_SHEET_URL, CLIENTES_SHEET_URL)
+if os.environ.get('OLIST_ATUALIZADOR_REFERENCIA', '1') != '0':
+    atualizador_referencia.iniciar()
+
+# Arquivos já convertidos, para reenvios do mesmo orçamento ao mesmo cliente (OLIST_CACHE_RESULTADOS=0 desliga)
+cache_resultados = CacheResultados()
+
+# Conversões assíncronas (POST /jobs): estado em disco, compartilhado entre os workers
+armazem_jobs = ArmazemJobs()
+gerenciador_jobs = GerenciadorJobs(
+    armazem_jobs,
+    MAPEAMENTO_PRODUTOS_SHEET_URL,
+    CLIENTES_SHEET_URL,
+    MODELO_SAIDA_OLIST_PATH,
+    atualizador_referencia.dados
+)
+
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-ALLOWED_EXTENSIONS = {'xlsx'}
+# Tamanho máximo de cada requisição (somados todos os arquivos enviados)
+app.config['MAX_CONTENT_LENGTH'] = int(float(os.environ.get('OLIST_MAX_UPLOAD_MB', '100')) * 1024 * 1024)
+ALLOWED_EXTENSIONS = {extensao.lstrip('.') for extensao in EXTENSOES_ORCAMENTO}
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def check_required_files():
-    """Check if all required files exist and are readable."""
-    # Certifique-se de que o diretório DATA_DIR existe
-    os.makedirs(DATA_DIR, exist_ok=True)
-    print(f"[CHECK] Verificando diretório de dados: {DATA_DIR} (Existe: {os.path.exists(DATA_DIR)})")
-    
-    required_files = {
-        'modelo': MODELO_SAIDA_OLIST_PATH
-    }
-    
-    missing_files = []
-    for file_type, path in required_files.items():
-        if not os.path.exists(path):
-            missing_files.append(file_type)
-            app.logger.error(f"Required file missing: {path}")
-            print(f"[CHECK] Arquivo ausente: {path}")
-        else:
-            print(f"[CHECK] Arquivo encontrado: {path}")
+    """Check if all required files exist (o esquema dos modelos fica em cache no registro_modelos)."""
+    missing_files = registro_modelos.modelos_ausentes()
+    for file_type in missing_files:
+        path = registro_modelos.resolver(file_type)
+        app.logger.error(f"Required file missing: {path}")
     
     # Adicionar verificação de acessibilidade das URLs do Google Sheets aqui, se necessário
     # Por enquanto, assumimos que as URLs são acessíveis publicamente.
 
     return missing_files
 
+@app.before_request
+def iniciar_medicao_requisicao():
+    g.inicio_requisicao = time.perf_counter()
+    # ID de correlação: o recebido do proxy/cliente ou um novo; aparece em todo o log da requisição
+    g.id_requisicao = definir_id_requisicao(request.headers.get(CABECALHO_ID_REQUISICAO))
+
+@app.before_request
+def limitar_tamanho_requisicao():
+    # Recusa já pelo Content-Length; sem ele, o limite vale na leitura do corpo
+    limite = app.config['MAX_CONTENT_LENGTH']
+    if request.content_length is not None and request.content_length > limite:
+        abort(413)
+
+@app.after_request
+def registrar_medicao_requisicao(response):
+    inicio = g.get('inicio_requisicao')
+    if inicio is not None:
+        # Rota pelo padrão (ex.: /jobs/<job_id>), para não criar uma série por job
+        rota = request.url_rule.rule if request.url_rule is not None else 'nao_encontrada'
+        DURACAO_REQUISICOES.observar(time.perf_counter() - inicio, rota=rota, metodo=request.method,
+                                     status=response.status_code)
+    if g.get('id_requisicao'):
+        response.headers[CABECALHO_ID_REQUISICAO] = g.id_requisicao
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas de todos os workers no formato texto do Prometheus."""
+    return Response(registro_metricas.exportar(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/')
 def index():
     try:
@@ -86,37 +142,99 @@ def index():
         app.logger.error(f"Error rendering index: {str(e)}\n{traceback.format_exc()}")
         return jsonify({'error': 'Error loading application'}), 500
 
+def indice_clientes_atual():
+    """Índice da versão em uso da planilha de clientes, ou None se a planilha não tiver as colunas ID e Nome."""
+    dados = atualizador_referencia.dados()
+    if 'ID' not in dados.clientes.columns or 'Nome' not in dados.clientes.columns:
+        return None
+    return obter_indice_clientes(dados.clientes, dados.versoes.get('clientes'))
+
 @app.route('/clientes', methods=['GET'])
 def get_clientes():
+    """
+    Lista completa de clientes (ID e Nome), já ordenada, comprimida com gzip quando o navegador
+    aceita e com a versão da planilha como ETag: enquanto a lista não muda, a resposta é 304.
+    """
     try:
-        # Agora lê do Google Sheets
-        from conversor_olist import get_dataframe_from_google_sheet
-        import unicodedata
-        df_clientes = get_dataframe_from_google_sheet(CLIENTES_SHEET_URL, sheet_name='clientes')
-        
-        if 'ID' in df_clientes.columns and 'Nome' in df_clientes.columns:
-            df_clientes = df_clientes.dropna(subset=['Nome'])
-            df_clientes['ID'] = df_clientes['ID'].astype(str)
-            
-            # Normalizar caracteres especiais nos nomes dos clientes para exibição
-            def normalizar_nome(nome):
-                # Garante que caracteres especiais sejam exibidos corretamente
-                if not isinstance(nome, str):
-                    nome = str(nome)
-                
-                # Simplesmente retorna o nome original sem tentar normalizar
-                # Isso preserva os caracteres especiais como estão no Google Sheets
-                return nome
-                
-            df_clientes['Nome'] = df_clientes['Nome'].apply(normalizar_nome)
-            clientes_list = df_clientes[['ID', 'Nome']].to_dict(orient='records')
-            return jsonify({'clientes': clientes_list})
-        else:
+        # Agora lê do Google Sheets (última versão carregada pelo atualizador)
+        indice = indice_clientes_atual()
+        if indice is None:
             return jsonify({'error': 'Invalid client file structure in Google Sheet'}), 500
+
+        comprimida = request.accept_encodings['gzip'] > 0
+        resposta = Response(indice.lista_json(comprimida), mimetype='application/json')
+        if comprimida:
+            resposta.headers['Content-Encoding'] = 'gzip'
+        resposta.vary.add('Accept-Encoding')
+        etag = indice.etag()
+        if etag:
+            # Cada codificação é uma representação diferente, com ETag próprio
+            resposta.set_etag(f"{etag}-gzip" if comprimida else etag)
+        resposta.cache_control.no_cache = True  # o navegador guarda, mas confirma a versão a cada acesso
+        return resposta.make_conditional(request)
     except Exception as e:
         app.logger.error(f"Error loading clients from Google Sheet: {str(e)}\n{traceback.format_exc()}")
         return jsonify({'error': str(e), 'details': traceback.format_exc()}), 500
 
+@app.route('/clientes/busca', methods=['GET'])
+def buscar_clientes():
+    """
+    Busca de clientes pelo nome: ?q=<texto>&limit=<quantidade> (padrão 20, máximo 200).
+    Cada palavra digitada precisa ser o início de uma palavra do nome; maiúsculas e acentos não importam.
+    """
+    try:
+        try:
+            limite = int(request.args.get('limit') or LIMITE_BUSCA_PADRAO)
+        except ValueError:
+            return jsonify({'error': 'Invalid limit'}), 400
+        limite = max(1, min(limite, LIMITE_BUSCA_MAXIMO))
+
+        indice = indice_clientes_atual()
+        if indice is None:
+            return jsonify({'error': 'Invalid client file structure in Google Sheet'}), 500
+
+        clientes, total = indice.buscar(request.args.get('q', ''), limite)
+        resposta = jsonify({'clientes': clientes, 'total': total, 'limite': limite})
+        resposta.cache_control.no_cache = True
+        resposta.add_etag()
+        return resposta.make_conditional(request)
+    except Exception as e:
+        app.logger.error(f"Error searching clients: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({'error': str(e), 'details': traceback.format_exc()}), 500
+
+@app.route('/referencia/invalidar', methods=['POST'])
+def invalidar_referencia():
+    """Descarta o cache das planilhas de catálogo e clientes (ex.: após editar o Google Sheets)."""
+    invalidar_dados_referencia(MAPEAMENTO_PRODUTOS_SHEET_URL, CLIENTES_SHEET_URL)
+    atualizador_referencia.atualizar_agora()
+    return jsonify({'status': 'ok'})
+
+@app.route('/referencia/status', methods=['GET'])
+def status_referencia():
+    """Idade dos dados de catálogo/clientes em uso e situação das atualizações em segundo plano."""
+    return jsonify(atualizador_referencia.status())
+
+def formato_saida_requisicao():
+    """Formato de saída pedido no campo 'formato' (formulário ou query string); padrão xlsx."""
+    return validar_formato_saida(request.form.get('formato') or request.args.get('formato') or FORMATO_SAIDA_PADRAO)
+
+def todas_abas_requisicao():
+    """Campo 'todas_abas' (formulário ou query string): converte os itens de todas as abas do .xlsx."""
+    valor = request.form.get('todas_abas') or request.args.get('todas_abas') or ''
+    return valor.strip().lower() in ('1', 'true', 'on', 'sim')
+
+def resposta_arquivo_em_blocos(arquivo, mimetype, nome_download):
+    """
+    Envia um arquivo temporário aberto em blocos, do início, com Content-Length.
+    O arquivo é fechado (e removido, se temporário) ao final da resposta.
+    """
+    arquivo.seek(0, os.SEEK_END)
+    tamanho = arquivo.tell()
+    arquivo.seek(0)
+    resposta = send_file(arquivo, mimetype=mimetype, as_attachment=True, download_name=nome_download)
+    resposta.content_length = tamanho
+    return resposta
+
 def remove_file_with_retry(file_path, max_retries=3, delay=1):
     """Remove um arquivo com tentativas múltiplas caso esteja em uso."""
     for attempt in range(max_retries):
@@ -157,95 +275,70 @@ def processar_arquivo():
             return jsonify({'error': 'Empty filename'}), 400
 
         if not file or not allowed_file(file.filename):
-            return jsonify({'error': 'Invalid file type. Use .xlsx'}), 400
+            return jsonify({'error': 'Invalid file type. Use .xlsx, .csv or .tsv'}), 400
+
+        try:
+            formato = formato_saida_requisicao()
+        except ValueError as e:
+            return jsonify({'error': 'Invalid output format', 'details': {'message': str(e)}}), 400
+        todas_abas = todas_abas_requisicao()
 
         # Create in-memory file
-        input_excel = io.BytesIO(file.read())
+        conteudo_orcamento = file.read()
+        input_excel = io.BytesIO(conteudo_orcamento)
         
         try:
-            df_convertido = converter_orcamento_para_olist(
+            dados_referencia = atualizador_referencia.dados()
+
+            # Mesmo orçamento, cliente, planilhas de referência e modelo: devolve o arquivo já gerado
+            chave_cache = None
+            if CACHE_RESULTADOS_HABILITADO:
+                chave_cache = chave_resultado(conteudo_orcamento, cliente_id_str, dados_referencia.versoes,
+                                              registro_modelos.versao(MODELO_SAIDA_OLIST_PATH), formato,
+                                              todas_abas)
+                entrada_cache = cache_resultados.obter(chave_cache)
+                if entrada_cache is not None:
+                    caminho_cache, metadados_cache = entrada_cache
+                    try:
+                        return send_file(
+                            caminho_cache,
+                            mimetype=MIMETYPES_SAIDA[formato],
+                            as_attachment=True,
+                            download_name=metadados_cache['arquivo_saida']
+                        )
+                    except FileNotFoundError:
+                        pass  # removido do cache por outro worker; converte de novo
+
+            resultado = converter_orcamento_para_olist_detalhado(
                 input_excel,
                 MAPEAMENTO_PRODUTOS_SHEET_URL, # Passa a URL do Google Sheet
                 CLIENTES_SHEET_URL, # Passa a URL do Google Sheet
                 cliente_id_str,
-                MODELO_SAIDA_OLIST_PATH
+                MODELO_SAIDA_OLIST_PATH,
+                dados_referencia=dados_referencia,
+                todas_abas=todas_abas
             )
+            df_convertido = resultado.df
 
             if df_convertido.empty:
                 return jsonify({'error': 'No data processed'}), 500
 
-            # Buscar nome do cliente para o nome do arquivo
-            from conversor_olist import get_dataframe_from_google_sheet
-            df_clientes = get_dataframe_from_google_sheet(CLIENTES_SHEET_URL, sheet_name='clientes')
-            nome_cliente = None
-            if 'ID' in df_clientes.columns and 'Nome' in df_clientes.columns:
-                info_cliente_df = df_clientes[df_clientes['ID'].astype(str) == str(cliente_id_str)]
-                if not info_cliente_df.empty:
-                    nome_cliente = info_cliente_df.iloc[0]['Nome']
-            if not nome_cliente:
-                nome_cliente = f"cliente_{cliente_id_str}"
-            # Sanitizar nome para arquivo e limitar a 100 caracteres
-            # Remover caracteres não permitidos em nomes de arquivos
-            import re
-            # Primeiro, normalizar caracteres acentuados para ASCII
-            import unicodedata
-            nome_cliente_norm = unicodedata.normalize('NFKD', str(nome_cliente)).encode('ASCII', 'ignore').decode('ASCII')
-            # Substituir caracteres não permitidos em nomes de arquivos por underscores
-            nome_cliente_sanit = re.sub(r'[\\/*?:"<>|]', '_', nome_cliente_norm)
-            # Substituir espaços por underscores
-            nome_cliente_sanit = nome_cliente_sanit.replace(' ', '_')
-            # Limitar o tamanho para garantir que o nome do arquivo final não ultrapasse 100 caracteres
-            max_cliente_len = 70  # Reservando espaço para "orcamento_convertido_olist_" e ".xlsx"
-            if len(nome_cliente_sanit) > max_cliente_len:
-                nome_cliente_sanit = nome_cliente_sanit[:max_cliente_len]
-            # Formato do nome do arquivo começando com o ID curto do cliente (CL998)
-            # para facilitar a identificação pelas atendentes
-            # Extrai o código curto do cliente (CL998) do nome do cliente se existir
-            import re
-            codigo_curto = None
-            # Tenta encontrar um padrão como CL998 no nome do cliente
-            match = re.search(r'\b(CL\d{3,4})\b', str(nome_cliente))
-            if match:
-                # Usa o código encontrado no nome do cliente
-                codigo_curto = match.group(1)
-                # Remove o código do nome sanitizado para evitar duplicação
-                nome_cliente_sanit = nome_cliente_sanit.replace(match.group(1), '').lstrip('-_').lstrip()
-            else:
-                # Se não encontrar no nome, usa o ID do cliente
-                # Verifica se o cliente_id_str já é um código curto (CL998)
-                if re.match(r'^CL\d{3,4}$', cliente_id_str):
-                    codigo_curto = cliente_id_str
-                else:
-                    # Adiciona o prefixo CL apenas se não existir
-                    codigo_curto = f"CL{cliente_id_str}" if not cliente_id_str.upper().startswith('CL') else cliente_id_str
-            
-            nome_arquivo = f"{codigo_curto}-{nome_cliente_sanit}_orcamento_convertido_olist.xlsx"
-
-            # Create output file in memory
-            output = io.BytesIO()
-            # Garantir que o Excel seja salvo com codificação UTF-8 para preservar caracteres especiais
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df_convertido.to_excel(writer, index=False, sheet_name='Sheet1')
-            output.seek(0)
-            
-            # Limitar o nome do arquivo a 100 caracteres para evitar problemas
-            if len(nome_arquivo) > 100:
-                nome_arquivo = nome_arquivo[:100-5] + '.xlsx'
-            
-            # Criar um nome de arquivo simples sem caracteres especiais para evitar problemas
-            # Substituir todos os caracteres acentuados por suas versões sem acento
-            import unicodedata
-            nome_arquivo_simples = unicodedata.normalize('NFKD', nome_arquivo).encode('ASCII', 'ignore').decode('ASCII')
+            # Nome do cliente já localizado pelo conversor (sem buscar a planilha de clientes de novo)
+            nome_arquivo_simples = nome_arquivo_saida(resultado.nome_cliente, cliente_id_str, formato)
+
+            # Arquivo de saída gravado linha a linha (em disco se ficar grande)
+            output = gerar_saida(df_convertido, formato)
+            if chave_cache:
+                cache_resultados.gravar(chave_cache, output, {
+                    'arquivo_saida': nome_arquivo_simples,
+                    'cliente_id': cliente_id_str,
+                    'linhas': len(df_convertido),
+                    'produtos_nao_mapeados': len(resultado.produtos_nao_mapeados),
+                    'versoes': dados_referencia.versoes,
+                })
             
             # Enviar o arquivo com o nome simplificado
-            response = send_file(
-                output,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                as_attachment=True,
-                download_name=nome_arquivo_simples
-            )
-            
-            return response
+            return resposta_arquivo_em_blocos(output, MIMETYPES_SAIDA[formato], nome_arquivo_simples)
 
         except Exception as e:
             app.logger.error(f"Error processing file: {str(e)}\n{traceback.format_exc()}")
@@ -267,6 +360,212 @@ def processar_arquivo():
             }
         }), 500
 
+@app.route('/preview', methods=['POST'])
+def previa_arquivo():
+    """
+    Prévia do orçamento (mesmo campo arquivo_excel de /processar), lendo só as primeiras linhas:
+    cabeçalho detectado, mapeamento das colunas, proposta/data, primeiras linhas de dados e
+    os primeiros itens buscados no catálogo. O campo 'linhas' define quantas linhas de dados (padrão: 10).
+    """
+    try:
+        if 'arquivo_excel' not in request.files:
+            return jsonify({'error': 'No Excel file uploaded'}), 400
+
+        file = request.files['arquivo_excel']
+        if file.filename == '':
+            return jsonify({'error': 'Empty filename'}), 400
+
+        if not file or not allowed_file(file.filename):
+            return jsonify({'error': 'Invalid file type. Use .xlsx, .csv or .tsv'}), 400
+
+        try:
+            linhas = int(request.form.get('linhas') or request.args.get('linhas') or LINHAS_DADOS_PREVIA)
+        except ValueError:
+            return jsonify({'error': 'Invalid number of rows'}), 400
+
+        # O upload fica em um arquivo temporário do werkzeug quando é grande; lido direto dele
+        arquivo = file.stream
+        if not arquivo.seekable():
+            arquivo = io.BytesIO(file.read())
+
+        previa = previsualizar_orcamento(arquivo, atualizador_referencia.dados().indice, linhas)
+        resposta = previa.para_json()
+        resposta['arquivo'] = file.filename
+        if previa.erro:
+            return jsonify({'error': 'Header not found', 'details': {'message': previa.erro}, **resposta}), 422
+        return jsonify(resposta)
+
+    except ValueError as e:
+        return jsonify({'error': 'Invalid budget file', 'details': {'message': str(e)}}), 400
+    except Exception as e:
+        app.logger.error(f"Error previewing file: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({
+            'error': 'Error previewing file',
+            'details': {
+                'message': str(e),
+                'traceback': traceback.format_exc()
+            }
+        }), 500
+
+@app.route('/processar/lote', methods=['POST'])
+def processar_lote_arquivos():
+    """
+    Converte vários orçamentos de uma vez.
+
+    Campos do formulário:
+        arquivos: um ou mais orçamentos (.xlsx, .csv ou .tsv) e/ou arquivos .zip com eles
+        clientes: JSON {nome do arquivo: ID do cliente} (opcional)
+        cliente_id: cliente dos arquivos que não estão em 'clientes' (opcional)
+
+    Retorna um ZIP com os arquivos convertidos e o manifest.json com a situação de cada orçamento.
+    """
+    try:
+        missing_files = check_required_files()
+        if missing_files:
+            return jsonify({
+                'error': 'Missing required files',
+                'details': {'missing': missing_files}
+            }), 500
+
+        arquivos = [
+            (file.filename, file.read())
+            for file in request.files.getlist('arquivos') + request.files.getlist('arquivo_excel')
+            if file and file.filename
+        ]
+        if not arquivos:
+            return jsonify({'error': 'No files uploaded'}), 400
+
+        try:
+            clientes_por_arquivo = json.loads(request.form.get('clientes') or '{}')
+        except ValueError:
+            return jsonify({'error': 'Invalid client mapping (expected JSON object)'}), 400
+        if not isinstance(clientes_por_arquivo, dict):
+            return jsonify({'error': 'Invalid client mapping (expected JSON object)'}), 400
+
+        try:
+            itens = extrair_itens_lote(arquivos, clientes_por_arquivo, request.form.get('cliente_id'))
+        except zipfile.BadZipFile:
+            return jsonify({'error': 'Invalid ZIP file'}), 400
+        except LoteMuitoGrande as e:
+            return jsonify({'error': 'Batch too large', 'details': {'message': str(e)}}), 413
+        if not itens:
+            return jsonify({'error': 'No budget files found. Use .xlsx/.csv/.tsv or a .zip with them'}), 400
+
+        try:
+            formato = formato_saida_requisicao()
+        except ValueError as e:
+            return jsonify({'error': 'Invalid output format', 'details': {'message': str(e)}}), 400
+
+        resultados = processar_lote(
+            itens,
+            MAPEAMENTO_PRODUTOS_SHEET_URL,
+            CLIENTES_SHEET_URL,
+            MODELO_SAIDA_OLIST_PATH,
+            atualizador_referencia.dados(),
+            formato=formato,
+            todas_abas=todas_abas_requisicao()
+        )
+        return send_file(
+            montar_zip_lote(resultados),
+            mimetype='application/zip',
+            as_attachment=True,
+            download_name='orcamentos_convertidos_olist.zip'
+        )
+
+    except Exception as e:
+        app.logger.error(f"Error processing batch: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({
+            'error': 'Error processing batch',
+            'details': {
+                'message': str(e),
+                'traceback': traceback.format_exc()
+            }
+        }), 500
+
+@app.route('/jobs', methods=['POST'])
+def criar_job():
+    """
+    Recebe um orçamento (mesmos campos de /processar) e agenda a conversão em segundo plano.
+
+    Retorna 202 com o ID do job; o andamento é consultado em GET /jobs/<id>.
+    """
+    try:
+        missing_files = check_required_files()
+        if missing_files:
+            return jsonify({
+                'error': 'Missing required files',
+                'details': {'missing': missing_files}
+            }), 500
+
+        if 'arquivo_excel' not in request.files:
+            return jsonify({'error': 'No Excel file uploaded'}), 400
+
+        file = request.files['arquivo_excel']
+        cliente_id_str = request.form.get('cliente_id')
+
+        if not cliente_id_str:
+            return jsonify({'error': 'No client ID provided'}), 400
+
+        if file.filename == '':
+            return jsonify({'error': 'Empty filename'}), 400
+
+        if not file or not allowed_file(file.filename):
+            return jsonify({'error': 'Invalid file type. Use .xlsx, .csv or .tsv'}), 400
+
+        try:
+            formato = formato_saida_requisicao()
+        except ValueError as e:
+            return jsonify({'error': 'Invalid output format', 'details': {'message': str(e)}}), 400
+
+        try:
+            status = gerenciador_jobs.submeter(file.filename, file.read(), cliente_id_str, formato,
+                                               todas_abas_requisicao())
+        except FilaJobsCheia as e:
+            return jsonify({'error': 'Too many pending jobs, try again later', 'details': {'message': str(e)}}), 429
+
+        return jsonify({
+            'job_id': status['id'],
+            'status': status['status'],
+            'status_url': f"/jobs/{status['id']}",
+        }), 202
+
+    except Exception as e:
+        app.logger.error(f"Error creating job: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({
+            'error': 'Error creating job',
+            'details': {
+                'message': str(e),
+                'traceback': traceback.format_exc()
+            }
+        }), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def consultar_job(job_id):
+    """Andamento do job; quando concluído, ?download=1 (ou /jobs/<id>/resultado) entrega o arquivo convertido."""
+    status = gerenciador_jobs.consultar(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if status['status'] == 'concluido':
+        status['download_url'] = f"/jobs/{job_id}/resultado"
+        if request.args.get('download') in ('1', 'true'):
+            return baixar_resultado_job(job_id)
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/resultado', methods=['GET'])
+def baixar_resultado_job(job_id):
+    status = gerenciador_jobs.consultar(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if status['status'] != 'concluido':
+        return jsonify({'error': 'Job not finished', 'status': status['status']}), 409
+    formato = status.get('formato', FORMATO_SAIDA_PADRAO)
+    return send_file(
+        armazem_jobs.caminho_resultado(job_id, formato),
+        mimetype=MIMETYPES_SAIDA[formato],
+        as_attachment=True,
+        download_name=status['arquivo_saida']
+    )
+
 # @app.route('/upload_mapeamento', methods=['POST'])
 # def upload_mapeamento():
 #     # Esta rota pode ser removida ou adaptada se o upload de arquivos locais não for mais necessário.
@@ -284,6 +583,13 @@ def internal_error(error):
         }
     }), 500
 
+@app.errorhandler(413)
+def request_too_large_error(error):
+    return jsonify({
+        'error': 'Request too large',
+        'details': {'message': f"Maximum upload size is {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)} MB"}
+    }), 413
+
 @app.errorhandler(404)
 def not_found_error(error):
     return jsonify({
@@ -293,14 +599,9 @@ def not_found_error(error):
 
 # Para desenvolvimento local
 if __name__ == '__main__':
-    import logging
     import tempfile
     log_file = os.path.join(tempfile.gettempdir(), 'flask_app.log')
-    logging.basicConfig(
-        filename=log_file,
-        level=logging.DEBUG,
-        format='%(asctime)s %(levelname)s: %(message)s'
-    )
+    configurar_logging(os.environ.get('OLIST_LOG_NIVEL', 'DEBUG'), arquivo=log_file)
     app.logger.info('Iniciando aplicação...')
     app.run(host='0.0.0.0', port=5000, debug=True)
 
@@ -0,0 +1,459 @@
+"""
+Métricas da aplicação (contadores, histogramas e medidores) no formato texto do Prometheus.
+
+Cada processo mantém suas métricas em memória e as grava periodicamente em um
+arquivo próprio (<pid>.json) no diretório OLIST_METRICAS_DIR. O endpoint /metrics
+soma os arquivos dos processos vivos, de modo que a resposta cobre todos os workers
+do gunicorn, qualquer que seja o worker que atender a coleta.
+
+Quando um worker termina, seus contadores e histogramas são somados ao arquivo
+mortos.json (como no modo multiprocesso do prometheus_client), para que os totais
+exportados nunca diminuam; só os medidores do processo encerrado são descartados.
+
+Uso:
+    CONVERSOES = registro_metricas.contador('olist_conversoes_total', 'Conversões', ('status',))
+    CONVERSOES.inc(status='ok')
+    with medir('gravacao_xlsx'):
+        ...
+"""
+import atexit
+import glob
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DIRETORIO_METRICAS_PADRAO = os.environ.get('OLIST_METRICAS_DIR') or os.path.join(tempfile.gettempdir(), 'conversor_olist', 'metricas')
+
+# Intervalo mínimo entre duas gravações do arquivo de métricas do processo
+INTERVALO_GRAVACAO_SEGUNDOS = 1.0
+
+# Arquivos de processos sem atualização há mais tempo que isso são tratados como de processos encerrados
+IDADE_MAXIMA_ARQUIVO_SEGUNDOS = 86400 * 7
+
+# Uma trava de incorporação mais antiga que isso é considerada abandonada
+TRAVA_EXPIRA_SEGUNDOS = 120
+
+BUCKETS_SEGUNDOS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _formatar_valor(valor):
+    if valor == math.inf:
+        return '+Inf'
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar_rotulos(nomes, valores, extra=None):
+    pares = list(zip(nomes, valores)) + (list(extra.items()) if extra else [])
+    if not pares:
+        return ''
+    texto = ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares)
+    return '{' + texto + '}'
+
+
+def _combinar_valores(metrica, listas):
+    """Combina as listas [[rótulos, valor], ...] de vários processos em {rótulos: valor}."""
+    combinados = {}
+    for valores in listas:
+        for chave, valor in valores:
+            chave = tuple(chave)
+            combinados[chave] = metrica.combinar(combinados[chave], valor) if chave in combinados else valor
+    return combinados
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, registro, nome, ajuda, rotulos=()):
+        self._registro = registro
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._trava = threading.Lock()
+
+    def _chave(self, rotulos):
+        if set(rotulos) != set(self.rotulos):
+            raise ValueError(f"Rótulos de {self.nome} devem ser {self.rotulos}, recebidos {tuple(rotulos)}")
+        return tuple(str(rotulos[nome]) for nome in self.rotulos)
+
+    def estado(self):
+        with self._trava:
+            return [[list(chave), valor] for chave, valor in self._valores.items()]
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._trava:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+        self._registro.alterado()
+
+    @staticmethod
+    def combinar(a, b):
+        return a + b
+
+    @staticmethod
+    def valor_exportado(valor):
+        return valor
+
+
+class Medidor(_Metrica):
+    """
+    Gauge. Entre processos os valores são combinados pelo máximo, ou pela soma com agregacao='soma'.
+    Com agregacao='idade' o valor definido é um instante (time.time()) e o exportado é a idade
+    do mais recente, calculada no momento da coleta.
+    """
+
+    tipo = 'gauge'
+
+    def __init__(self, registro, nome, ajuda, rotulos=(), agregacao='max'):
+        super().__init__(registro, nome, ajuda, rotulos)
+        self.agregacao = agregacao
+
+    def definir(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with self._trava:
+            self._valores[chave] = valor
+        self._registro.alterado()
+
+    def combinar(self, a, b):
+        return a + b if self.agregacao == 'soma' else max(a, b)
+
+    def valor_exportado(self, valor):
+        return time.time() - valor if self.agregacao == 'idade' else valor
+
+
+class Histograma(_Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, registro, nome, ajuda, rotulos=(), buckets=BUCKETS_SEGUNDOS_PADRAO):
+        super().__init__(registro, nome, ajuda, rotulos)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with self._trava:
+            # [contagem por bucket (não acumulada)..., contagem acima do maior bucket, soma]
+            dados = self._valores.get(chave)
+            if dados is None:
+                dados = self._valores[chave] = [0] * (len(self.buckets) + 1) + [0.0]
+            posicao = len(self.buckets)
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    posicao = i
+                    break
+            dados[posicao] += 1
+            dados[-1] += valor
+        self._registro.alterado()
+
+    @staticmethod
+    def combinar(a, b):
+        return [x + y for x, y in zip(a, b)]
+
+
+class RegistroMetricas:
+    """Métricas do processo e a agregação entre processos pelos arquivos no diretório de métricas."""
+
+    def __init__(self, diretorio=None):
+        self.diretorio = diretorio or DIRETORIO_METRICAS_PADRAO
+        self._metricas = {}
+        self._ultima_gravacao = 0.0
+        self._pendente = False
+        self._trava = threading.Lock()
+        # Desligada nos processos auxiliares do lote, cujas métricas são registradas pelo processo principal
+        self.gravacao_habilitada = True
+
+    def _registrar(self, metrica):
+        with self._trava:
+            existente = self._metricas.get(metrica.nome)
+            if existente is not None:
+                return existente
+            self._metricas[metrica.nome] = metrica
+            return metrica
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._registrar(Contador(self, nome, ajuda, rotulos))
+
+    def medidor(self, nome, ajuda, rotulos=(), agregacao='max'):
+        return self._registrar(Medidor(self, nome, ajuda, rotulos, agregacao))
+
+    def histograma(self, nome, ajuda, rotulos=(), buckets=BUCKETS_SEGUNDOS_PADRAO):
+        return self._registrar(Histograma(self, nome, ajuda, rotulos, buckets))
+
+    def _caminho_processo(self, pid=None):
+        return os.path.join(self.diretorio, f"{pid or os.getpid()}.json")
+
+    def alterado(self):
+        self._pendente = True
+        if time.monotonic() - self._ultima_gravacao >= INTERVALO_GRAVACAO_SEGUNDOS:
+            self.gravar()
+
+    def estado(self):
+        return {nome: metrica.estado() for nome, metrica in list(self._metricas.items())}
+
+    def gravar(self):
+        """Grava o arquivo de métricas deste processo (de forma atômica)."""
+        self._ultima_gravacao = time.monotonic()
+        self._pendente = False
+        if not self.gravacao_habilitada:
+            return
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            descritor, caminho_temporario = tempfile.mkstemp(dir=self.diretorio, suffix='.tmp')
+            with os.fdopen(descritor, 'w', encoding='utf-8') as arquivo:
+                json.dump({'pid': os.getpid(), 'metricas': self.estado()}, arquivo)
+            os.replace(caminho_temporario, self._caminho_processo())
+        except OSError as e:
+            logger.warning("Não foi possível gravar as métricas em %s: %s", self.diretorio, e)
+
+    def gravar_pendentes(self):
+        if self._pendente:
+            self.gravar()
+
+    @staticmethod
+    def _processo_vivo(pid):
+        if os.name == 'nt':
+            # os.kill no Windows encerra o processo; lá os arquivos são mantidos até expirarem
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _caminho_mortos(self):
+        return os.path.join(self.diretorio, 'mortos.json')
+
+    def _caminho_trava_mortos(self):
+        return os.path.join(self.diretorio, 'mortos.trava')
+
+    def _ler_mortos(self):
+        """Métricas acumuladas dos processos encerrados e a identificação (pid, mtime) dos arquivos já somados."""
+        try:
+            with open(self._caminho_mortos(), encoding='utf-8') as arquivo:
+                mortos = json.load(arquivo)
+            return mortos['metricas'], {tuple(item) for item in mortos['incorporados']}
+        except FileNotFoundError:
+            return {}, set()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Não foi possível ler as métricas dos processos encerrados: %s", e)
+            return {}, set()
+
+    def _adquirir_trava_mortos(self):
+        caminho_trava = self._caminho_trava_mortos()
+        for _ in range(2):
+            try:
+                os.close(os.open(caminho_trava, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                try:
+                    abandonada = time.time() - os.stat(caminho_trava).st_mtime > TRAVA_EXPIRA_SEGUNDOS
+                except FileNotFoundError:
+                    continue
+                if not abandonada:
+                    return False
+                self._liberar_trava_mortos()
+            except OSError:
+                return False
+        return False
+
+    def _liberar_trava_mortos(self):
+        try:
+            os.remove(self._caminho_trava_mortos())
+        except FileNotFoundError:
+            pass
+
+    def _incorporar_mortos(self, arquivos):
+        """
+        Soma contadores e histogramas dos processos encerrados ao mortos.json e remove seus arquivos.
+
+        Os medidores desses processos são descartados. Se outro processo estiver fazendo a
+        incorporação, nada é feito e os arquivos continuam sendo lidos até a próxima coleta.
+
+        Args:
+            arquivos: Lista de (pid, caminho, os.stat do arquivo) dos processos encerrados
+        """
+        if not self._adquirir_trava_mortos():
+            return
+        try:
+            metricas_mortos, incorporados = self._ler_mortos()
+            # Arquivos já removidos não precisam mais ser identificados
+            incorporados = {(pid, mtime) for pid, mtime in incorporados
+                            if os.path.exists(self._caminho_processo(pid))}
+            for pid, caminho, info in arquivos:
+                try:
+                    with open(caminho, encoding='utf-8') as arquivo:
+                        estado = json.load(arquivo)['metricas']
+                except FileNotFoundError:
+                    continue
+                except (OSError, ValueError, KeyError):
+                    estado = {}
+                for nome, valores in estado.items():
+                    metrica = self._metricas.get(nome)
+                    if metrica is None or metrica.tipo == 'gauge':
+                        continue
+                    combinados = _combinar_valores(metrica, [metricas_mortos.get(nome, []), valores])
+                    metricas_mortos[nome] = [[list(chave), valor] for chave, valor in combinados.items()]
+                incorporados.add((pid, info.st_mtime_ns))
+
+            descritor, caminho_temporario = tempfile.mkstemp(dir=self.diretorio, suffix='.tmp')
+            with os.fdopen(descritor, 'w', encoding='utf-8') as arquivo:
+                json.dump({'metricas': metricas_mortos, 'incorporados': sorted(incorporados)}, arquivo)
+            os.replace(caminho_temporario, self._caminho_mortos())
+            # Só depois de gravado o mortos.json: até aqui os arquivos continuam valendo
+            for _, caminho, _ in arquivos:
+                try:
+                    os.remove(caminho)
+                except OSError:
+                    pass
+        except OSError as e:
+            logger.warning("Não foi possível incorporar as métricas dos processos encerrados: %s", e)
+        finally:
+            self._liberar_trava_mortos()
+
+    def _estados_processos(self):
+        """
+        Estado deste processo (em memória), dos demais processos vivos (pelos arquivos)
+        e o acumulado dos processos encerrados (mortos.json).
+        """
+        encerrados = []
+        for caminho in glob.glob(os.path.join(self.diretorio, '*.json')):
+            try:
+                pid = int(os.path.splitext(os.path.basename(caminho))[0])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            try:
+                info = os.stat(caminho)
+            except OSError:
+                continue
+            if not self._processo_vivo(pid) or time.time() - info.st_mtime > IDADE_MAXIMA_ARQUIVO_SEGUNDOS:
+                encerrados.append((pid, caminho, info))
+        if encerrados:
+            self._incorporar_mortos(encerrados)
+
+        # Os arquivos são lidos antes do mortos.json: um arquivo incorporado por outro processo
+        # durante a coleta é reconhecido pela identificação e não é somado duas vezes
+        lidos = []
+        for caminho in glob.glob(os.path.join(self.diretorio, '*.json')):
+            try:
+                pid = int(os.path.splitext(os.path.basename(caminho))[0])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            try:
+                with open(caminho, encoding='utf-8') as arquivo:
+                    info = os.fstat(arquivo.fileno())
+                    lidos.append((pid, info.st_mtime_ns, json.load(arquivo)['metricas']))
+            except (OSError, ValueError, KeyError):
+                continue
+        metricas_mortos, incorporados = self._ler_mortos()
+        estados = [self.estado(), metricas_mortos]
+        estados.extend(estado for pid, mtime, estado in lidos if (pid, mtime) not in incorporados)
+        return estados
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus, somando todos os processos."""
+        self.gravar()
+        estados = self._estados_processos()
+        linhas = []
+        for nome, metrica in sorted(self._metricas.items()):
+            combinados = _combinar_valores(metrica, [estado.get(nome, []) for estado in estados])
+            linhas.append(f"# HELP {nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {nome} {metrica.tipo}")
+            for chave, valor in sorted(combinados.items()):
+                if metrica.tipo == 'histogram':
+                    acumulado = 0
+                    for limite, quantidade in zip(metrica.buckets + (math.inf,), valor[:-1]):
+                        acumulado += quantidade
+                        rotulos = _formatar_rotulos(metrica.rotulos, chave, {'le': _formatar_valor(limite)})
+                        linhas.append(f"{nome}_bucket{rotulos} {acumulado}")
+                    rotulos = _formatar_rotulos(metrica.rotulos, chave)
+                    linhas.append(f"{nome}_sum{rotulos} {_formatar_valor(valor[-1])}")
+                    linhas.append(f"{nome}_count{rotulos} {acumulado}")
+                else:
+                    valor = metrica.valor_exportado(valor)
+                    linhas.append(f"{nome}{_formatar_rotulos(metrica.rotulos, chave)} {_formatar_valor(valor)}")
+        return '\n'.join(linhas) + '\n'
+
+
+# Registro compartilhado pelo processo
+registro_metricas = RegistroMetricas()
+atexit.register(registro_metricas.gravar_pendentes)
+
+DURACAO_ETAPAS = registro_metricas.histograma(
+    'olist_etapa_duracao_segundos', 'Duração de cada etapa da conversão e da gravação da saída', ('etapa',))
+CONVERSOES = registro_metricas.contador('olist_conversoes_total', 'Conversões de orçamento por resultado', ('status',))
+LINHAS_CONVERTIDAS = registro_metricas.contador('olist_linhas_convertidas_total', 'Linhas geradas no formato Olist')
+PRODUTOS_NAO_MAPEADOS = registro_metricas.contador(
+    'olist_produtos_nao_mapeados_total', 'Itens de orçamento sem correspondência no catálogo')
+CACHE_PLANILHAS = registro_metricas.contador(
+    'olist_cache_planilhas_total', 'Acessos ao cache das planilhas de referência (hit, revalidada, download)', ('resultado',))
+ERROS_UPSTREAM = registro_metricas.contador(
+    'olist_erros_upstream_total', 'Falhas ao baixar as planilhas do Google Sheets', ('tipo',))
+CACHE_RESULTADOS = registro_metricas.contador(
+    'olist_cache_resultados_total', 'Consultas ao cache de arquivos convertidos (hit, miss)', ('resultado',))
+DURACAO_DOWNLOAD = registro_metricas.histograma(
+    'olist_download_planilha_segundos', 'Duração dos downloads de planilhas do Google Sheets')
+IDADE_DADOS_REFERENCIA = registro_metricas.medidor(
+    'olist_dados_referencia_idade_segundos', 'Idade da versão mais recente do catálogo/clientes em uso',
+    agregacao='idade')
+MEMORIA_DADOS_REFERENCIA = registro_metricas.medidor(
+    'olist_dados_referencia_memoria_bytes', 'Memória ocupada pelo catálogo, seus índices e os clientes (soma dos workers)',
+    ('parte',), agregacao='soma')
+FALHAS_ATUALIZACAO_REFERENCIA = registro_metricas.medidor(
+    'olist_atualizador_falhas_consecutivas', 'Falhas seguidas do atualizador dos dados de referência')
+DURACAO_REQUISICOES = registro_metricas.histograma(
+    'olist_http_requisicao_duracao_segundos', 'Duração das requisições HTTP por rota', ('rota', 'metodo', 'status'))
+
+
+@contextmanager
+def medir(etapa):
+    """Mede o bloco e registra a duração no histograma de etapas."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        DURACAO_ETAPAS.observar(time.perf_counter() - inicio, etapa=etapa)
+
+
+def registrar_conversao(resultado):
+    """Registra as métricas de uma conversão concluída (ver conversor_olist.ResultadoConversao)."""
+    sucesso = not resultado.erro and not resultado.df.empty
+    registrar_tempos_conversao(resultado.tempos, sucesso, len(resultado.df), len(resultado.produtos_nao_mapeados))
+
+
+def registrar_tempos_conversao(tempos, sucesso, linhas, produtos_nao_mapeados):
+    """
+    Registra as métricas de uma conversão a partir dos seus números.
+
+    Args:
+        tempos: Segundos por etapa (como ResultadoConversao.tempos)
+        sucesso: Se a conversão gerou linhas sem erro
+        linhas: Linhas geradas
+        produtos_nao_mapeados: Quantidade de itens sem correspondência no catálogo
+    """
+    for etapa, segundos in tempos.items():
+        DURACAO_ETAPAS.observar(segundos, etapa=etapa)
+    CONVERSOES.inc(status='ok' if sucesso else 'erro')
+    LINHAS_CONVERTIDAS.inc(linhas)
+    PRODUTOS_NAO_MAPEADOS.inc(produtos_nao_mapeados)
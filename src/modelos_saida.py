@@ -0,0 +1,84 @@
+"""
+Registro dos modelos (templates) de planilha de saída.
+
+O esquema de colunas de cada modelo é lido uma única vez e mantido em memória,
+indexado pelo caminho do arquivo + data de modificação + tamanho: o arquivo só é
+lido novamente quando muda em disco. Vários modelos podem ser registrados com
+nomes diferentes (ex.: 'olist' e, no futuro, outros marketplaces).
+"""
+import logging
+import os
+import threading
+
+import pandas as pd
+
+from leitores_xlsx import escolher_backend
+
+logger = logging.getLogger(__name__)
+
+
+class RegistroModelos:
+    """Modelos de saída registrados por nome, com cache do esquema de colunas."""
+
+    def __init__(self):
+        self._caminhos = {}
+        self._esquemas = {}
+        self._trava = threading.Lock()
+
+    def registrar(self, nome, caminho):
+        """Registra (ou substitui) o arquivo xlsx do modelo de saída com o nome informado."""
+        self._caminhos[nome] = caminho
+
+    def nomes(self):
+        return list(self._caminhos)
+
+    def resolver(self, nome_ou_caminho):
+        """Retorna o caminho do modelo registrado com esse nome, ou o próprio valor se for um caminho."""
+        return self._caminhos.get(nome_ou_caminho, nome_ou_caminho)
+
+    def modelos_ausentes(self):
+        """Nomes dos modelos registrados cujo arquivo não existe."""
+        return [nome for nome, caminho in self._caminhos.items() if not os.path.exists(caminho)]
+
+    @staticmethod
+    def _assinatura(caminho):
+        info = os.stat(caminho)
+        return (os.path.abspath(caminho), info.st_mtime_ns, info.st_size)
+
+    def versao(self, nome_ou_caminho):
+        """Identificador da versão do arquivo do modelo (muda quando o arquivo é alterado)."""
+        _, mtime_ns, tamanho = self._assinatura(self.resolver(nome_ou_caminho))
+        return f"{mtime_ns}-{tamanho}"
+
+    def colunas(self, nome_ou_caminho):
+        """
+        Retorna as colunas da primeira aba do modelo, lendo o arquivo apenas se ele mudou.
+
+        Args:
+            nome_ou_caminho: Nome registrado do modelo ou caminho do arquivo xlsx
+
+        Returns:
+            Lista com os nomes das colunas, na ordem do modelo
+        """
+        caminho = self.resolver(nome_ou_caminho)
+        assinatura = self._assinatura(caminho)
+        with self._trava:
+            esquema = self._esquemas.get(assinatura[0])
+            if esquema is not None and esquema[0] == assinatura:
+                return list(esquema[1])
+
+        logger.info("Lendo esquema do modelo de saída: %s", caminho)
+        with pd.ExcelFile(caminho, engine=escolher_backend().nome) as xls_modelo:
+            if not xls_modelo.sheet_names:
+                raise ValueError("O NOVO arquivo Excel modelo de saída não contém nenhuma aba.")
+            # Aba inteira: linhas mais largas que o cabeçalho geram colunas extras ('Unnamed: n')
+            colunas = pd.read_excel(xls_modelo, sheet_name=0).columns.tolist()
+            logger.debug("Lida a primeira aba do modelo de saída: %s", xls_modelo.sheet_names[0])
+
+        with self._trava:
+            self._esquemas[assinatura[0]] = (assinatura, colunas)
+        return list(colunas)
+
+
+# Registro compartilhado pelo processo
+registro_modelos = RegistroModelos()
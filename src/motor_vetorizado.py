@@ -0,0 +1,148 @@
+"""
+Motor colunar de conversão dos itens do orçamento.
+
+Produz exatamente as mesmas linhas que o laço original com iterrows
+(conversor_olist._processar_itens_iterativo), mas filtra as linhas de total/vazias
+com operações de string vetorizadas e resolve os produtos com junções contra o
+índice do catálogo (primeiro por SKU, depois por MODELO).
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+from normalizacao import normalizar_serie
+
+logger = logging.getLogger(__name__)
+
+PALAVRAS_TOTAL = ['total', 'subtotal', 'valor total', 'total geral', 'soma', 'sum']
+_PADRAO_TOTAL = '|'.join(PALAVRAS_TOTAL)
+
+# Colunas padronizadas lidas pelo motor (ver mapear_colunas_orcamento)
+_COLUNAS_USADAS = ('produto', 'sku', 'quantidade', 'valor unitário', 'valor')
+
+
+def suporta_motor_vetorizado(df_orcamento_itens):
+    """
+    Indica se o orçamento pode passar pelo motor vetorizado.
+
+    Colunas padronizadas repetidas (ex.: duas colunas mapeadas para 'produto') ficam com
+    o motor iterativo, que preserva o comportamento original nesses casos.
+    """
+    colunas = [col for col in df_orcamento_itens.columns if col in _COLUNAS_USADAS]
+    return len(colunas) == len(set(colunas))
+
+
+def _coluna_como_objetos(df, coluna, dtype_linhas):
+    """Valores da coluna como o iterrows os entregaria, com ausentes convertidos para pd.NA."""
+    serie = df[coluna]
+    if dtype_linhas != object:
+        # iterrows converte as linhas para o dtype comum quando todas as colunas são numéricas
+        serie = serie.astype(dtype_linhas)
+    serie = serie.astype(object)
+    return serie.where(serie.notna(), pd.NA)
+
+
+def processar_itens_vetorizado(df_orcamento_itens, indice_catalogo, colunas_modelo_olist, campos_cabecalho):
+    """
+    Converte os itens do orçamento de forma colunar.
+
+    Args:
+        df_orcamento_itens: DataFrame com os itens do orçamento (colunas já padronizadas)
+        indice_catalogo: CatalogIndex do catálogo de produtos
+        colunas_modelo_olist: Colunas do modelo de saída Olist, na ordem do modelo
+        campos_cabecalho: Valores repetidos em todas as linhas (proposta, data, contato)
+
+    Returns:
+        Tupla (DataFrame de saída, lista de produtos não mapeados)
+    """
+    if 'produto' not in df_orcamento_itens.columns:
+        # Sem coluna de produto todas as linhas são descartadas, como no motor iterativo
+        return pd.DataFrame(), []
+
+    dtype_linhas = df_orcamento_itens.iloc[:0].to_numpy().dtype
+    produto = _coluna_como_objetos(df_orcamento_itens, 'produto', dtype_linhas)
+
+    # FILTRAR LINHAS DE TOTAL/SUBTOTAL E LINHAS SEM PRODUTO REAL
+    presente = produto.notna()
+    produto_str = produto.where(presente, "").map(str)
+    linha_total = presente & produto_str.str.lower().str.contains(_PADRAO_TOTAL, regex=True)
+    linha_vazia = ~presente | (produto_str.str.strip() == '')
+    manter = (~linha_total & ~linha_vazia).to_numpy()
+
+    if linha_total.any() or linha_vazia.any():
+        logger.info("Linhas ignoradas: %d de total, %d sem produto.",
+                    int(linha_total.sum()), int((linha_vazia & ~linha_total).sum()))
+
+    itens = df_orcamento_itens[manter]
+    total_itens = len(itens)
+    if total_itens == 0:
+        return pd.DataFrame(), []
+
+    produto = produto[manter]
+    produto_normalizado = normalizar_serie(produto)
+
+    if 'sku' in itens.columns:
+        sku = _coluna_como_objetos(itens, 'sku', dtype_linhas)
+        sku_normalizado = normalizar_serie(sku)
+        # Mesma regra do caminho iterativo: SKU presente, verdadeiro e não vazio após normalizar
+        sku_verdadeiro = sku.map(lambda valor: bool(pd.notna(valor) and valor)).astype(bool)
+        usa_sku = (sku_verdadeiro & (sku_normalizado != '')).to_numpy()
+    else:
+        sku = pd.Series(pd.NA, index=itens.index, dtype=object)
+        sku_normalizado = pd.Series('', index=itens.index, dtype=object)
+        usa_sku = np.zeros(total_itens, dtype=bool)
+
+    # Junção pelo SKU e, para o que faltar, pelo MODELO
+    posicao_sku = indice_catalogo.posicoes('sku', sku_normalizado.where(usa_sku, '').to_numpy())
+    posicao_sku[~usa_sku] = -1
+    posicao_modelo = indice_catalogo.posicoes('modelo', produto_normalizado.to_numpy())
+    posicao_modelo[(produto_normalizado == '').to_numpy()] = -1
+
+    achou_sku = posicao_sku >= 0
+    achou_modelo = ~achou_sku & (posicao_modelo >= 0)
+
+    ids_produto = np.full(total_itens, pd.NA, dtype=object)
+    descricoes = np.full(total_itens, pd.NA, dtype=object)
+    for achou, posicao in ((achou_sku, posicao_sku), (achou_modelo, posicao_modelo)):
+        if achou.any():
+            ids_produto[achou], descricoes[achou] = indice_catalogo.produtos(posicao[achou])
+
+    # Log de produtos não mapeados, na ordem das linhas do orçamento
+    produtos_nao_mapeados_log = []
+    nao_mapeado = ~(achou_sku | achou_modelo) & (produto_normalizado != '').to_numpy()
+    for i in np.flatnonzero(nao_mapeado):
+        if usa_sku[i]:
+            produtos_nao_mapeados_log.append(
+                f"'{sku_normalizado.iat[i]}' (SKU Original: '{sku.iat[i]}')"
+            )
+        else:
+            produtos_nao_mapeados_log.append(
+                f"'{produto_normalizado.iat[i]}' (Original: '{produto.iat[i]}')"
+            )
+
+    vazia = np.full(total_itens, pd.NA, dtype=object)
+    if 'quantidade' in itens.columns:
+        quantidades = _coluna_como_objetos(itens, 'quantidade', dtype_linhas).to_numpy()
+    else:
+        quantidades = vazia
+    if 'valor unitário' in itens.columns:
+        valores = _coluna_como_objetos(itens, 'valor unitário', dtype_linhas).to_numpy()
+    elif 'valor' in itens.columns:
+        valores = _coluna_como_objetos(itens, 'valor', dtype_linhas).to_numpy()
+    else:
+        valores = vazia
+
+    colunas_convertidas = {
+        **{campo: np.full(total_itens, valor, dtype=object) for campo, valor in campos_cabecalho.items()},
+        'ID produto': ids_produto,
+        'Descrição': descricoes,
+        'Quantidade': quantidades,
+        'Valor unitário': valores,
+    }
+    df_saida = pd.DataFrame(
+        {col: colunas_convertidas.get(col, vazia) for col in colunas_modelo_olist},
+        columns=colunas_modelo_olist
+    )
+    # Mesma inferência de tipos que o DataFrame montado a partir da lista de dicionários
+    return df_saida.infer_objects(), produtos_nao_mapeados_log
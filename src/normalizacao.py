@@ -0,0 +1,27 @@
+import re # Para normalização
+import unicodedata
+
+import pandas as pd
+
+
+def normalizar_texto(texto):
+    if pd.isna(texto):
+        return ""
+    texto_str = str(texto).lower().strip()
+    # Remover múltiplos espaços
+    texto_str = re.sub(r'\s+', ' ', texto_str)
+    return texto_str
+
+
+def normalizar_serie(serie):
+    """Versão vetorizada de normalizar_texto para uma Series inteira (valores ausentes viram "")."""
+    presentes = serie.notna()
+    texto = serie.astype(object).where(presentes, "").map(str)
+    texto = texto.str.lower().str.strip().str.replace(r'\s+', ' ', regex=True)
+    return texto.where(presentes, "")
+
+
+def normalizar_busca(texto):
+    """normalizar_texto sem acentos, para buscas digitadas ('joao' encontra 'João')."""
+    decomposto = unicodedata.normalize('NFKD', normalizar_texto(texto))
+    return ''.join(caractere for caractere in decomposto if not unicodedata.combining(caractere))
@@ -0,0 +1,162 @@
+"""
+Perfis de layout dos orçamentos dos fornecedores, persistidos em SQLite.
+
+A maior parte dos orçamentos vem de poucos fornecedores, cada um com um layout fixo.
+Na primeira conversão de um layout guardamos a linha do cabeçalho, o mapeamento das
+colunas (por posição) e a posição das células de metadados (proposta, data); nas
+seguintes a conversão pula a busca do cabeçalho e o mapeamento das colunas.
+
+A impressão digital do layout é o hash das células das linhas até o cabeçalho
+(inclusive), normalizadas como na busca do cabeçalho e com as sequências de dígitos
+trocadas por '#': números de proposta, datas e valores mudam de um orçamento para o
+outro sem mudar o layout. Como as palavras-chave procuradas não têm dígitos, duas
+prévias com a mesma impressão levam ao mesmo cabeçalho, mapeamento e metadados.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+
+from normalizacao import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+PERFIS_LAYOUT_HABILITADO = os.environ.get('OLIST_PERFIS_LAYOUT', '1') != '0'
+CAMINHO_BANCO_PERFIS_PADRAO = (os.environ.get('OLIST_PERFIS_LAYOUT_DB')
+                               or os.path.join(tempfile.gettempdir(), 'conversor_olist', 'perfis_layout.sqlite3'))
+
+# Perfis mantidos no banco (os usados há mais tempo são removidos)
+MAX_PERFIS = 5000
+
+# O uso de um perfil é registrado no máximo uma vez nesse intervalo, para não gravar no banco a cada conversão
+INTERVALO_REGISTRO_USO_SEGUNDOS = 3600
+
+# Aumentar quando a busca do cabeçalho, o mapeamento das colunas ou a extração dos metadados mudarem
+VERSAO_PERFIS = 1
+
+_DIGITOS = re.compile(r'\d+')
+
+
+@dataclass
+class PerfilLayout:
+    linha_cabecalho: int
+    mapeamento_colunas: list  # [[posição da coluna, nome padronizado], ...]
+    posicoes_metadados: list  # [[linha, coluna], ...] das células com rótulos de proposta/data
+
+
+def _token_celula(valor):
+    return _DIGITOS.sub('#', normalizar_texto(valor))
+
+
+def impressoes_candidatas(valores_previa):
+    """
+    Impressão digital do layout para cada possível linha de cabeçalho da prévia.
+
+    Args:
+        valores_previa: Linhas da prévia do orçamento (df_previa.to_numpy())
+
+    Returns:
+        Lista de impressões; a posição i corresponde ao cabeçalho na linha i
+    """
+    hash_layout = hashlib.sha1(f"v{VERSAO_PERFIS}".encode('utf-8'))
+    impressoes = []
+    for i, linha in enumerate(valores_previa):
+        hash_layout.update(('\x1e' + '\x1f'.join(_token_celula(valor) for valor in linha)).encode('utf-8'))
+        impressoes.append(hash_layout.copy().hexdigest() + f"-{i}")
+    return impressoes
+
+
+class RepositorioPerfis:
+    """
+    Uso:
+        repositorio = RepositorioPerfis()
+        linha, perfil = repositorio.buscar(impressoes)   # (None, None) se o layout é novo
+        repositorio.salvar(impressoes[linha], perfil)
+    """
+
+    def __init__(self, caminho=None, max_perfis=MAX_PERFIS):
+        self.caminho = caminho or CAMINHO_BANCO_PERFIS_PADRAO
+        self.max_perfis = max_perfis
+        self._local = threading.local()
+
+    def _conexao(self):
+        # Uma conexão por thread (e por processo, após fork)
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is not None and self._local.pid == os.getpid():
+            return conexao
+        os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+        conexao = sqlite3.connect(self.caminho, timeout=5)
+        conexao.execute('PRAGMA journal_mode=WAL')
+        conexao.execute(
+            'CREATE TABLE IF NOT EXISTS perfis ('
+            ' impressao TEXT PRIMARY KEY,'
+            ' linha_cabecalho INTEGER NOT NULL,'
+            ' mapeamento_colunas TEXT NOT NULL,'
+            ' posicoes_metadados TEXT NOT NULL,'
+            ' atualizado_em REAL NOT NULL)'
+        )
+        self._local.conexao = conexao
+        self._local.pid = os.getpid()
+        return conexao
+
+    def buscar(self, impressoes):
+        """
+        Procura um perfil para as impressões candidatas (a de menor linha de cabeçalho vence).
+
+        Returns:
+            Tupla (linha do cabeçalho, PerfilLayout), ou (None, None) se não houver perfil
+        """
+        if not impressoes:
+            return None, None
+        linhas = []
+        try:
+            marcadores = ','.join('?' * len(impressoes))
+            conexao = self._conexao()
+            linhas = conexao.execute(
+                f'SELECT impressao, linha_cabecalho, mapeamento_colunas, posicoes_metadados, atualizado_em '
+                f'FROM perfis WHERE impressao IN ({marcadores}) ORDER BY linha_cabecalho LIMIT 1',
+                impressoes
+            ).fetchall()
+            if linhas:
+                impressao, atualizado_em = linhas[0][0], linhas[0][4]
+                agora = time.time()
+                if agora - atualizado_em >= INTERVALO_REGISTRO_USO_SEGUNDOS:
+                    # Os perfis usados há mais tempo são os removidos em salvar()
+                    with conexao:
+                        conexao.execute('UPDATE perfis SET atualizado_em=? WHERE impressao=?', (agora, impressao))
+        except sqlite3.Error as e:
+            # Se só o registro do uso falhou, o perfil encontrado ainda vale
+            logger.warning("Não foi possível consultar os perfis de layout (%s): %s", self.caminho, e)
+        if not linhas:
+            return None, None
+        _, linha_cabecalho, mapeamento, posicoes, _ = linhas[0]
+        return linha_cabecalho, PerfilLayout(linha_cabecalho, json.loads(mapeamento), json.loads(posicoes))
+
+    def salvar(self, impressao, perfil):
+        try:
+            conexao = self._conexao()
+            with conexao:
+                conexao.execute(
+                    'INSERT OR REPLACE INTO perfis VALUES (?, ?, ?, ?, ?)',
+                    (impressao, perfil.linha_cabecalho, json.dumps(perfil.mapeamento_colunas),
+                     json.dumps(perfil.posicoes_metadados), time.time())
+                )
+                total = conexao.execute('SELECT COUNT(*) FROM perfis').fetchone()[0]
+                if total > self.max_perfis:
+                    conexao.execute(
+                        'DELETE FROM perfis WHERE impressao IN '
+                        '(SELECT impressao FROM perfis ORDER BY atualizado_em LIMIT ?)',
+                        (total - self.max_perfis,)
+                    )
+        except sqlite3.Error as e:
+            logger.warning("Não foi possível gravar o perfil de layout (%s): %s", self.caminho, e)
+
+
+# Repositório compartilhado pelo processo
+repositorio_perfis = RepositorioPerfis()
@@ -0,0 +1,147 @@
+"""
+Prévia rápida de um orçamento, para conferir o arquivo antes da conversão.
+
+Lê só o início da aba (as linhas da busca do cabeçalho e algumas linhas de dados), com o
+leitor sob demanda de leitores_xlsx, e aplica a mesma detecção de cabeçalho, mapeamento
+de colunas e extração de proposta/data da conversão. Os primeiros itens são buscados no
+índice do catálogo, para o usuário ver se os produtos serão reconhecidos. Nada é gravado:
+nem perfis de layout, nem métricas de conversão.
+"""
+import datetime
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from conversor_olist import (extrair_metadados_orcamento, localizar_cabecalho, mapeamento_colunas_layout,
+                             mapear_colunas_orcamento)
+from leitor_orcamento import LINHAS_PREVIA, LeitorOrcamento
+
+logger = logging.getLogger(__name__)
+
+# Linhas de dados (após o cabeçalho) devolvidas por padrão e no máximo
+LINHAS_DADOS_PREVIA = 10
+MAX_LINHAS_DADOS_PREVIA = 100
+
+# Backend xlsx da prévia: lê só as linhas pedidas (ver leitores_xlsx.LeitorXlsxSobDemanda)
+BACKEND_PREVIA = 'sob_demanda'
+
+
+def _valor_json(valor):
+    """Valor de célula em um tipo serializável em JSON (datas em ISO 8601, vazios como None)."""
+    if valor is None or valor is pd.NA or valor is pd.NaT:
+        return None
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+    if isinstance(valor, float) and np.isnan(valor):
+        return None
+    if isinstance(valor, (datetime.date, datetime.time)):
+        return valor.isoformat()
+    if isinstance(valor, (pd.Timedelta, datetime.timedelta)):
+        return str(valor)
+    return valor
+
+
+@dataclass
+class PreviaOrcamento:
+    """Resultado da prévia: o que a conversão vai encontrar no início do orçamento."""
+    linha_cabecalho: Optional[int] = None
+    colunas: list = field(default_factory=list)
+    mapeamento_colunas: dict = field(default_factory=dict)  # coluna do orçamento -> nome padronizado
+    layout_conhecido: bool = False
+    numero_proposta: Optional[str] = None
+    data_proposta: Optional[pd.Timestamp] = None
+    linhas: list = field(default_factory=list)  # primeiras linhas de dados, {coluna: valor}
+    correspondencias: list = field(default_factory=list)  # primeiros itens e o produto do catálogo
+    tempo: float = 0.0
+    erro: Optional[str] = None
+
+    def para_json(self):
+        return {
+            'linha_cabecalho': self.linha_cabecalho,
+            'colunas': self.colunas,
+            'mapeamento_colunas': self.mapeamento_colunas,
+            'layout_conhecido': self.layout_conhecido,
+            'numero_proposta': self.numero_proposta,
+            'data_proposta': _valor_json(self.data_proposta),
+            'linhas': self.linhas,
+            'correspondencias': self.correspondencias,
+            'tempo_ms': round(self.tempo * 1000, 1),
+            'erro': self.erro,
+        }
+
+
+def _correspondencias(df_mapeado, indice_catalogo, limite):
+    """Busca no catálogo os primeiros itens com produto ou SKU (mesma regra da conversão)."""
+    colunas_item = [coluna for coluna in ('produto', 'sku') if coluna in df_mapeado.columns]
+    if not colunas_item or indice_catalogo is None:
+        return []
+    correspondencias = []
+    for _, item in df_mapeado.dropna(subset=colunas_item, how='all').head(limite).iterrows():
+        produto = item.get('produto')
+        sku = item.get('sku')
+        encontrado = indice_catalogo.lookup(sku, produto)
+        correspondencias.append({
+            'produto': _valor_json(produto),
+            'sku': _valor_json(sku),
+            'encontrado': encontrado is not None,
+            'id_produto': _valor_json(encontrado[0]) if encontrado else None,
+            'descricao': _valor_json(encontrado[1]) if encontrado else None,
+        })
+    return correspondencias
+
+
+def previsualizar_orcamento(arquivo_orcamento, indice_catalogo=None, linhas=LINHAS_DADOS_PREVIA, aba=0):
+    """
+    Prévia do orçamento a partir das primeiras linhas da aba.
+
+    Args:
+        arquivo_orcamento: Caminho do arquivo ou objeto BytesIO contendo o orçamento (.xlsx ou CSV/TSV)
+        indice_catalogo: CatalogIndex para a amostra de correspondências (sem ele, a amostra fica vazia)
+        linhas: Linhas de dados devolvidas e buscadas no catálogo (até MAX_LINHAS_DADOS_PREVIA)
+        aba: Índice ou nome da aba
+
+    Returns:
+        PreviaOrcamento (com a mensagem em `erro` se o cabeçalho não for encontrado)
+    """
+    inicio = time.perf_counter()
+    linhas = max(1, min(int(linhas), MAX_LINHAS_DADOS_PREVIA))
+    previa = PreviaOrcamento()
+
+    # Cabeçalho até a linha LINHAS_PREVIA, seguido das linhas de dados pedidas
+    leitor = LeitorOrcamento(arquivo_orcamento, aba=aba, backend=BACKEND_PREVIA, max_linhas=LINHAS_PREVIA + 1 + linhas)
+    try:
+        df_previa = leitor.previa()
+        linha_cabecalho, perfil_layout, _ = localizar_cabecalho(df_previa)
+        if linha_cabecalho is None:
+            previa.erro = "Não foi possível identificar o cabeçalho do orçamento. Verifique se o arquivo contém as colunas necessárias."
+            previa.tempo = time.perf_counter() - inicio
+            return previa
+        df_orcamento = leitor.ler_dataframe(linha_cabecalho).head(linhas)
+    finally:
+        leitor.fechar()
+
+    mapeamento_colunas = mapeamento_colunas_layout(df_orcamento.columns, perfil_layout)
+    df_mapeado = mapear_colunas_orcamento(df_orcamento, mapeamento_colunas)
+    numero_proposta, data_proposta, _ = extrair_metadados_orcamento(
+        df_previa, linha_cabecalho, perfil_layout.posicoes_metadados if perfil_layout else None
+    )
+
+    previa.linha_cabecalho = int(linha_cabecalho)
+    previa.colunas = [str(coluna) for coluna in df_orcamento.columns]
+    previa.mapeamento_colunas = {str(coluna): nome for coluna, nome in mapeamento_colunas.items()}
+    previa.layout_conhecido = perfil_layout is not None
+    previa.numero_proposta = numero_proposta
+    previa.data_proposta = data_proposta
+    previa.linhas = [
+        {str(coluna): _valor_json(valor) for coluna, valor in zip(df_orcamento.columns, linha)}
+        for linha in df_orcamento.itertuples(index=False, name=None)
+    ]
+    previa.correspondencias = _correspondencias(df_mapeado, indice_catalogo, linhas)
+    previa.tempo = time.perf_counter() - inicio
+    logger.debug("Prévia do orçamento: cabeçalho na linha %d, %d coluna(s) mapeada(s), %.1f ms",
+                 previa.linha_cabecalho, len(mapeamento_colunas), previa.tempo * 1000)
+    return previa
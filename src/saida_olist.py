@@ -0,0 +1,331 @@
+"""
+Geração do arquivo de saída no formato Olist: nome do arquivo e planilha .xlsx
+(padrão) ou, para consumidores automáticos, CSV, JSON ou Parquet com as mesmas
+colunas, na ordem do modelo de saída.
+
+Compartilhado pela conversão individual (/processar), pelos jobs e pela conversão em lote.
+
+A planilha é gravada linha a linha, em blocos do DataFrame, sem montar o modelo de
+objetos inteiro em memória: com o xlsxwriter (constant_memory) quando instalado e,
+senão, com o openpyxl em modo write-only. O arquivo gerado fica em memória até
+LIMITE_SAIDA_EM_MEMORIA_BYTES e passa para um temporário em disco acima disso.
+"""
+import csv
+import datetime
+import importlib.util
+import io
+import os
+import re
+import tempfile
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from metricas import medir
+
+MIMETYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+FORMATO_SAIDA_PADRAO = 'xlsx'
+
+# Tipo de conteúdo de cada formato de saída (a extensão do arquivo é o próprio nome do formato)
+MIMETYPES_SAIDA = {
+    'xlsx': MIMETYPE_XLSX,
+    'csv': 'text/csv',
+    'json': 'application/json',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# CSV como nas planilhas de importação do Olist: ';' entre colunas, vírgula decimal e datas dd/mm/aaaa
+SEPARADOR_CSV = ';'
+SEPARADOR_DECIMAL_CSV = ','
+FORMATO_DATA_CSV = '%d/%m/%Y'
+FORMATO_DATA_HORA_CSV = '%d/%m/%Y %H:%M:%S'
+
+NOME_ABA_SAIDA = 'Sheet1'
+
+# Tamanho a partir do qual o arquivo gerado vai para disco (OLIST_SAIDA_MEMORIA_MB)
+LIMITE_SAIDA_EM_MEMORIA_BYTES = int(float(os.environ.get('OLIST_SAIDA_MEMORIA_MB', '8')) * 1024 * 1024)
+
+# Linhas do DataFrame convertidas para valores de célula de cada vez
+LINHAS_POR_BLOCO = 2000
+
+# Formatos usados pelo pandas no to_excel, mantidos para a saída não mudar de aparência
+FORMATO_DATA_HORA = 'YYYY-MM-DD HH:MM:SS'
+FORMATO_DATA = 'YYYY-MM-DD'
+
+# Tamanho máximo do nome do arquivo gerado
+TAMANHO_MAXIMO_NOME_ARQUIVO = 100
+
+
+def nome_arquivo_saida(nome_cliente, cliente_id_str, formato=FORMATO_SAIDA_PADRAO):
+    """
+    Monta o nome do arquivo convertido, começando pelo código curto do cliente (ex.: CL998)
+    para facilitar a identificação pelas atendentes.
+
+    Args:
+        nome_cliente: Nome do cliente na planilha de clientes (ou None se não encontrado)
+        cliente_id_str: ID do cliente informado na requisição
+        formato: Formato de saída (define a extensão)
+
+    Returns:
+        Nome do arquivo, só com caracteres ASCII e no máximo 100 caracteres
+    """
+    cliente_id_str = str(cliente_id_str)
+    if not nome_cliente:
+        nome_cliente = f"cliente_{cliente_id_str}"
+    # Sanitizar nome para arquivo e limitar a 100 caracteres
+    # Primeiro, normalizar caracteres acentuados para ASCII
+    nome_cliente_norm = unicodedata.normalize('NFKD', str(nome_cliente)).encode('ASCII', 'ignore').decode('ASCII')
+    # Substituir caracteres não permitidos em nomes de arquivos por underscores
+    nome_cliente_sanit = re.sub(r'[\\/*?:"<>|]', '_', nome_cliente_norm)
+    # Substituir espaços por underscores
+    nome_cliente_sanit = nome_cliente_sanit.replace(' ', '_')
+    # Limitar o tamanho para garantir que o nome do arquivo final não ultrapasse 100 caracteres
+    max_cliente_len = 70  # Reservando espaço para "orcamento_convertido_olist_" e ".xlsx"
+    if len(nome_cliente_sanit) > max_cliente_len:
+        nome_cliente_sanit = nome_cliente_sanit[:max_cliente_len]
+
+    # Tenta encontrar um padrão como CL998 no nome do cliente
+    match = re.search(r'\b(CL\d{3,4})\b', str(nome_cliente))
+    if match:
+        # Usa o código encontrado no nome do cliente
+        codigo_curto = match.group(1)
+        # Remove o código do nome sanitizado para evitar duplicação
+        nome_cliente_sanit = nome_cliente_sanit.replace(match.group(1), '').lstrip('-_').lstrip()
+    elif re.match(r'^CL\d{3,4}$', cliente_id_str):
+        # O próprio ID já é um código curto (CL998)
+        codigo_curto = cliente_id_str
+    else:
+        # Adiciona o prefixo CL apenas se não existir
+        codigo_curto = f"CL{cliente_id_str}" if not cliente_id_str.upper().startswith('CL') else cliente_id_str
+
+    extensao = f".{formato}"
+    nome_arquivo = f"{codigo_curto}-{nome_cliente_sanit}_orcamento_convertido_olist{extensao}"
+
+    # Limitar o nome do arquivo a 100 caracteres para evitar problemas
+    if len(nome_arquivo) > TAMANHO_MAXIMO_NOME_ARQUIVO:
+        nome_arquivo = nome_arquivo[:TAMANHO_MAXIMO_NOME_ARQUIVO - len(extensao)] + extensao
+
+    # Nome simples, sem caracteres acentuados
+    return unicodedata.normalize('NFKD', nome_arquivo).encode('ASCII', 'ignore').decode('ASCII')
+
+
+def _escritor_padrao():
+    escolhido = os.environ.get('OLIST_ESCRITOR_XLSX', '').strip().lower()
+    if escolhido:
+        return escolhido
+    try:
+        import xlsxwriter  # noqa: F401
+    except ImportError:
+        return 'openpyxl'
+    return 'xlsxwriter'
+
+
+# 'xlsxwriter' ou 'openpyxl' (OLIST_ESCRITOR_XLSX força um deles)
+ESCRITOR_XLSX = _escritor_padrao()
+
+
+def _valor_celula(valor):
+    """Valor do DataFrame como a célula deve recebê-lo (ausentes viram célula vazia)."""
+    if valor is None or valor is pd.NA or valor is pd.NaT:
+        return None
+    if isinstance(valor, float) and valor != valor:
+        return None
+    if isinstance(valor, pd.Timestamp):
+        return valor.to_pydatetime()
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+        return None if isinstance(valor, float) and valor != valor else valor
+    return valor
+
+
+def _linhas(df):
+    """Linhas do DataFrame como listas de valores de célula, convertidas um bloco por vez."""
+    for inicio in range(0, len(df), LINHAS_POR_BLOCO):
+        bloco = df.iloc[inicio:inicio + LINHAS_POR_BLOCO]
+        colunas = [[_valor_celula(valor) for valor in bloco.iloc[:, i].tolist()] for i in range(bloco.shape[1])]
+        yield from zip(*colunas)
+
+
+def _gravar_openpyxl(df, destino):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    workbook = Workbook(write_only=True)
+    planilha = workbook.create_sheet(NOME_ABA_SAIDA)
+
+    # Cabeçalho do modelo, com o mesmo estilo do to_excel do pandas
+    fino = Side(style='thin')
+    cabecalho = []
+    for coluna in df.columns:
+        celula = WriteOnlyCell(planilha, value=str(coluna))
+        celula.font = Font(bold=True)
+        celula.border = Border(left=fino, right=fino, top=fino, bottom=fino)
+        celula.alignment = Alignment(horizontal='center', vertical='top')
+        cabecalho.append(celula)
+    planilha.append(cabecalho)
+
+    for linha in _linhas(df):
+        if any(isinstance(valor, datetime.date) for valor in linha):
+            linha = list(linha)
+            for i, valor in enumerate(linha):
+                if isinstance(valor, datetime.date):
+                    celula = WriteOnlyCell(planilha, value=valor)
+                    celula.number_format = FORMATO_DATA_HORA if isinstance(valor, datetime.datetime) else FORMATO_DATA
+                    linha[i] = celula
+        planilha.append(linha)
+    workbook.save(destino)
+
+
+def _gravar_xlsxwriter(df, destino):
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(destino, {
+        'constant_memory': True,
+        'default_date_format': FORMATO_DATA_HORA,
+        'remove_timezone': True,
+    })
+    planilha = workbook.add_worksheet(NOME_ABA_SAIDA)
+    formato_cabecalho = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    formato_data = workbook.add_format({'num_format': FORMATO_DATA})
+    planilha.write_row(0, 0, [str(coluna) for coluna in df.columns], formato_cabecalho)
+    for numero_linha, linha in enumerate(_linhas(df), start=1):
+        for numero_coluna, valor in enumerate(linha):
+            if valor is None:
+                continue
+            if isinstance(valor, datetime.date) and not isinstance(valor, datetime.datetime):
+                planilha.write_datetime(numero_linha, numero_coluna, valor, formato_data)
+            else:
+                planilha.write(numero_linha, numero_coluna, valor)
+    workbook.close()
+
+
+def _texto_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float):
+        return repr(valor).replace('.', SEPARADOR_DECIMAL_CSV)
+    if isinstance(valor, datetime.datetime):
+        return valor.strftime(FORMATO_DATA_CSV if valor.time() == datetime.time() else FORMATO_DATA_HORA_CSV)
+    if isinstance(valor, datetime.date):
+        return valor.strftime(FORMATO_DATA_CSV)
+    return str(valor)
+
+
+def _gravar_csv(df, destino):
+    texto = io.TextIOWrapper(destino, encoding='utf-8', newline='')
+    try:
+        escritor = csv.writer(texto, delimiter=SEPARADOR_CSV)
+        escritor.writerow([str(coluna) for coluna in df.columns])
+        for linha in _linhas(df):
+            escritor.writerow([_texto_csv(valor) for valor in linha])
+        texto.flush()
+    finally:
+        texto.detach()  # o destino continua aberto para quem o passou
+
+
+def _gravar_json(df, destino):
+    # Lista de registros {coluna: valor}, gravada um bloco de linhas por vez
+    destino.write(b'[')
+    primeiro = True
+    for inicio in range(0, len(df), LINHAS_POR_BLOCO):
+        registros = df.iloc[inicio:inicio + LINHAS_POR_BLOCO].to_json(
+            orient='records', force_ascii=False, date_format='iso', date_unit='s'
+        )[1:-1]
+        if registros:
+            destino.write(registros.encode('utf-8') if primeiro else b',' + registros.encode('utf-8'))
+            primeiro = False
+    destino.write(b']')
+
+
+def _gravar_parquet(df, destino):
+    # Colunas object com números e ausentes (ex.: ID produto) ganham tipo próprio no arquivo
+    df.infer_objects().to_parquet(destino, index=False)
+
+
+def formato_disponivel(formato):
+    """Indica se o formato de saída é conhecido e, para o Parquet, se há biblioteca instalada (pyarrow/fastparquet)."""
+    if formato not in MIMETYPES_SAIDA:
+        return False
+    if formato == 'parquet':
+        return any(importlib.util.find_spec(nome) is not None for nome in ('pyarrow', 'fastparquet'))
+    return True
+
+
+def formatos_disponiveis():
+    return [formato for formato in MIMETYPES_SAIDA if formato_disponivel(formato)]
+
+
+def validar_formato_saida(formato):
+    """
+    Normaliza o formato pedido ('XLSX', ' csv ', None...).
+
+    Returns:
+        Nome do formato (padrão: xlsx)
+
+    Raises:
+        ValueError: formato desconhecido ou sem biblioteca instalada
+    """
+    formato = (formato or FORMATO_SAIDA_PADRAO).strip().lower().lstrip('.')
+    if not formato_disponivel(formato):
+        raise ValueError(f"Formato de saída indisponível: {formato!r}. Use: {', '.join(formatos_disponiveis())}")
+    return formato
+
+
+def gravar_xlsx(df_convertido, destino, escritor=None):
+    """
+    Grava o DataFrame convertido como .xlsx (cabeçalho e ordem das colunas do modelo de saída).
+
+    Args:
+        df_convertido: DataFrame com as colunas do modelo de saída, na ordem do modelo
+        destino: Caminho ou arquivo binário aberto para escrita (com seek)
+        escritor: 'xlsxwriter' ou 'openpyxl' (padrão: ESCRITOR_XLSX)
+    """
+    escritor = escritor or ESCRITOR_XLSX
+    with medir('gravacao_xlsx'):
+        if escritor == 'xlsxwriter':
+            _gravar_xlsxwriter(df_convertido, destino)
+        else:
+            _gravar_openpyxl(df_convertido, destino)
+
+
+def gravar_saida(df_convertido, destino, formato=FORMATO_SAIDA_PADRAO):
+    """
+    Grava o DataFrame convertido no formato pedido, com as colunas na ordem do modelo de saída.
+
+    Args:
+        df_convertido: DataFrame com as colunas do modelo de saída, na ordem do modelo
+        destino: Arquivo binário aberto para escrita
+        formato: 'xlsx', 'csv', 'json' ou 'parquet' (ver validar_formato_saida)
+    """
+    if formato == 'xlsx':
+        gravar_xlsx(df_convertido, destino)
+        return
+    gravar = {'csv': _gravar_csv, 'json': _gravar_json, 'parquet': _gravar_parquet}[formato]
+    with medir(f'gravacao_{formato}'):
+        gravar(df_convertido, destino)
+
+
+def gerar_saida(df_convertido, formato=FORMATO_SAIDA_PADRAO):
+    """
+    Grava o DataFrame convertido num arquivo temporário, pronto para envio.
+
+    Returns:
+        Arquivo temporário posicionado no início (em memória até LIMITE_SAIDA_EM_MEMORIA_BYTES,
+        em disco acima disso); removido ao ser fechado
+    """
+    arquivo = tempfile.SpooledTemporaryFile(max_size=LIMITE_SAIDA_EM_MEMORIA_BYTES, suffix=f'.{formato}')
+    try:
+        gravar_saida(df_convertido, arquivo, formato)
+    except BaseException:
+        arquivo.close()
+        raise
+    arquivo.seek(0)
+    return arquivo
+
+
+def gerar_xlsx(df_convertido):
+    """Como gerar_saida, no formato .xlsx."""
+    return gerar_saida(df_convertido, 'xlsx')
@@ -0,0 +1,282 @@
+"""
+Snapshot dos dados de referência compartilhado entre os workers do gunicorn.
+
+Cada worker é um processo separado e, sem isso, baixaria e interpretaria as
+planilhas do Google Sheets por conta própria. O snapshot é um arquivo binário
+(pickle) em disco local:
+
+- apenas um processo por vez o atualiza: a eleição é feita por um arquivo de trava
+  criado com O_CREAT | O_EXCL, que funciona igual em Linux e Windows;
+- a gravação é feita em um arquivo temporário no mesmo diretório e publicada com
+  os.replace, de modo que os leitores nunca veem um arquivo pela metade;
+- os leitores percebem uma nova versão apenas pelo os.stat (mtime, tamanho, inode)
+  e só então leem e desserializam o arquivo.
+
+O snapshot economiza os downloads e a interpretação das planilhas, não memória: cada
+worker desserializa a sua própria cópia dos dados.
+
+Como desserializar um pickle executa código, o diretório é criado só para o usuário
+do processo (0o700) e o snapshot não é lido nem gravado em um diretório de outro
+usuário ou com escrita liberada para grupo/outros; nesse caso cada processo monta
+os dados por conta própria.
+"""
+import logging
+import os
+import stat
+import pickle
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Diretório dos snapshots; precisa ser local e compartilhado pelos workers da mesma máquina.
+# Subdiretório próprio: o conversor_olist é criado também por métricas, jobs e caches com as permissões padrão
+DIRETORIO_SNAPSHOT_PADRAO = (os.environ.get('OLIST_SNAPSHOT_DIR')
+                             or os.path.join(tempfile.gettempdir(), 'conversor_olist', 'snapshot'))
+
+# Uma trava mais antiga que isso é considerada abandonada (processo que morreu durante a atualização)
+TRAVA_EXPIRA_SEGUNDOS = 120
+
+# Tempo máximo que um worker sem snapshot espera outro worker terminar de gerá-lo
+ESPERA_MAXIMA_SEGUNDOS = 30
+INTERVALO_ESPERA_SEGUNDOS = 0.1
+
+
+def preparar_diretorio_privado(diretorio):
+    """
+    Cria o diretório (modo 0o700) e confere se só o usuário do processo pode escrever nele.
+
+    Returns:
+        True se o diretório é seguro para guardar o snapshot; False caso contrário
+    """
+    os.makedirs(diretorio, mode=0o700, exist_ok=True)
+    if not hasattr(os, 'getuid'):
+        # Windows: sem dono/permissões POSIX; o diretório temporário já é por usuário
+        return True
+    info = os.stat(diretorio)
+    if info.st_uid != os.getuid():
+        logger.error("Diretório do snapshot %s pertence a outro usuário (uid %d); snapshot desativado",
+                     diretorio, info.st_uid)
+        return False
+    if stat.S_IMODE(info.st_mode) & (stat.S_IWGRP | stat.S_IWOTH):
+        logger.error("Diretório do snapshot %s tem escrita liberada para grupo/outros (%o); snapshot desativado",
+                     diretorio, stat.S_IMODE(info.st_mode))
+        return False
+    return True
+
+
+class SnapshotReferencia:
+    """
+    Arquivo de snapshot com os dados de referência e a trava de atualização.
+
+    Uso:
+        snapshot = SnapshotReferencia('referencia', idade_maxima=300)
+        dados = snapshot.obter(carregar)   # carregar() só é chamado pelo worker eleito
+    """
+
+    def __init__(self, nome, idade_maxima, diretorio=None):
+        """
+        Args:
+            nome: Nome do snapshot (vira o nome do arquivo)
+            idade_maxima: Segundos após os quais o snapshot deve ser atualizado
+            diretorio: Diretório dos arquivos (padrão: OLIST_SNAPSHOT_DIR ou o diretório temporário)
+        """
+        self.idade_maxima = idade_maxima
+        self.diretorio = diretorio or DIRETORIO_SNAPSHOT_PADRAO
+        self.caminho = os.path.join(self.diretorio, f"{nome}.pkl")
+        self.caminho_trava = self.caminho + '.lock'
+        self._assinatura = None
+        self._dados = None
+        self._diretorio_seguro = None
+        self._invalidado = False
+        self._trava = threading.Lock()
+
+    def diretorio_seguro(self):
+        """Prepara o diretório na primeira chamada e informa se o snapshot pode ser usado nele."""
+        if self._diretorio_seguro is None:
+            try:
+                self._diretorio_seguro = preparar_diretorio_privado(self.diretorio)
+            except OSError as e:
+                logger.error("Não foi possível preparar o diretório do snapshot %s (%s); snapshot desativado",
+                             self.diretorio, e)
+                self._diretorio_seguro = False
+        return self._diretorio_seguro
+
+    def _stat(self):
+        try:
+            return os.stat(self.caminho)
+        except FileNotFoundError:
+            return None
+
+    def ler(self):
+        """
+        Retorna os dados do snapshot em disco, ou None se ele não existir.
+
+        O arquivo só é desserializado novamente quando muda; caso contrário os dados
+        já carregados por este processo são reaproveitados.
+        """
+        if not self.diretorio_seguro():
+            return None
+        info = self._stat()
+        if info is None:
+            with self._trava:
+                if self._assinatura is not None:
+                    # Snapshot já lido por este processo e removido depois: invalidado por outro processo
+                    self._invalidado = True
+            return None
+        assinatura = (info.st_mtime_ns, info.st_size, info.st_ino)
+        with self._trava:
+            if assinatura == self._assinatura:
+                return self._dados
+            try:
+                with open(self.caminho, 'rb') as arquivo:
+                    dados = pickle.load(arquivo)
+            except FileNotFoundError:
+                return None
+            except Exception as e:
+                logger.warning("Snapshot ilegível em %s (%s); será gerado de novo", self.caminho, e)
+                return None
+            self._assinatura = assinatura
+            self._dados = dados
+            return dados
+
+    def gravar(self, dados):
+        """Grava o snapshot de forma atômica (arquivo temporário + os.replace)."""
+        if not self.diretorio_seguro():
+            raise PermissionError(f"Diretório do snapshot inseguro: {self.diretorio}")
+        descritor, caminho_temporario = tempfile.mkstemp(dir=self.diretorio, prefix='.snapshot-', suffix='.tmp')
+        try:
+            with os.fdopen(descritor, 'wb') as arquivo:
+                pickle.dump(dados, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+                arquivo.flush()
+                os.fsync(arquivo.fileno())
+            os.replace(caminho_temporario, self.caminho)
+        except BaseException:
+            try:
+                os.remove(caminho_temporario)
+            except OSError:
+                pass
+            raise
+        info = self._stat()
+        with self._trava:
+            if info is not None:
+                self._assinatura = (info.st_mtime_ns, info.st_size, info.st_ino)
+            self._dados = dados
+            self._invalidado = False
+
+    def invalidado(self):
+        """
+        Indica se o snapshot foi descartado por invalidar() (neste ou em outro processo) e ainda
+        não foi gravado de novo: só então o cache em memória das planilhas deve ser ignorado.
+        """
+        with self._trava:
+            return self._invalidado
+
+    def idade(self):
+        """Segundos desde a última gravação do snapshot, ou None se ele não existir."""
+        info = self._stat()
+        return None if info is None else max(0.0, time.time() - info.st_mtime)
+
+    def expirado(self):
+        idade = self.idade()
+        return idade is None or idade >= self.idade_maxima
+
+    def _adquirir_trava(self):
+        """Tenta se tornar o processo responsável pela atualização; retorna True se conseguiu."""
+        for _ in range(2):
+            try:
+                descritor = os.open(self.caminho_trava, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    abandonada = time.time() - os.stat(self.caminho_trava).st_mtime > TRAVA_EXPIRA_SEGUNDOS
+                except FileNotFoundError:
+                    continue
+                if not abandonada:
+                    return False
+                logger.warning("Removendo trava abandonada do snapshot: %s", self.caminho_trava)
+                self._liberar_trava()
+                continue
+            with os.fdopen(descritor, 'w') as arquivo:
+                arquivo.write(str(os.getpid()))
+            return True
+        return False
+
+    def _liberar_trava(self):
+        try:
+            os.remove(self.caminho_trava)
+        except FileNotFoundError:
+            pass
+
+    def obter(self, carregar, propagar_erros=False):
+        """
+        Retorna os dados de referência, atualizando o snapshot quando ele expirou.
+
+        Apenas o processo que obtiver a trava chama carregar(); os demais continuam
+        usando o snapshot atual (mesmo expirado) ou, se ainda não houver nenhum,
+        aguardam o primeiro ficar pronto.
+
+        Args:
+            carregar: Função sem argumentos que monta os dados de referência
+            propagar_erros: Se True, uma falha em carregar() é propagada mesmo havendo
+                um snapshot anterior (usado pelo atualizador em segundo plano)
+
+        Returns:
+            Dados de referência (o objeto retornado por carregar)
+        """
+        if not self.diretorio_seguro():
+            return self._carregar_sem_snapshot(carregar)
+
+        dados = self.ler()
+        if dados is not None and not self.expirado():
+            return dados
+
+        if self._adquirir_trava():
+            try:
+                # Outro processo pode ter concluído a atualização entre a leitura e a trava
+                atual = self.ler()
+                if atual is not None and not self.expirado():
+                    return atual
+                novos_dados = carregar()
+                self.gravar(novos_dados)
+                return novos_dados
+            except Exception as e:
+                if dados is None or propagar_erros:
+                    raise
+                logger.warning("Falha ao atualizar o snapshot (%s); usando a versão anterior", e)
+                return dados
+            finally:
+                self._liberar_trava()
+
+        if dados is not None:
+            return dados
+
+        # Primeiro acesso: outro worker está gerando o snapshot
+        limite = time.monotonic() + ESPERA_MAXIMA_SEGUNDOS
+        while time.monotonic() < limite:
+            time.sleep(INTERVALO_ESPERA_SEGUNDOS)
+            dados = self.ler()
+            if dados is not None:
+                return dados
+            if not os.path.exists(self.caminho_trava):
+                break
+        logger.warning("Snapshot não ficou pronto a tempo; carregando neste processo")
+        return self._carregar_sem_snapshot(carregar)
+
+    def _carregar_sem_snapshot(self, carregar):
+        dados = carregar()
+        # A invalidação já foi atendida por esta carga, mesmo sem gravar um snapshot novo
+        with self._trava:
+            self._invalidado = False
+        return dados
+
+    def invalidar(self):
+        """Remove o snapshot do disco; o próximo acesso gera um novo."""
+        try:
+            os.remove(self.caminho)
+        except FileNotFoundError:
+            pass
+        with self._trava:
+            self._assinatura = None
+            self._dados = None
+            self._invalidado = True
@@ -5,6 +5,7 @@ document.addEventListener('DOMContentLoaded', () => {
   const usarArquivoExcelBtn = document.getElementById('usar-arquivo-excel-btn')
   const arquivoExcelInput = document.getElementById('arquivo-excel-input')
   const processarBtn = document.getElementById('processar-btn')
+  const todasAbasInput = document.getElementById('todas-abas-input')
   const previewArea = document.getElementById('preview-area')
   const uploadArea = document.getElementById('upload-area')
   const fileNameDisplay = document.getElementById('file-name-display')
@@ -87,70 +88,60 @@ document.addEventListener('DOMContentLoaded', () => {
     `
   }
 
-  // Lista global de clientes para busca
-  let listaClientes = [];
-
-  // Função para carregar clientes
-  function carregarClientes() {
-    fetch('/clientes')
+  // Busca de clientes no servidor (/clientes/busca): a lista inteira não é baixada
+  const LIMITE_CLIENTES_DROPDOWN = 50
+  const ESPERA_BUSCA_CLIENTES_MS = 150
+  let temporizadorBuscaClientes = null
+  let controleBuscaClientes = null
+
+  // Função para buscar clientes com base no texto digitado
+  function buscarClientes(texto) {
+    // Cancela a busca anterior: só a resposta do último texto digitado é exibida
+    if (controleBuscaClientes) controleBuscaClientes.abort()
+    controleBuscaClientes = new AbortController()
+
+    const parametros = new URLSearchParams({
+      q: texto,
+      limit: LIMITE_CLIENTES_DROPDOWN,
+    })
+    fetch(`/clientes/busca?${parametros}`, {
+      signal: controleBuscaClientes.signal,
+    })
       .then((response) => {
         if (!response.ok) {
           return response.json().then((err) => {
             throw new Error(
-              err.error || 'Erro ao carregar clientes do servidor.'
+              err.error || 'Erro ao buscar clientes no servidor.'
             )
           })
         }
         return response.json()
       })
       .then((data) => {
-        if (data.error) {
-          console.error('Erro ao carregar clientes:', data.error)
-          // Não sobrescrever a previewArea principal se ela já estiver mostrando algo do processamento
-          if (!previewArea.querySelector('#download-link')) {
-            previewArea.innerHTML = `<p style='color:red;'>Erro ao carregar lista de clientes: ${data.error}</p>`
-          }
-          return
-        }
-        if (data.clientes && data.clientes.length > 0) {
-          listaClientes = data.clientes.sort((a, b) => {
-            const nomeA = String(a.Nome)
-            const nomeB = String(b.Nome)
-            const matchA = nomeA.match(/^CL(\d+)/)
-            const matchB = nomeB.match(/^CL(\d+)/)
-            const idNumA = matchA ? parseInt(matchA[1], 10) : Infinity
-            const idNumB = matchB ? parseInt(matchB[1], 10) : Infinity
-            if (idNumA !== Infinity && idNumB !== Infinity)
-              return idNumA - idNumB
-            if (idNumA !== Infinity) return -1
-            if (idNumB !== Infinity) return 1
-            return nomeA.localeCompare(nomeB)
-          })
-        } else {
-          if (!previewArea.querySelector('#download-link')) {
-            previewArea.innerHTML =
-              '<p>Nenhum cliente encontrado. Verifique os arquivos de mapeamento.</p>'
-          }
-        }
+        renderizarClientesDropdown(data.clientes || [], data.total || 0)
+        clienteDropdown.style.display = 'block'
       })
       .catch((error) => {
+        if (error.name === 'AbortError') return
         console.error('Erro na requisição para buscar clientes:', error)
+        // Não sobrescrever a previewArea principal se ela já estiver mostrando algo do processamento
         if (!previewArea.querySelector('#download-link')) {
           previewArea.innerHTML = `<p style='color:red;'>Falha ao buscar clientes: ${error.message}</p>`
         }
       })
   }
 
-  // Função para filtrar clientes com base no texto digitado
-  function filtrarClientes(texto) {
-    const termoBusca = texto.toLowerCase();
-    return listaClientes.filter(cliente => 
-      cliente.Nome.toLowerCase().includes(termoBusca)
-    );
+  // Aguarda uma pausa na digitação antes de buscar
+  function agendarBuscaClientes(texto) {
+    clearTimeout(temporizadorBuscaClientes)
+    temporizadorBuscaClientes = setTimeout(
+      () => buscarClientes(texto),
+      ESPERA_BUSCA_CLIENTES_MS
+    )
   }
 
   // Função para renderizar os clientes filtrados no dropdown
-  function renderizarClientesDropdown(clientesFiltrados) {
+  function renderizarClientesDropdown(clientesFiltrados, total) {
     clienteDropdown.innerHTML = '';
     
     if (clientesFiltrados.length === 0) {
@@ -178,19 +169,22 @@ document.addEventListener('DOMContentLoaded', () => {
       
       clienteDropdown.appendChild(item);
     });
+
+    if (total > clientesFiltrados.length) {
+      const mensagem = document.createElement('div');
+      mensagem.className = 'dropdown-item dropdown-info';
+      mensagem.textContent = `Mostrando ${clientesFiltrados.length} de ${total} clientes. Digite para refinar a busca.`;
+      clienteDropdown.appendChild(mensagem);
+    }
   }
 
   // Event listeners para o campo de busca
   clienteInput.addEventListener('focus', () => {
-    const clientesFiltrados = filtrarClientes(clienteInput.value);
-    renderizarClientesDropdown(clientesFiltrados);
-    clienteDropdown.style.display = 'block';
+    buscarClientes(clienteInput.value);
   });
 
   clienteInput.addEventListener('input', () => {
-    const clientesFiltrados = filtrarClientes(clienteInput.value);
-    renderizarClientesDropdown(clientesFiltrados);
-    clienteDropdown.style.display = 'block';
+    agendarBuscaClientes(clienteInput.value);
     clienteSelect.value = ''; // Limpa a seleção quando o usuário digita
     processarBtn.disabled = true; // Desabilita o botão até que um cliente seja selecionado
   });
@@ -202,15 +196,32 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   });
 
-  carregarClientes() // Carrega clientes ao iniciar
-
   usarArquivoExcelBtn.addEventListener('click', () => {
     arquivoExcelInput.click()
   })
 
+  // Orçamentos aceitos pelo servidor (ver EXTENSOES_ORCAMENTO em lote.py)
+  const EXTENSOES_ORCAMENTO = ['.xlsx', '.csv', '.tsv']
+  const arquivoOrcamentoValido = (file) =>
+    EXTENSOES_ORCAMENTO.some((extensao) => file.name.toLowerCase().endsWith(extensao))
+
+  const avisarArquivoInvalido = () => {
+    resetUploadUI()
+    showFeedback(
+      'error',
+      'Arquivo Inválido',
+      'Por favor, use arquivos Excel (.xlsx) ou CSV (.csv, .tsv).'
+    )
+  }
+
   arquivoExcelInput.addEventListener('change', (event) => {
     if (event.target.files.length > 0) {
-      showFileUI(event.target.files[0])
+      const file = event.target.files[0]
+      if (arquivoOrcamentoValido(file)) {
+        showFileUI(file)
+      } else {
+        avisarArquivoInvalido()
+      }
     }
   })
 
@@ -232,15 +243,10 @@ document.addEventListener('DOMContentLoaded', () => {
     const files = event.dataTransfer.files
     if (files.length > 0) {
       const file = files[0]
-      if (file.name.endsWith('.xlsx') || file.name.endsWith('.xls')) {
+      if (arquivoOrcamentoValido(file)) {
         showFileUI(file)
       } else {
-        resetUploadUI()
-        showFeedback(
-          'error',
-          'Arquivo Inválido',
-          'Por favor, use apenas arquivos Excel (.xlsx ou .xls).'
-        )
+        avisarArquivoInvalido()
       }
     }
   })
@@ -259,7 +265,7 @@ document.addEventListener('DOMContentLoaded', () => {
       showFeedback(
         'error',
         'Arquivo não selecionado',
-        'Por favor, selecione um arquivo Excel de orçamento.'
+        'Por favor, selecione um arquivo de orçamento (Excel ou CSV).'
       )
       return
     }
@@ -270,6 +276,9 @@ document.addEventListener('DOMContentLoaded', () => {
     const formData = new FormData()
     formData.append('cliente_id', clienteId)
     formData.append('arquivo_excel', arquivoSelecionado)
+    if (todasAbasInput && todasAbasInput.checked) {
+      formData.append('todas_abas', '1')
+    }
 
     fetch('/processar', { method: 'POST', body: formData })
       .then(async (response) => {
@@ -0,0 +1,34 @@
+"""Os backends de leitura de .xlsx precisam entregar os mesmos DataFrames que o openpyxl."""
+import glob
+import os
+from unittest import mock
+
+import pytest
+
+from leitores_xlsx import BACKENDS_XLSX, LeitorXlsxOpenpyxl, LeitorXlsxSobDemanda, comparar_backends
+
+ARQUIVOS_EXEMPLO = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                 'src', 'data', '*.xlsx')))
+
+
+@pytest.mark.parametrize('arquivo', ARQUIVOS_EXEMPLO, ids=os.path.basename)
+def test_calamine_igual_ao_openpyxl(arquivo):
+    pytest.importorskip('python_calamine')
+    assert comparar_backends(arquivo, backends=['calamine']) == []
+
+
+@pytest.mark.parametrize('arquivo', ARQUIVOS_EXEMPLO, ids=os.path.basename)
+def test_sob_demanda_igual_ao_openpyxl(arquivo):
+    if not BACKENDS_XLSX['sob_demanda'].disponivel():
+        pytest.skip("leitor sob demanda indisponível nesta versão do openpyxl")
+    assert comparar_backends(arquivo, backends=['sob_demanda']) == []
+
+
+@pytest.mark.parametrize('arquivo', ARQUIVOS_EXEMPLO[:1], ids=os.path.basename)
+def test_sob_demanda_usa_load_workbook_se_o_openpyxl_mudar(arquivo):
+    leitor = LeitorXlsxSobDemanda()
+    esperado = list(leitor.iterar_linhas(arquivo, nrows=20))
+    # Simula uma versão do openpyxl sem as partes internas usadas pelo leitor sob demanda
+    with mock.patch.object(LeitorXlsxSobDemanda, '_abrir', side_effect=AttributeError('_date_formats')):
+        assert list(leitor.iterar_linhas(arquivo, nrows=20)) == esperado
+        assert leitor.nomes_abas(arquivo) == LeitorXlsxOpenpyxl().nomes_abas(arquivo)
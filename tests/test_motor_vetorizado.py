@@ -0,0 +1,114 @@
+"""
+Paridade entre o motor vetorizado e o laço original com iterrows.
+
+O motor vetorizado precisa devolver, linha a linha, o mesmo DataFrame e a mesma lista
+de produtos não mapeados que conversor_olist._processar_itens_iterativo.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from conversor_olist import _processar_itens_iterativo, mapear_colunas_orcamento
+from indice_catalogo import CatalogIndex
+from motor_vetorizado import processar_itens_vetorizado, suporta_motor_vetorizado
+
+COLUNAS_MODELO = ['Número da proposta', 'Data', 'ID contato', 'Nome do contato', 'ID produto',
+                  'Descrição', 'Quantidade', 'Valor unitário', 'Situação']
+
+CAMPOS_CABECALHO = {
+    'Número da proposta': '1234',
+    'Data': pd.Timestamp('2025-01-15'),
+    'ID contato': 753318009,
+    'Nome do contato': 'CL108 - Brito Cell',
+}
+
+
+@pytest.fixture(scope='module')
+def indice():
+    catalogo = pd.DataFrame({
+        'SKU': ['ABC-1', 'XYZ 9', None, '1001', 'ABC-1'],
+        'MODELO': ['Tela iPhone 11', 'Bateria Moto G8', 'Conector Samsung A10', 'Cabo USB-C', 'Repetido'],
+        'ID': [10, 20, 30, 40, 50],
+        'MODELO OLIST': ['TELA IP11', 'BAT G8', 'CON A10', None, 'REPETIDO'],
+    })
+    return CatalogIndex(catalogo)
+
+
+def _comparar_motores(df_itens, indice):
+    esperado, nao_mapeados_esperado = _processar_itens_iterativo(df_itens, indice, COLUNAS_MODELO, CAMPOS_CABECALHO)
+    obtido, nao_mapeados_obtido = processar_itens_vetorizado(df_itens, indice, COLUNAS_MODELO, CAMPOS_CABECALHO)
+    pd.testing.assert_frame_equal(obtido, esperado)
+    assert nao_mapeados_obtido == nao_mapeados_esperado
+    return obtido, nao_mapeados_obtido
+
+
+def test_linhas_de_total_e_sem_produto_sao_ignoradas(indice):
+    df_itens = pd.DataFrame({
+        'produto': ['Tela iPhone 11', 'Subtotal', None, '   ', 'TOTAL GERAL', 'Bateria Moto G8', np.nan, 'Soma'],
+        'quantidade': [1, None, 3, 4, 5, 2, 7, 8],
+        'valor': [100.0, 500.0, 1.0, 2.0, 600.0, 50.5, 3.0, 4.0],
+    })
+    obtido, _ = _comparar_motores(df_itens, indice)
+    assert obtido['ID produto'].tolist() == [10, 20]
+
+
+def test_sku_tem_precedencia_sobre_modelo(indice):
+    df_itens = pd.DataFrame({
+        'produto': ['Bateria Moto G8', 'Tela iPhone 11', 'Conector Samsung A10', 'Sem cadastro', 'Outro sem cadastro'],
+        'sku': ['abc-1', 'nao existe', None, '', 'sku perdido'],
+        'quantidade': [1, 2, 3, 4, 5],
+        'valor unitário': [10.0, 20.0, 30.0, 40.0, 50.0],
+        'valor': [1.0, 2.0, 3.0, 4.0, 5.0],
+    })
+    obtido, nao_mapeados = _comparar_motores(df_itens, indice)
+    # SKU encontrado vence o MODELO; SKU sem cadastro cai para o MODELO; sem SKU, só o MODELO
+    assert obtido['ID produto'].tolist()[:3] == [10, 10, 30]
+    assert obtido['Valor unitário'].tolist() == [10.0, 20.0, 30.0, 40.0, 50.0]
+    assert len(nao_mapeados) == 2
+
+
+def test_sku_numerico_e_descricao_vazia_no_catalogo(indice):
+    df_itens = pd.DataFrame({
+        'produto': ['Cabo', 'Cabo USB-C', 'Qualquer'],
+        'sku': [1001, 0, 999],
+        'quantidade': [1, 2, 3],
+        'valor': [5.0, 6.0, 7.0],
+    })
+    _comparar_motores(df_itens, indice)
+
+
+def test_colunas_todas_numericas(indice):
+    # Sem nenhuma coluna de texto o iterrows converte as linhas para float
+    df_itens = pd.DataFrame({
+        'produto': [1001, 2002, 3003],
+        'sku': [1001, 5, 6],
+        'quantidade': [1, 2, 3],
+        'valor': [1.5, 2.5, 3.5],
+    })
+    _comparar_motores(df_itens, indice)
+
+
+def test_sem_coluna_de_valor_nem_de_produto(indice):
+    df_itens = pd.DataFrame({'produto': ['Tela iPhone 11', 'Nada'], 'quantidade': [1, 2]})
+    _comparar_motores(df_itens, indice)
+    df_sem_produto = pd.DataFrame({'quantidade': [1, 2], 'valor': [3.0, 4.0]})
+    esperado, _ = _processar_itens_iterativo(df_sem_produto, indice, COLUNAS_MODELO, CAMPOS_CABECALHO)
+    obtido, _ = processar_itens_vetorizado(df_sem_produto, indice, COLUNAS_MODELO, CAMPOS_CABECALHO)
+    assert esperado.empty and obtido.empty
+
+
+def test_colunas_mapeadas_repetidas(indice):
+    df_orcamento = pd.DataFrame(
+        [['Tela iPhone 11', 'ABC-1', 1, 10.0, 'UN', 'UN'],
+         ['Item X', 'XYZ 9', 2, 20.0, 'CX', 'CX']],
+        columns=['Descrição do Produto', 'SKU', 'Qtde', 'Valor', 'Unid', 'Unid'],
+    )
+    df_itens = mapear_colunas_orcamento(df_orcamento)
+    # Colunas que o motor não lê podem se repetir
+    assert suporta_motor_vetorizado(df_itens)
+    _comparar_motores(df_itens, indice)
+
+    # Duas colunas mapeadas para 'produto' ficam com o motor iterativo
+    df_repetido = df_itens.rename(columns={'sku': 'produto'})
+    assert list(df_repetido.columns).count('produto') == 2
+    assert not suporta_motor_vetorizado(df_repetido)
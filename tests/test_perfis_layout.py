@@ -0,0 +1,156 @@
+"""
+Perfis de layout: impressão digital das prévias, remoção dos perfis usados há mais tempo
+e reaproveitamento do perfil na conversão (sem busca do cabeçalho nem mapeamento das colunas).
+"""
+import itertools
+from types import SimpleNamespace
+
+import openpyxl
+import pandas as pd
+import pytest
+
+import conversor_olist
+import perfis_layout
+from perfis_layout import PerfilLayout, RepositorioPerfis, impressoes_candidatas
+
+CABECALHO_A = ['Produto', 'SKU', 'Quantidade', 'Valor unitário']
+CABECALHO_B = ['Código', 'Descrição do produto', 'Quantidade', 'Valor']
+
+
+def test_impressao_ignora_digitos():
+    previa_1 = [['Proposta 123', 'Data', '15/01/2025'], CABECALHO_A]
+    previa_2 = [['Proposta 98765', 'Data', '03/11/2024'], CABECALHO_A]
+    assert impressoes_candidatas(previa_1) == impressoes_candidatas(previa_2)
+
+    # Texto diferente (não só dígitos) é outro layout
+    previa_3 = [['Orçamento 123', 'Data', '15/01/2025'], CABECALHO_A]
+    assert impressoes_candidatas(previa_3)[0] != impressoes_candidatas(previa_1)[0]
+
+
+def test_impressao_cobre_linhas_ate_o_cabecalho():
+    previa = [['Proposta 1', None], CABECALHO_A, ['Tela iPhone 11', 'ABC-1', 2, 10.5]]
+    impressoes = impressoes_candidatas(previa)
+    assert len(impressoes) == 3
+    assert [impressao.rsplit('-', 1)[1] for impressao in impressoes] == ['0', '1', '2']
+
+    # Linhas depois do cabeçalho (os itens) não mudam a impressão das linhas anteriores
+    outros_itens = impressoes_candidatas(previa[:2] + [['Bateria Moto G8', 'XYZ 9', 1, 99.0]])
+    assert outros_itens[:2] == impressoes[:2]
+    assert outros_itens[2] != impressoes[2]
+
+    # Qualquer linha anterior muda a impressão de todas as seguintes
+    outro_topo = impressoes_candidatas([['Fornecedor X', None]] + previa[1:])
+    assert all(a != b for a, b in zip(outro_topo, impressoes))
+
+
+def _perfil(linha):
+    return PerfilLayout(linha, [[0, 'produto']], [])
+
+
+def test_remove_perfis_usados_ha_mais_tempo(tmp_path, monkeypatch):
+    relogio = itertools.count(1000, 10)
+    monkeypatch.setattr(perfis_layout, 'time', SimpleNamespace(time=lambda: next(relogio)))
+    monkeypatch.setattr(perfis_layout, 'INTERVALO_REGISTRO_USO_SEGUNDOS', 0)
+    repositorio = RepositorioPerfis(str(tmp_path / 'perfis.sqlite3'), max_perfis=2)
+
+    repositorio.salvar('a-1', _perfil(1))
+    repositorio.salvar('b-2', _perfil(2))
+    # Usar 'a' depois de 'b' salvo: o menos usado recentemente passa a ser 'b'
+    assert repositorio.buscar(['a-1'])[0] == 1
+    repositorio.salvar('c-3', _perfil(3))
+
+    assert repositorio.buscar(['a-1'])[0] == 1
+    assert repositorio.buscar(['b-2']) == (None, None)
+    assert repositorio.buscar(['c-3'])[0] == 3
+
+
+def _gravar_xlsx(caminho, linhas):
+    pasta = openpyxl.Workbook()
+    for linha in linhas:
+        pasta.active.append(linha)
+    pasta.save(caminho)
+    return str(caminho)
+
+
+def _orcamento_a(caminho, proposta):
+    return _gravar_xlsx(caminho, [
+        ['Fornecedor Peças Ltda'],
+        [f'Proposta {proposta}', None, 'Data', '15/01/2025'],
+        CABECALHO_A,
+        ['Tela iPhone 11', 'ABC-1', 2, 10.5],
+        ['Bateria Moto G8', 'XYZ 9', 1, 99.0],
+    ])
+
+
+def _orcamento_b(caminho, proposta):
+    # Mesmas primeiras linhas do layout A (a menos dos dígitos), cabeçalho mais abaixo e com outra ordem
+    return _gravar_xlsx(caminho, [
+        ['Fornecedor Peças Ltda'],
+        [f'Proposta {proposta}', None, 'Data', '20/02/2025'],
+        ['Preços válidos por 7 dias'],
+        CABECALHO_B,
+        ['ABC-1', 'Tela iPhone 11', 3, 11.0],
+    ])
+
+
+@pytest.fixture
+def repositorio(tmp_path, monkeypatch):
+    repositorio = RepositorioPerfis(str(tmp_path / 'perfis.sqlite3'))
+    monkeypatch.setattr(conversor_olist, 'PERFIS_LAYOUT_HABILITADO', True)
+    monkeypatch.setattr(conversor_olist, 'repositorio_perfis', repositorio)
+    return repositorio
+
+
+@pytest.fixture
+def buscas_cabecalho(monkeypatch):
+    """Linhas de cabeçalho devolvidas pela busca por palavras-chave (só chamada sem perfil)."""
+    chamadas = []
+    original = conversor_olist.encontrar_linha_cabecalho
+
+    def encontrar(df_previa, palavras_chave):
+        linha = original(df_previa, palavras_chave)
+        chamadas.append(linha)
+        return linha
+
+    monkeypatch.setattr(conversor_olist, 'encontrar_linha_cabecalho', encontrar)
+    return chamadas
+
+
+def _ler_itens(caminho):
+    return conversor_olist._ler_itens_aba(caminho, 0, conversor_olist._Cronometro({}))
+
+
+def test_conversao_salva_e_reaproveita_perfil(tmp_path, repositorio, buscas_cabecalho):
+    itens, proposta, data = _ler_itens(_orcamento_a(tmp_path / 'a1.xlsx', 123))
+    assert buscas_cabecalho == [2]
+    assert proposta == '123'
+
+    previa = conversor_olist.LeitorOrcamento(_orcamento_a(tmp_path / 'a2.xlsx', 456)).previa()
+    linha, perfil = repositorio.buscar(impressoes_candidatas(previa.to_numpy()))
+    assert linha == 2
+    mapeamento = conversor_olist.mapeamento_colunas_orcamento(CABECALHO_A)
+    assert perfil.mapeamento_colunas == [[posicao, mapeamento[coluna]] for posicao, coluna in enumerate(CABECALHO_A)]
+
+    # Outro orçamento do mesmo layout: cabeçalho e colunas vêm do perfil, com o mesmo resultado
+    itens_perfil, proposta_perfil, data_perfil = _ler_itens(_orcamento_a(tmp_path / 'a2.xlsx', 456))
+    assert buscas_cabecalho == [2]
+    assert proposta_perfil == '456'
+    assert data_perfil == data
+    pd.testing.assert_frame_equal(itens_perfil, itens)
+
+
+def test_layouts_com_prefixo_comum_usam_cada_um_o_seu_perfil(tmp_path, repositorio, buscas_cabecalho):
+    itens_a, _, _ = _ler_itens(_orcamento_a(tmp_path / 'a1.xlsx', 1))
+    itens_b, _, _ = _ler_itens(_orcamento_b(tmp_path / 'b1.xlsx', 2))
+    # O perfil de A não serve para B: as duas conversões buscam o cabeçalho
+    assert buscas_cabecalho == [2, 3]
+
+    itens_a2, proposta_a2, _ = _ler_itens(_orcamento_a(tmp_path / 'a2.xlsx', 33))
+    itens_b2, proposta_b2, data_b2 = _ler_itens(_orcamento_b(tmp_path / 'b2.xlsx', 44))
+    assert buscas_cabecalho == [2, 3]
+    assert (proposta_a2, proposta_b2) == ('33', '44')
+    assert data_b2 == pd.Timestamp('2025-02-20')
+    pd.testing.assert_frame_equal(itens_a2, itens_a)
+    pd.testing.assert_frame_equal(itens_b2, itens_b)
+    assert itens_b2['sku'].tolist() == ['ABC-1']
+    assert itens_b2['produto'].tolist() == ['Tela iPhone 11']